@@ -2,11 +2,14 @@ import time
 from langchain_core.prompts import ChatPromptTemplate
 import os
 from dotenv import load_dotenv
+from app.utils.llm_cache import cached_chain
 from app.utils.llm_utils import get_llm_instance # 导入统一的LLM获取函数
 from app.utils.logging_config import get_logger, TASK_PROCESSED, TASK_DURATION
 
 load_dotenv()
 
+PROMPT_VERSION = 1
+
 # 初始化日志记录器
 logger = get_logger(__name__)
 
@@ -17,7 +20,7 @@ def get_classifier_chain():
         ("system", "你是一个商品分类专家。根据提供的商品信息，判断其最可能的商品类型。类型选项为：[药品, 器械, 药妆, 保健品, 中药饮片, 普通商品]。请重点关注'批准文号'、'注册证号'等关键词。仅返回类型名称，不要包含任何其他文字或解释。如果无法判断，返回'普通商品'。"),
         ("user", "{raw_text}")
     ])
-    return prompt | llm
+    return cached_chain("classifier", PROMPT_VERSION, prompt, llm)
 
 def classify_product(state):
     start_time = time.time()
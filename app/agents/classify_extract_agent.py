@@ -0,0 +1,106 @@
+import json
+import os
+import time
+from typing import Any, Dict, Optional, Type
+from dotenv import load_dotenv
+from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from pydantic import BaseModel
+from app.agents.cosmeceutical_extractor_agent import CosmeceuticalInfo
+from app.agents.device_extractor_agent import DeviceInfo
+from app.agents.drug_extractor_agent import DrugInfo
+from app.agents.general_extractor_agent import GeneralInfo
+from app.agents.supplement_extractor_agent import SupplementInfo
+from app.agents.tcm_extractor_agent import TCMInfo
+from app.utils.llm_cache import cached_chain
+from app.utils.llm_utils import get_llm_instance # 导入统一的LLM获取函数
+from app.utils.logging_config import get_logger, FUSED_CLASSIFY_EXTRACT, TASK_PROCESSED, TASK_DURATION
+
+load_dotenv()
+
+PROMPT_VERSION = 1
+
+# 初始化日志记录器
+logger = get_logger(__name__)
+
+# 是否启用分类+提取融合模式（一次LLM调用同时得到商品类型和对应类型的属性，失败时回退到分类后再提取）
+FUSED_CLASSIFY_EXTRACT_ENABLED = os.getenv("FUSED_CLASSIFY_EXTRACT_ENABLED", "false").lower() in ("1", "true", "yes")
+
+# 商品类型 -> 该类型的提取Schema（与各提取Agent一致）
+PRODUCT_SCHEMAS: Dict[str, Type[BaseModel]] = {
+    "药品": DrugInfo,
+    "器械": DeviceInfo,
+    "药妆": CosmeceuticalInfo,
+    "保健品": SupplementInfo,
+    "中药饮片": TCMInfo,
+    "普通商品": GeneralInfo,
+}
+
+def _schema_descriptions() -> str:
+    """各商品类型的字段及说明，供提示词使用"""
+    lines = []
+    for product_type, schema in PRODUCT_SCHEMAS.items():
+        fields = {name: field.description or "" for name, field in schema.model_fields.items()}
+        lines.append(f"- {product_type}: {json.dumps(fields, ensure_ascii=False)}")
+    return "\n".join(lines)
+
+def get_classify_extract_chain():
+    llm = get_llm_instance() # 使用统一函数获取LLM实例
+    parser = JsonOutputParser()
+
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", """你是一个商品分类和信息提取专家。请先判断商品类型，再按该类型的字段提取商品属性。
+        类型选项为：[药品, 器械, 药妆, 保健品, 中药饮片, 普通商品]，请重点关注'批准文号'、'注册证号'等关键词，无法判断时为'普通商品'。
+        各类型需要提取的字段（字段名: 说明）如下：
+        {schemas}
+        如果某个字段在原文中未提及，请返回空字符串。
+        仅返回一个JSON对象，格式为 {{"product_type": "类型名称", "extracted_data": {{字段名: 值}}}}，不要包含任何其他文字或解释。"""),
+        ("human", "{raw_text}")
+    ]).partial(schemas=_schema_descriptions())
+
+    return cached_chain("classify_extract", PROMPT_VERSION, prompt, llm, parser)
+
+def parse_fused_output(output: Any) -> Optional[Dict[str, Any]]:
+    """校验融合输出：类型有效且提取结果包含该类型的字段时返回 {"product_type", "extracted_data"}，否则返回None"""
+    if not isinstance(output, dict):
+        return None
+    product_type = str(output.get("product_type") or "").strip().replace("。", "").replace(" ", "")
+    extracted = output.get("extracted_data")
+    schema = PRODUCT_SCHEMAS.get(product_type)
+    if schema is None or not isinstance(extracted, dict):
+        return None
+    # 只保留该类型Schema中的字段，缺失的字段补为空字符串，与单独提取时的输出一致
+    fields = schema.model_fields
+    if not any(name in extracted for name in fields):
+        return None
+    extracted_data = {name: extracted.get(name) if extracted.get(name) is not None else "" for name in fields}
+    return {"product_type": product_type, "extracted_data": extracted_data}
+
+def classify_and_extract(state):
+    start_time = time.time()
+    # 记录Classify-Extract Agent开始执行
+    logger.info("---CLASSIFY EXTRACT AGENT---")
+    raw_text = state["raw_text"]
+
+    try:
+        result = parse_fused_output(get_classify_extract_chain().invoke({"raw_text": raw_text}))
+    except Exception as e:
+        # 融合调用失败不影响流程，回退到分类后再提取
+        logger.warning(f"Classify-extract agent error, falling back to classifier: {e}")
+        FUSED_CLASSIFY_EXTRACT.labels(result="error").inc()
+        TASK_PROCESSED.labels(status="error").inc()
+        TASK_DURATION.observe(time.time() - start_time)
+        return {"current_node": "classify_extract"}
+
+    if result is None:
+        logger.info("Classify-extract output not usable, falling back to classifier")
+        FUSED_CLASSIFY_EXTRACT.labels(result="fallback").inc()
+        TASK_PROCESSED.labels(status="fallback").inc()
+        TASK_DURATION.observe(time.time() - start_time)
+        return {"current_node": "classify_extract"}
+
+    logger.info(f"Classify-extract output: '{result['product_type']}', {result['extracted_data']}")
+    FUSED_CLASSIFY_EXTRACT.labels(result="success").inc()
+    TASK_PROCESSED.labels(status="success").inc()
+    TASK_DURATION.observe(time.time() - start_time)
+    return {**result, "current_node": "classify_extract"}
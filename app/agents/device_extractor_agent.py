@@ -4,10 +4,13 @@ from pydantic import BaseModel, Field
 from typing import Optional
 import os
 from dotenv import load_dotenv
+from app.utils.llm_cache import cached_chain
 from app.utils.llm_utils import get_llm_instance # 导入统一的LLM获取函数
 
 load_dotenv()
 
+PROMPT_VERSION = 1
+
 class DeviceInfo(BaseModel):
     """医疗器械信息"""
     approval_number: str = Field(description="批准文号 / 备案号 (械注准/备案...)")
@@ -35,7 +38,7 @@ def extract_device_info(state):
         ("human", "{raw_text}\n{format_instructions}")
     ]).partial(format_instructions=parser.get_format_instructions())
 
-    chain = prompt | llm | parser
+    chain = cached_chain("device_extractor", PROMPT_VERSION, prompt, llm, parser)
     
     extracted_data = chain.invoke({"raw_text": raw_text})
     
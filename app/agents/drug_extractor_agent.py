@@ -5,11 +5,14 @@ from pydantic import BaseModel, Field
 from typing import Optional
 import os
 from dotenv import load_dotenv
+from app.utils.llm_cache import cached_chain
 from app.utils.llm_utils import get_llm_instance # 导入统一的LLM获取函数
 from app.utils.logging_config import get_logger, TASK_PROCESSED, TASK_DURATION
 
 load_dotenv()
 
+PROMPT_VERSION = 1
+
 # 初始化日志记录器
 logger = get_logger(__name__)
 
@@ -39,7 +42,7 @@ def extract_drug_info(state):
             ("human", "{raw_text}\n{format_instructions}")
         ]).partial(format_instructions=parser.get_format_instructions())
 
-        chain = prompt | llm | parser
+        chain = cached_chain("drug_extractor", PROMPT_VERSION, prompt, llm, parser)
         
         extracted_data = chain.invoke({"raw_text": raw_text})
         
@@ -1,13 +1,27 @@
 import time
 import re
+from collections import defaultdict
 from difflib import SequenceMatcher
+from sqlalchemy import literal, or_, select, tuple_, union_all
 from app.database import SessionLocal
 from app.models.schema import MasterProduct
+from app.services.catalog_snapshot import get_catalog, refresh_catalog
+from app.services.manufacturer_resolver import resolve_manufacturer_ids
+from app.services.ngram_index import NGRAM_FIELDS, find_candidate_spu_ids
+from app.utils.approval_number import MAX_PREFIX_RESULTS, MIN_PREFIX_LENGTH, normalize_approval_number
+from app.utils.similarity_kernel import score_candidates, top_k_candidates
+from app.utils.text_normalize import normalized_value
 from app.utils.logging_config import get_logger, TASK_PROCESSED, TASK_DURATION
 
 # 初始化日志记录器
 logger = get_logger(__name__)
 
+# 批量查询时每个IN子句包含的最大参数数量
+BATCH_CHUNK_SIZE = 500
+
+# 批量前缀查询时每条UNION ALL语句合并的范围查询数量（SQLite复合查询最多500个SELECT）
+PREFIX_QUERY_CHUNK_SIZE = 100
+
 def calculate_similarity(str1, str2):
     """计算两个字符串的相似度"""
     if not str1 or not str2:
@@ -16,105 +30,300 @@ def calculate_similarity(str1, str2):
 
 def calculate_match_score(validated_data, product):
     """计算匹配分数"""
-    score = 0
-    
-    # 批准文号匹配（权重40%）
-    approval_number_new = validated_data.get("approval_number", "")
-    approval_number_existing = product.approval_number or ""
-    if approval_number_new and approval_number_existing:
-        if approval_number_new == approval_number_existing:
-            score += 40
-        elif approval_number_new.startswith(approval_number_existing) or approval_number_existing.startswith(approval_number_new):
-            score += 20
-    
-    # 产品名称匹配（权重25%）
-    product_name_new = validated_data.get("product_name", "")
-    product_name_existing = product.product_name or ""
-    name_similarity = calculate_similarity(product_name_new, product_name_existing)
-    if name_similarity > 0.9:
-        score += 25
-    elif name_similarity > 0.8:
-        score += 20
-    elif name_similarity > 0.7:
-        score += 15
-    elif name_similarity > 0.6:
-        score += 10
-    
-    # 生产企业匹配（权重20%）
-    manufacturer_new = validated_data.get("manufacturer", "")
-    manufacturer_existing = product.manufacturer or ""
-    if manufacturer_new and manufacturer_existing:
-        manufacturer_similarity = calculate_similarity(manufacturer_new, manufacturer_existing)
-        if manufacturer_similarity > 0.9:
-            score += 20
-        elif manufacturer_similarity > 0.8:
-            score += 10
-    
-    # 规格匹配（权重10%）
-    specification_new = validated_data.get("specification", "")
-    specification_existing = product.specification or ""
-    if specification_new and specification_existing:
-        spec_similarity = calculate_similarity(specification_new, specification_existing)
-        if spec_similarity > 0.9:
-            score += 10
-        elif spec_similarity > 0.8:
-            score += 5
-    
-    # 品牌匹配（权重5%）
-    brand_new = validated_data.get("brand", "")
-    brand_existing = product.brand or ""
-    if brand_new and brand_existing:
-        brand_similarity = calculate_similarity(brand_new, brand_existing)
-        if brand_similarity > 0.9:
-            score += 5
-        elif brand_similarity > 0.8:
-            score += 2
-    
-    return score
+    return int(score_candidates(validated_data, [product])[0])
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def _exact_match_candidates(validated_data, products, limit):
+    """批准文号精确匹配时，只对这些产品打分并返回"""
+    scores = score_candidates(validated_data, products).tolist()
+    candidates = [
+        {"product": product, "score": score}
+        for product, score in zip(products, scores)
+    ]
+    return candidates[:limit]
+
+def _load_products(db, catalog, spu_ids):
+    """按spu_id加载候选产品，快照已加载时直接从快照读取"""
+    if not spu_ids:
+        return []
+    if catalog is not None:
+        products = catalog.get_many(spu_ids)
+        if len(products) < len(spu_ids):
+            # 索引中存在快照尚未包含的新产品（如其他进程写入），增量刷新后重试
+            refresh_catalog(db)
+            products = catalog.get_many(spu_ids)
+        return products
+    products = []
+    for chunk in _chunks(list(spu_ids), BATCH_CHUNK_SIZE):
+        products.extend(db.query(MasterProduct).filter(MasterProduct.spu_id.in_(chunk)).all())
+    return products
+
+def _prefix_related_ids_many(db, catalog, approval_numbers):
+    """批量查询与各批准文号存在前缀关系的产品（截断或带后缀的批准文号），返回 {批准文号: {spu_id: 来源}}
+
+    快照已加载时查内存中的有序索引；否则在approval_number_norm索引上按块合并查询
+    （存量数据需先用 scripts/backfill_normalized_columns.py 回填标准化列）：
+    更长的批准文号把各自的范围查询用UNION ALL合并为一条语句（每个批准文号最多取MAX_PREFIX_RESULTS个），
+    较短的批准文号（真前缀）合并为一次IN查询。
+    """
+    approval_numbers = list(dict.fromkeys(number for number in approval_numbers if number))
+    if catalog is not None:
+        return {number: catalog.approval_index.related(number) for number in approval_numbers}
+    related = {number: {} for number in approval_numbers}
+
+    # 以该批准文号为前缀的更长批准文号：按 [prefix, prefix的后继) 做范围查询，可利用索引
+    ranged = [number for number in approval_numbers if len(number) >= MIN_PREFIX_LENGTH]
+    for chunk in _chunks(ranged, PREFIX_QUERY_CHUNK_SIZE):
+        subqueries = [
+            select(literal(number).label("query"), MasterProduct.spu_id).where(
+                MasterProduct.approval_number_norm > number,
+                MasterProduct.approval_number_norm < number[:-1] + chr(ord(number[-1]) + 1)
+            ).order_by(MasterProduct.spu_id).limit(MAX_PREFIX_RESULTS).subquery()
+            for number in chunk
+        ]
+        statement = union_all(*[select(subquery.c.query, subquery.c.spu_id) for subquery in subqueries])
+        for number, spu_id in db.execute(statement):
+            related[number][spu_id] = "PREFIX"
+
+    # 作为该批准文号真前缀的较短批准文号
+    prefixes = {
+        number: [number[:length] for length in range(MIN_PREFIX_LENGTH, len(number))]
+        for number in approval_numbers
+    }
+    ids_by_prefix = defaultdict(list)
+    for chunk in _chunks(list({prefix for values in prefixes.values() for prefix in values}), BATCH_CHUNK_SIZE):
+        rows = db.query(MasterProduct.approval_number_norm, MasterProduct.spu_id).filter(
+            MasterProduct.approval_number_norm.in_(chunk)
+        ).order_by(MasterProduct.spu_id).all()
+        for prefix, spu_id in rows:
+            ids_by_prefix[prefix].append(spu_id)
+    for number, values in prefixes.items():
+        for prefix in values:
+            related[number].update({spu_id: "PREFIX" for spu_id in ids_by_prefix.get(prefix, ())})
+    return related
+
+def _prefix_related_ids(db, catalog, approval_number):
+    """与批准文号存在前缀关系的产品，返回 {spu_id: 来源}"""
+    return _prefix_related_ids_many(db, catalog, [approval_number]).get(approval_number, {})
+
+def _with_manufacturer_id(validated_data, resolved):
+    """为待匹配数据附加规范企业ID（resolved为 {生产企业名称: 规范企业ID}），返回 (附带manufacturer_id的数据, 企业ID)"""
+    manufacturer_id = validated_data.get("manufacturer_id") or resolved.get(validated_data.get("manufacturer"))
+    if manufacturer_id is None:
+        return validated_data, None
+    return {**validated_data, "manufacturer_id": manufacturer_id}, manufacturer_id
+
+def _same_manufacturer_ids_many(db, catalog, keys):
+    """同一规范企业下标准化名称相同的产品（企业名称写法差异较大时n-gram可能召回不到）
+
+    keys为 (规范企业ID, 标准化产品名称) 列表，返回 {key: [spu_id, ...]}；数据库查询按块合并为一次IN查询。
+    """
+    keys = list(dict.fromkeys((manufacturer_id, name) for manufacturer_id, name in keys if manufacturer_id is not None and name))
+    if catalog is not None:
+        return {key: [product.spu_id for product in catalog.find_by_manufacturer(*key)] for key in keys}
+    found = {key: [] for key in keys}
+    for chunk in _chunks(keys, BATCH_CHUNK_SIZE):
+        rows = db.query(MasterProduct.spu_id, MasterProduct.manufacturer_id, MasterProduct.product_name_norm).filter(
+            tuple_(MasterProduct.manufacturer_id, MasterProduct.product_name_norm).in_(chunk)
+        ).order_by(MasterProduct.spu_id).all()
+        for spu_id, manufacturer_id, name in rows:
+            found[(manufacturer_id, name)].append(spu_id)
+    return found
+
+def _rank_candidates(validated_data, products, threshold, limit):
+    """带分数上界剪枝的Top-K打分，返回分数不低于阈值的前N个产品（按分数降序）"""
+    return [
+        {"product": products[i], "score": score}
+        for i, score in top_k_candidates(validated_data, products, threshold, limit)
+    ]
 
 def find_matching_products(validated_data, threshold=40, limit=10):
     """查找匹配的产品"""
+    catalog = get_catalog()
+    raw_approval_number = validated_data.get("approval_number")
+    approval_number = normalize_approval_number(raw_approval_number)
+
+    # 如果有批准文号，优先按批准文号（标准化后）精确匹配；快照已加载时无需访问数据库
+    if approval_number and catalog is not None:
+        products = catalog.find_by_approval_number(approval_number)
+        if products:
+            return _exact_match_candidates(validated_data, products, limit)
+
     db = SessionLocal()
     try:
-        # 构建查询条件
-        query = db.query(MasterProduct)
-        
-        # 如果有批准文号，优先按批准文号精确匹配
-        approval_number = validated_data.get("approval_number")
-        if approval_number:
-            query = query.filter(MasterProduct.approval_number == approval_number)
-            products = query.all()
+        if approval_number and catalog is None:
+            products = db.query(MasterProduct).filter(
+                or_(
+                    MasterProduct.approval_number_norm == approval_number,
+                    MasterProduct.approval_number.in_(list({approval_number, raw_approval_number}))
+                )
+            ).all()
             if products:
                 # 如果找到精确匹配的批准文号，只返回这些产品
-                candidates = []
-                for product in products:
-                    score = calculate_match_score(validated_data, product)
-                    candidates.append({
-                        "product": product,
-                        "score": score
-                    })
-                return candidates[:limit]
-        
-        # 如果没有批准文号或没有精确匹配，进行模糊匹配
-        # 这里可以添加更多过滤条件以提高性能
-        products = query.limit(100).all()  # 限制查询数量以提高性能
+                return _exact_match_candidates(validated_data, products, limit)
         
-        # 计算匹配分数
-        candidates = []
-        for product in products:
-            score = calculate_match_score(validated_data, product)
-            if score >= threshold:
-                candidates.append({
-                    "product": product,
-                    "score": score
-                })
+        # 没有精确匹配时，从批准文号索引中取出存在前缀关系的产品
+        candidate_ids = _prefix_related_ids(db, catalog, approval_number)
         
-        # 按分数排序并返回前N个
-        candidates.sort(key=lambda x: x["score"], reverse=True)
-        return candidates[:limit]
+        # 解析规范企业ID：打分时按ID比较生产企业，并补充同一企业下同名的产品
+        validated_data, manufacturer_id = _with_manufacturer_id(
+            validated_data, resolve_manufacturer_ids(db, [validated_data.get("manufacturer")])
+        )
+        key = (manufacturer_id, normalized_value(validated_data, "product_name"))
+        for spu_id in _same_manufacturer_ids_many(db, catalog, [key]).get(key, []):
+            candidate_ids.setdefault(spu_id, "MANUFACTURER")
+
+        # 再通过n-gram倒排索引生成候选集，合并后进行模糊匹配
+        for spu_id in find_candidate_spu_ids(db, validated_data):
+            candidate_ids.setdefault(spu_id, "NGRAM")
+        products = _load_products(db, catalog, list(candidate_ids))
     finally:
         db.close()
 
+    # 批量计算匹配分数，按分数排序并返回前N个
+    return _rank_candidates(validated_data, products, threshold, limit)
+
+def match_products_batch(records, threshold=40, limit=10):
+    """批量匹配多条验证后的记录，返回与输入顺序一致的匹配结果列表
+
+    按批准文号分组后每块只执行一次IN查询；前缀相关的批准文号、规范企业ID和同企业同名产品
+    都对整批记录合并查询；相同名称/企业/品牌的记录共享n-gram候选集；所有候选产品一次性加载后逐条批量打分。
+    """
+    start_time = time.time()
+    logger.info(f"---BATCH MATCHER--- 记录数: {len(records)}")
+
+    try:
+        catalog = get_catalog()
+        records = list(records) # 解析出的规范企业ID写入记录副本，不修改调用方的数据
+        approval_numbers = [normalize_approval_number(record.get("approval_number")) for record in records]
+        ranked = [None] * len(records)
+
+        db = SessionLocal()
+        try:
+            # 按批准文号分组，精确匹配每个批准文号只查询一次
+            groups = defaultdict(list)
+            for i, approval_number in enumerate(approval_numbers):
+                if approval_number:
+                    groups[approval_number].append(i)
+
+            exact_products = defaultdict(list)
+            if catalog is not None:
+                for approval_number in groups:
+                    exact_products[approval_number].extend(catalog.find_by_approval_number(approval_number))
+            else:
+                for chunk in _chunks(list(groups), BATCH_CHUNK_SIZE):
+                    products = db.query(MasterProduct).filter(
+                        or_(MasterProduct.approval_number_norm.in_(chunk), MasterProduct.approval_number.in_(chunk))
+                    ).all()
+                    for product in products:
+                        exact_products[normalized_value(product, "approval_number")].append(product)
+
+            for approval_number, indexes in groups.items():
+                products = exact_products.get(approval_number)
+                if products:
+                    for i in indexes:
+                        ranked[i] = _exact_match_candidates(records[i], products, limit)
+
+            # 其余记录：前缀相关的批准文号、规范企业ID和同企业同名产品均对整批合并查询
+            remaining = [i for i in range(len(records)) if ranked[i] is None]
+            related_by_number = _prefix_related_ids_many(db, catalog, [approval_numbers[i] for i in remaining])
+            resolved = resolve_manufacturer_ids(
+                db, [records[i].get("manufacturer") for i in remaining if not records[i].get("manufacturer_id")]
+            )
+            manufacturer_keys = {}
+            for i in remaining:
+                records[i], manufacturer_id = _with_manufacturer_id(records[i], resolved)
+                manufacturer_keys[i] = (manufacturer_id, normalized_value(records[i], "product_name"))
+            same_manufacturer = _same_manufacturer_ids_many(db, catalog, manufacturer_keys.values())
+
+            # 合并n-gram候选集，相同检索键的记录共享候选集
+            ids_by_key = {}
+            ids_by_record = {}
+            for i in remaining:
+                record = records[i]
+                candidate_ids = dict(related_by_number.get(approval_numbers[i], {}))
+                for spu_id in same_manufacturer.get(manufacturer_keys[i], []):
+                    candidate_ids.setdefault(spu_id, "MANUFACTURER")
+                key = tuple(normalized_value(record, field) for field in NGRAM_FIELDS)
+                if key not in ids_by_key:
+                    ids_by_key[key] = find_candidate_spu_ids(db, record)
+                for spu_id in ids_by_key[key]:
+                    candidate_ids.setdefault(spu_id, "NGRAM")
+                ids_by_record[i] = list(candidate_ids)
+
+            all_ids = list({spu_id for ids in ids_by_record.values() for spu_id in ids})
+            products_by_id = {product.spu_id: product for product in _load_products(db, catalog, all_ids)}
+        finally:
+            db.close()
+
+        for i, candidate_ids in ids_by_record.items():
+            products = [products_by_id[spu_id] for spu_id in candidate_ids if spu_id in products_by_id]
+            ranked[i] = _rank_candidates(records[i], products, threshold, limit)
+
+        results = [
+            {"index": i, "match_result": build_match_result(candidates)}
+            for i, candidates in enumerate(ranked)
+        ]
+        logger.info(f"批量匹配完成，记录数: {len(records)}, 耗时: {time.time() - start_time:.3f}秒")
+
+        # 更新监控指标
+        TASK_PROCESSED.labels(status="success").inc()
+        TASK_DURATION.observe(time.time() - start_time)
+
+        return results
+    except Exception as e:
+        # 记录批量匹配失败日志
+        logger.error(f"批量匹配执行失败: {e}")
+
+        # 更新监控指标
+        TASK_PROCESSED.labels(status="error").inc()
+        TASK_DURATION.observe(time.time() - start_time)
+
+        # 重新抛出异常
+        raise
+
+def _candidate_info(candidate):
+    return {
+        "spu_id": candidate["product"].spu_id,
+        "score": candidate["score"],
+        "product_info": {
+            "product_name": candidate["product"].product_name,
+            "manufacturer": candidate["product"].manufacturer,
+            "approval_number": candidate["product"].approval_number
+        }
+    }
+
+def build_match_result(candidates):
+    """根据按分数降序排列的候选产品确定匹配状态"""
+    if not candidates:
+        # 没有找到匹配的产品
+        return {"status": "NO_MATCH", "spu_id": None, "candidates": []}
+
+    best_match = candidates[0]
+    best_score = best_match["score"]
+
+    # 根据分数确定匹配状态
+    if best_score >= 90:
+        # 完全匹配
+        return {"status": "MATCH", "spu_id": best_match["product"].spu_id, "candidates": []}
+    elif best_score >= 75:
+        # 高度相似，返回前5个候选
+        return {
+            "status": "HIGH_SIMILARITY",
+            "spu_id": best_match["product"].spu_id,
+            "candidates": [_candidate_info(candidate) for candidate in candidates[:5]]
+        }
+    else:
+        # 返回前10个候选
+        return {
+            "status": "CANDIDATES",
+            "spu_id": None,
+            "candidates": [_candidate_info(candidate) for candidate in candidates[:10]]
+        }
+
 def match_product(state):
     start_time = time.time()
     # 记录Matcher Agent开始执行
@@ -125,64 +334,15 @@ def match_product(state):
         
         # 查找匹配的产品
         candidates = find_matching_products(validated_data)
+        match_result = build_match_result(candidates)
         
-        match_result = {
-            "status": "NO_MATCH",
-            "spu_id": None,
-            "candidates": []
-        }
-        
-        if candidates:
-            best_match = candidates[0]
-            best_score = best_match["score"]
-            
-            # 根据分数确定匹配状态
-            if best_score >= 90:
-                # 完全匹配
-                match_result = {
-                    "status": "MATCH",
-                    "spu_id": best_match["product"].spu_id,
-                    "candidates": []
-                }
-                logger.info(f"完全匹配找到，SPU ID: {best_match['product'].spu_id}, 分数: {best_score}")
-            elif best_score >= 75:
-                # 高度相似
-                match_result = {
-                    "status": "HIGH_SIMILARITY",
-                    "spu_id": best_match["product"].spu_id,
-                    "candidates": [
-                        {
-                            "spu_id": candidate["product"].spu_id,
-                            "score": candidate["score"],
-                            "product_info": {
-                                "product_name": candidate["product"].product_name,
-                                "manufacturer": candidate["product"].manufacturer,
-                                "approval_number": candidate["product"].approval_number
-                            }
-                        } for candidate in candidates[:5]  # 返回前5个候选
-                    ]
-                }
-                logger.info(f"高度相似产品找到，最佳匹配SPU ID: {best_match['product'].spu_id}, 分数: {best_score}")
-            else:
-                # 返回候选结果
-                match_result = {
-                    "status": "CANDIDATES",
-                    "spu_id": None,
-                    "candidates": [
-                        {
-                            "spu_id": candidate["product"].spu_id,
-                            "score": candidate["score"],
-                            "product_info": {
-                                "product_name": candidate["product"].product_name,
-                                "manufacturer": candidate["product"].manufacturer,
-                                "approval_number": candidate["product"].approval_number
-                            }
-                        } for candidate in candidates[:10]  # 返回前10个候选
-                    ]
-                }
-                logger.info(f"找到{len(candidates)}个候选产品，最高分数: {best_score}")
+        if match_result["status"] == "MATCH":
+            logger.info(f"完全匹配找到，SPU ID: {match_result['spu_id']}, 分数: {candidates[0]['score']}")
+        elif match_result["status"] == "HIGH_SIMILARITY":
+            logger.info(f"高度相似产品找到，最佳匹配SPU ID: {match_result['spu_id']}, 分数: {candidates[0]['score']}")
+        elif match_result["status"] == "CANDIDATES":
+            logger.info(f"找到{len(candidates)}个候选产品，最高分数: {candidates[0]['score']}")
         else:
-            # 没有找到匹配的产品
             logger.info("没有找到匹配的产品")
         
         # 更新监控指标
@@ -199,4 +359,4 @@ def match_product(state):
         TASK_DURATION.observe(time.time() - start_time)
         
         # 重新抛出异常
-        raise
\ No newline at end of file
+        raise
@@ -1,6 +1,8 @@
 import time
 from app.database import SessionLocal
 from app.models.schema import MasterProduct
+from app.services.catalog_snapshot import get_catalog
+from app.utils.spec_parser import parse_specification, specifications_equivalent
 from app.utils.logging_config import get_logger, TASK_PROCESSED, TASK_DURATION
 
 # 初始化日志记录器
@@ -55,6 +57,11 @@ def merge_product_data(existing_product, new_data):
             # 更复杂的策略可以在这里实现
             if not existing_value:
                 fused_data[field] = new_value
+            elif field == "specification" and specifications_equivalent(
+                parse_specification(existing_value), parse_specification(new_value)
+            ):
+                # 写法不同但解析后含量和包装数量一致（如 "0.25g×24粒" 与 "250mg*24片"），不视为冲突
+                fused_data[field] = existing_value
             else:
                 # 两者都有值但不同，标记为冲突
                 conflicts.append({
@@ -82,6 +89,19 @@ def merge_product_data(existing_product, new_data):
     
     return fused_data, conflicts
 
+def get_existing_product(spu_id):
+    """获取已有主数据产品，优先从进程内快照读取，未命中时回退到数据库"""
+    catalog = get_catalog()
+    if catalog is not None:
+        product = catalog.get(spu_id)
+        if product is not None:
+            return product
+    db = SessionLocal()
+    try:
+        return db.query(MasterProduct).filter(MasterProduct.spu_id == spu_id).first()
+    finally:
+        db.close()
+
 def fuse_product(state):
     """融合产品数据"""
     start_time = time.time()
@@ -106,71 +126,63 @@ def fuse_product(state):
         if match_status == "MATCH":
             # 完全匹配，直接使用现有产品数据
             spu_id = match_result.get("spu_id")
-            db = SessionLocal()
-            try:
-                existing_product = db.query(MasterProduct).filter(MasterProduct.spu_id == spu_id).first()
-                if existing_product:
-                    # 对于完全匹配，我们可能只需要更新时间戳
-                    # 或者根据业务需求决定是否需要合并其他字段
-                    fusion_result = {
-                        "status": "FUSED",
-                        "fused_data": {
-                            "product_type": existing_product.product_type,
-                            "product_name": existing_product.product_name,
-                            "brand": existing_product.brand,
-                            "manufacturer": existing_product.manufacturer,
-                            "approval_number": existing_product.approval_number,
-                            "specification": existing_product.specification,
-                            "barcode": existing_product.barcode,
-                            "mah": existing_product.mah,
-                            "dosage_form": existing_product.dosage_form,
-                            "product_technical_requirements_number": existing_product.product_technical_requirements_number,
-                            "registration_classification": existing_product.registration_classification,
-                            "main_ingredients": existing_product.main_ingredients,
-                            "execution_standard": existing_product.execution_standard
-                        },
-                        "conflicts": [],
-                        "spu_id": spu_id
-                    }
-                    logger.info(f"完全匹配，使用现有产品数据，SPU ID: {spu_id}")
-                else:
-                    logger.warning(f"匹配到的SPU ID {spu_id} 在数据库中未找到")
-            finally:
-                db.close()
-                
+            existing_product = get_existing_product(spu_id)
+            if existing_product:
+                # 对于完全匹配，我们可能只需要更新时间戳
+                # 或者根据业务需求决定是否需要合并其他字段
+                fusion_result = {
+                    "status": "FUSED",
+                    "fused_data": {
+                        "product_type": existing_product.product_type,
+                        "product_name": existing_product.product_name,
+                        "brand": existing_product.brand,
+                        "manufacturer": existing_product.manufacturer,
+                        "approval_number": existing_product.approval_number,
+                        "specification": existing_product.specification,
+                        "barcode": existing_product.barcode,
+                        "mah": existing_product.mah,
+                        "dosage_form": existing_product.dosage_form,
+                        "product_technical_requirements_number": existing_product.product_technical_requirements_number,
+                        "registration_classification": existing_product.registration_classification,
+                        "main_ingredients": existing_product.main_ingredients,
+                        "execution_standard": existing_product.execution_standard
+                    },
+                    "conflicts": [],
+                    "spu_id": spu_id
+                }
+                logger.info(f"完全匹配，使用现有产品数据，SPU ID: {spu_id}")
+            else:
+                logger.warning(f"匹配到的SPU ID {spu_id} 在数据库中未找到")
+            
         elif match_status in ["HIGH_SIMILARITY", "CANDIDATES"]:
             # 高度相似或有候选产品，需要数据融合
             spu_id = match_result.get("spu_id")
             if spu_id:
-                db = SessionLocal()
-                try:
-                    existing_product = db.query(MasterProduct).filter(MasterProduct.spu_id == spu_id).first()
-                    if existing_product:
-                        # 合并数据
-                        fused_data, conflicts = merge_product_data(existing_product, validated_data)
-                        
-                        if conflicts:
-                            # 存在冲突，需要人工审核
-                            fusion_result = {
-                                "status": "NEEDS_REVIEW",
-                                "fused_data": fused_data,
-                                "conflicts": conflicts,
-                                "spu_id": spu_id
-                            }
-                            logger.info(f"数据融合发现冲突，需要人工审核，SPU ID: {spu_id}")
-                        else:
-                            # 无冲突，可以自动融合
-                            fusion_result = {
-                                "status": "FUSED",
-                                "fused_data": fused_data,
-                                "conflicts": [],
-                                "spu_id": spu_id
-                            }
-                            logger.info(f"数据融合成功，SPU ID: {spu_id}")
+                existing_product = get_existing_product(spu_id)
+                if existing_product:
+                    # 合并数据
+                    fused_data, conflicts = merge_product_data(existing_product, validated_data)
+                    
+                    if conflicts:
+                        # 存在冲突，需要人工审核
+                        fusion_result = {
+                            "status": "NEEDS_REVIEW",
+                            "fused_data": fused_data,
+                            "conflicts": conflicts,
+                            "spu_id": spu_id
+                        }
+                        logger.info(f"数据融合发现冲突，需要人工审核，SPU ID: {spu_id}")
                     else:
-                        logger.warning(f"匹配到的SPU ID {spu_id} 在数据库中未找到")
-                finally:
-                    db.close()
+                        # 无冲突，可以自动融合
+                        fusion_result = {
+                            "status": "FUSED",
+                            "fused_data": fused_data,
+                            "conflicts": [],
+                            "spu_id": spu_id
+                        }
+                        logger.info(f"数据融合成功，SPU ID: {spu_id}")
+                else:
+                    logger.warning(f"匹配到的SPU ID {spu_id} 在数据库中未找到")
             else:
                 # 没有明确的匹配产品，作为新产品处理
                 fusion_result = {
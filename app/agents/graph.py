@@ -1,6 +1,9 @@
 from langgraph.graph import StateGraph, END
-from typing import TypedDict, Literal, List, Dict, Any
+from typing import TypedDict, Literal, List, Dict, Any, Union
 from datetime import datetime
+from app.agents import classify_extract_agent
+from app.agents.classify_extract_agent import classify_and_extract
+from app.agents.nmpa_fast_path_agent import nmpa_fast_path
 from app.agents.classifier_agent import classify_product
 from app.agents.drug_extractor_agent import extract_drug_info
 from app.agents.device_extractor_agent import extract_device_info
@@ -27,7 +30,7 @@ class AgentState(TypedDict):
     validated_data: dict
     match_result: dict
     fusion_result: dict
-    review_reason: str
+    review_reason: Union[str, List[Dict[str, Any]]] # 文本或结构化的审核原因列表
     review_decision: Literal["APPROVED", "REJECTED"]
     review_id: int
     spu_id: int
@@ -38,6 +41,8 @@ class AgentState(TypedDict):
 workflow = StateGraph(AgentState)
 
 # Define the nodes
+workflow.add_node("nmpa_fast_path", nmpa_fast_path)
+workflow.add_node("classify_extract", classify_and_extract)
 workflow.add_node("classifier", classify_product)
 workflow.add_node("drug_extractor", extract_drug_info)
 workflow.add_node("device_extractor", extract_device_info)
@@ -51,7 +56,24 @@ workflow.add_node("fusion", fuse_product)
 workflow.add_node("request_review", request_review)
 
 # Define the edges
-workflow.set_entry_point("classifier")
+workflow.set_entry_point("nmpa_fast_path")
+
+def after_fast_path(state):
+    # 命中本地NMPA数据时已得到验证后的数据，直接进入匹配
+    if state.get("validated_data"):
+        return "matcher"
+    # 启用融合模式时先尝试一次LLM调用完成分类和提取
+    return "classify_extract" if classify_extract_agent.FUSED_CLASSIFY_EXTRACT_ENABLED else "classifier"
+
+workflow.add_conditional_edges(
+    "nmpa_fast_path", after_fast_path, {"matcher": "matcher", "classify_extract": "classify_extract", "classifier": "classifier"}
+)
+
+def after_classify_extract(state):
+    # 融合输出可用时跳过单独的分类和提取，直接验证；否则回退到原有流程
+    return "validator" if state.get("product_type") and state.get("extracted_data") else "classifier"
+
+workflow.add_conditional_edges("classify_extract", after_classify_extract, {"validator": "validator", "classifier": "classifier"})
 
 def route_to_extractor(state):
     # ... (routing logic remains the same)
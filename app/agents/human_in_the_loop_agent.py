@@ -11,7 +11,10 @@ logger = get_logger(__name__)
 def calculate_priority_score(state: Dict[str, Any]) -> int:
     """计算审核项的优先级评分"""
     score = 0
-    review_reason = state.get("review_reason", "")
+    review_reason = state.get("review_reason") or ""
+    if isinstance(review_reason, list):
+        # 结构化的审核原因按其中的说明文字评分
+        review_reason = " ".join(str(reason.get("message", "")) if isinstance(reason, dict) else str(reason) for reason in review_reason)
     
     # 根据审核原因类型评分
     if "关键字段" in review_reason or "批准文号" in review_reason:
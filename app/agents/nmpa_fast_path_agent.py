@@ -0,0 +1,127 @@
+import os
+import re
+import time
+import unicodedata
+from typing import Any, Dict, List, Optional
+from dotenv import load_dotenv
+from app.tools.nmpa_db_tools import query_nmpa_by_approval_numbers, query_nmpa_by_drug_codes
+from app.utils.approval_number import DRUG_APPROVAL_NUMBER_PATTERN, normalize_approval_number, split_approval_numbers
+from app.utils.logging_config import get_logger, NMPA_FAST_PATH, TASK_PROCESSED, TASK_DURATION
+from app.utils.similarity_kernel import compare_specifications
+from app.utils.spec_parser import parse_specification
+
+load_dotenv()
+
+# 初始化日志记录器
+logger = get_logger(__name__)
+
+# 是否启用NMPA快速通道（命中本地NMPA数据时跳过LLM分类、提取和验证）
+NMPA_FAST_PATH_ENABLED = os.getenv("NMPA_FAST_PATH_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# 药品本位码：以86开头的14位数字
+_DRUG_CODE_PATTERN = re.compile(r"(?<!\d)86\d{12}(?!\d)")
+
+def detect_nmpa_identifiers(raw_text: str) -> Dict[str, List[str]]:
+    """从原始文本中识别国药准字批准文号和药品本位码（去重并保持出现顺序）"""
+    # 批准文号中常夹有空格，去除空白后匹配；本位码保留空白，避免与相邻的数字连成一串
+    return {
+        "approval_numbers": list(dict.fromkeys(DRUG_APPROVAL_NUMBER_PATTERN.findall(normalize_approval_number(raw_text)))),
+        "drug_codes": list(dict.fromkeys(_DRUG_CODE_PATTERN.findall(unicodedata.normalize("NFKC", raw_text or "")))),
+    }
+
+def _record_key(record: Dict[str, Any]) -> tuple:
+    return (
+        record.get("product_name"), record.get("specification"), record.get("dosage_form"),
+        record.get("manufacturer") or record.get("company_cn"),
+    )
+
+def _select_record(records: List[Dict[str, Any]], raw_text: str) -> Optional[Dict[str, Any]]:
+    """同一批准文号可能对应多个规格的本位码记录：唯一时直接采用，否则按原文中的规格筛选，仍不唯一则放弃"""
+    distinct = list({_record_key(record): record for record in records}.values())
+    if len(distinct) == 1:
+        return distinct[0]
+    raw_spec = parse_specification(raw_text)
+    matched = [record for record in distinct if compare_specifications(raw_spec, parse_specification(record.get("specification")))]
+    return matched[0] if len(matched) == 1 else None
+
+def nmpa_record_to_product(record: Dict[str, Any], approval_number: Optional[str] = None) -> Dict[str, Any]:
+    """将NMPA记录转换为与药品提取Agent输出字段一致的商品信息"""
+    if record.get("source") == "进口药品":
+        return {
+            "approval_number": normalize_approval_number(record.get("registration_number")),
+            "product_name": record.get("product_name") or "",
+            "brand": "",
+            "specification": record.get("specification") or "",
+            "manufacturer": record.get("company_cn") or record.get("company_en") or "",
+            "dosage_form": record.get("dosage_form") or "",
+            "mah": record.get("mah_cn") or record.get("mah_en") or "",
+        }
+    approval_numbers = split_approval_numbers(record.get("approval_numbers"))
+    return {
+        "approval_number": approval_number or (approval_numbers[0] if approval_numbers else ""),
+        "product_name": record.get("product_name") or "",
+        "brand": "",
+        "specification": record.get("specification") or "",
+        "manufacturer": record.get("manufacturer") or "",
+        "dosage_form": record.get("dosage_form") or "",
+        "mah": record.get("mah") or "",
+    }
+
+def resolve_nmpa_product(raw_text: str) -> Optional[Dict[str, Any]]:
+    """根据原文中的本位码或批准文号在本地NMPA数据中确定唯一药品，无法确定时返回None
+
+    本位码精确到规格和包装，优先使用；其次使用批准文号。
+    """
+    identifiers = detect_nmpa_identifiers(raw_text)
+    if identifiers["drug_codes"]:
+        found = query_nmpa_by_drug_codes.invoke({"drug_codes": identifiers["drug_codes"]})
+        records = [record for record in found.values() if record]
+        record = _select_record(records, raw_text) if records else None
+        if record:
+            return nmpa_record_to_product(record, identifiers["approval_numbers"][0] if identifiers["approval_numbers"] else None)
+    if identifiers["approval_numbers"]:
+        found = query_nmpa_by_approval_numbers.invoke({"approval_numbers": identifiers["approval_numbers"]})
+        hits = [(approval_number, records) for approval_number, records in found.items() if records]
+        # 原文中出现多个都能命中的批准文号时无法判断是哪一个商品
+        if len(hits) == 1:
+            approval_number, records = hits[0]
+            record = _select_record(records, raw_text)
+            if record:
+                return nmpa_record_to_product(record, approval_number)
+    return None
+
+def nmpa_fast_path(state):
+    """确定性的预提取阶段：原文含有本地NMPA数据中可唯一确定的批准文号/本位码时，
+    直接以NMPA数据填充提取和验证结果，跳过分类、提取和验证三个LLM节点。"""
+    start_time = time.time()
+    # 记录NMPA快速通道开始执行
+    logger.info("---NMPA FAST PATH---")
+    if not NMPA_FAST_PATH_ENABLED:
+        return {"current_node": "nmpa_fast_path"}
+
+    try:
+        product = resolve_nmpa_product(state["raw_text"])
+    except Exception as e:
+        # 快速通道只是优化，查询失败时回退到LLM流程
+        logger.warning(f"NMPA快速通道查询失败，回退到LLM流程: {e}")
+        NMPA_FAST_PATH.labels(result="error").inc()
+        TASK_PROCESSED.labels(status="error").inc()
+        TASK_DURATION.observe(time.time() - start_time)
+        return {"current_node": "nmpa_fast_path"}
+
+    TASK_PROCESSED.labels(status="success").inc()
+    TASK_DURATION.observe(time.time() - start_time)
+    if product is None:
+        NMPA_FAST_PATH.labels(result="miss").inc()
+        return {"current_node": "nmpa_fast_path"}
+
+    # 记录命中的NMPA数据
+    logger.info(f"NMPA fast path hit: {product}")
+    NMPA_FAST_PATH.labels(result="hit").inc()
+    return {
+        "product_type": "药品",
+        "extracted_data": product,
+        "validated_data": product,
+        "review_reason": None,
+        "current_node": "nmpa_fast_path",
+    }
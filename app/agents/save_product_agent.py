@@ -1,6 +1,13 @@
 import time
 from app.database import SessionLocal
 from app.models.schema import MasterProduct
+from app.services.approval_number_filter import add_approval_number
+from app.services.catalog_snapshot import refresh_catalog
+from app.services.manufacturer_resolver import get_or_create_manufacturer_id
+from app.services.ngram_index import index_product
+from app.utils.approval_number import normalize_approval_number
+from app.utils.spec_parser import specification_columns
+from app.utils.text_normalize import normalized_columns
 from app.utils.logging_config import get_logger, TASK_PROCESSED, TASK_DURATION
 
 # 初始化日志记录器
@@ -26,7 +33,7 @@ def save_product(state):
             product_name=validated_data.get("product_name"),
             brand=validated_data.get("brand"),
             manufacturer=validated_data.get("manufacturer"),
-            approval_number=validated_data.get("approval_number"),
+            approval_number=normalize_approval_number(validated_data.get("approval_number")) or None,
             specification=validated_data.get("specification"),
             barcode=validated_data.get("barcode"),
             mah=validated_data.get("mah"),
@@ -34,12 +41,21 @@ def save_product(state):
             product_technical_requirements_number=validated_data.get("product_technical_requirements_number"),
             registration_classification=validated_data.get("registration_classification"),
             main_ingredients=validated_data.get("main_ingredients"),
-            execution_standard=validated_data.get("execution_standard")
+            execution_standard=validated_data.get("execution_standard"),
+            manufacturer_id=get_or_create_manufacturer_id(db, validated_data.get("manufacturer")),
+            # 写入时一次性计算标准化匹配列和结构化规格列
+            **normalized_columns(validated_data),
+            **specification_columns(validated_data.get("specification"))
         )
         db.add(new_product)
+        db.flush() # 获取spu_id，以便在同一事务中维护n-gram倒排索引
+        index_product(db, new_product)
         db.commit()
         db.refresh(new_product)
         spu_id = new_product.spu_id
+        # 增量刷新进程内的主数据快照
+        refresh_catalog(db)
+        add_approval_number(new_product.approval_number)
         # 记录成功保存新产品日志
         logger.info(f"Successfully saved new product with SPU ID: {spu_id}")
         
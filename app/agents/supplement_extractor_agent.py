@@ -4,10 +4,13 @@ from pydantic import BaseModel, Field
 from typing import Optional
 import os
 from dotenv import load_dotenv
+from app.utils.llm_cache import cached_chain
 from app.utils.llm_utils import get_llm_instance # 导入统一的LLM获取函数
 
 load_dotenv()
 
+PROMPT_VERSION = 1
+
 class SupplementInfo(BaseModel):
     """保健品信息"""
     approval_number: Optional[str] = Field(description="批准文号 / 备案号 (国食健注/食健备...)")
@@ -34,7 +37,7 @@ def extract_supplement_info(state):
         ("human", "{raw_text}\n{format_instructions}")
     ]).partial(format_instructions=parser.get_format_instructions())
 
-    chain = prompt | llm | parser
+    chain = cached_chain("supplement_extractor", PROMPT_VERSION, prompt, llm, parser)
     
     extracted_data = chain.invoke({"raw_text": raw_text})
     
@@ -6,11 +6,19 @@ from typing import Dict, Any, List, Optional
 import os
 from dotenv import load_dotenv
 import json
+from app.database import SessionLocal
+from app.models.schema import MasterProduct
+from app.services.approval_number_filter import get_approval_number_filter
+from app.tools.nmpa_db_tools import query_nmpa_by_approval_number
+from app.utils.llm_cache import cached_chain
 from app.utils.llm_utils import get_llm_instance # 导入统一的LLM获取函数
-from app.utils.logging_config import get_logger, TASK_PROCESSED, TASK_DURATION
+from app.utils.approval_number import DRUG_APPROVAL_NUMBER_PATTERN, normalize_approval_number
+from app.utils.logging_config import get_logger, APPROVAL_NUMBER_PRECHECK, TASK_PROCESSED, TASK_DURATION
 
 load_dotenv()
 
+PROMPT_VERSION = 1
+
 # 初始化日志记录器
 logger = get_logger(__name__)
 
@@ -20,6 +28,50 @@ class ValidationResult(BaseModel):
     review_reason: Optional[str] = Field(description="如果验证失败，提供具体原因")
     validated_data: Optional[Dict[str, Any]] = Field(description="如果验证通过，返回经过验证的数据")
 
+def normalize_identifiers(data: Dict[str, Any]) -> Dict[str, Any]:
+    """统一批准文号格式（全角/半角、空白、大小写），与匹配器和NMPA工具共用同一标准化规则"""
+    if data and data.get("approval_number"):
+        return {**data, "approval_number": normalize_approval_number(data["approval_number"])}
+    return data
+
+def _approval_number_registered(approval_number: str) -> bool:
+    """精确确认批准文号是否已在NMPA数据或主数据中登记（布隆过滤器构建之后可能有新数据写入）"""
+    if query_nmpa_by_approval_number.invoke({"approval_number": approval_number}):
+        return True
+    db = SessionLocal()
+    try:
+        return db.query(MasterProduct.spu_id).filter(MasterProduct.approval_number_norm == approval_number).first() is not None
+    finally:
+        db.close()
+
+def precheck_approval_number(data: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+    """在调用LLM前检查国药准字批准文号：格式错误或确定未登记时返回结构化的审核原因，否则返回None
+
+    布隆过滤器判定可能存在的批准文号直接放行（微秒级）；判定不存在的再做一次精确查询确认。
+    只检查国药准字批准文号，器械、化妆品等的编号不在NMPA药品数据中。
+    """
+    approval_number = normalize_approval_number((data or {}).get("approval_number"))
+    if not approval_number.startswith("国药准字"):
+        APPROVAL_NUMBER_PRECHECK.labels(result="skipped").inc()
+        return None
+    if not DRUG_APPROVAL_NUMBER_PATTERN.fullmatch(approval_number):
+        APPROVAL_NUMBER_PRECHECK.labels(result="invalid_format").inc()
+        return [{
+            "type": "INVALID_APPROVAL_NUMBER",
+            "message": f"批准文号格式不正确: {approval_number}（应为 国药准字 + 字母 + 8位数字）",
+            "approval_number": approval_number,
+        }]
+    approval_filter = get_approval_number_filter()
+    if approval_filter is None or approval_filter.might_exist(approval_number) or _approval_number_registered(approval_number):
+        APPROVAL_NUMBER_PRECHECK.labels(result="passed").inc()
+        return None
+    APPROVAL_NUMBER_PRECHECK.labels(result="not_registered").inc()
+    return [{
+        "type": "APPROVAL_NUMBER_NOT_REGISTERED",
+        "message": f"批准文号未在NMPA数据和主数据中登记: {approval_number}",
+        "approval_number": approval_number,
+    }]
+
 def validate_data(state: Dict[str, Any]) -> Dict[str, Any]:
     start_time = time.time()
     # 记录Validator Agent开始执行
@@ -27,6 +79,17 @@ def validate_data(state: Dict[str, Any]) -> Dict[str, Any]:
     extracted_data = state["extracted_data"]
     product_type = state["product_type"]
 
+    # 在交给LLM验证前统一批准文号格式
+    extracted_data = normalize_identifiers(extracted_data)
+
+    # 批准文号格式错误或确定未登记时直接转人工审核，无需调用LLM
+    precheck_reasons = precheck_approval_number(extracted_data)
+    if precheck_reasons:
+        logger.warning(f"Approval number precheck failed: {precheck_reasons}")
+        TASK_PROCESSED.labels(status="success").inc()
+        TASK_DURATION.observe(time.time() - start_time)
+        return {"validated_data": extracted_data, "review_reason": precheck_reasons, "current_node": "validator"}
+
     llm = get_llm_instance() # 使用统一函数获取LLM实例
     parser = JsonOutputParser(pydantic_object=ValidationResult)
 
@@ -48,7 +111,7 @@ def validate_data(state: Dict[str, Any]) -> Dict[str, Any]:
         ("human", f"请验证以下提取出的商品信息：\n{{extracted_data}}") # 添加格式指令
     ])
 
-    validation_chain = prompt | llm | parser
+    validation_chain = cached_chain("validator", PROMPT_VERSION, prompt, llm, parser)
 
     try:
         # 调用LLM进行验证
@@ -67,7 +130,7 @@ def validate_data(state: Dict[str, Any]) -> Dict[str, Any]:
                 TASK_PROCESSED.labels(status="success").inc()
                 TASK_DURATION.observe(time.time() - start_time)
                 
-                return {"validated_data": validation_output.get("validated_data") or extracted_data, "review_reason": None, "current_node": "validator"}
+                return {"validated_data": normalize_identifiers(validation_output.get("validated_data") or extracted_data), "review_reason": None, "current_node": "validator"}
             else:
                 # 记录验证失败日志
                 logger.warning(f"Validation failed: {validation_output.get('review_reason')}")
@@ -86,7 +149,7 @@ def validate_data(state: Dict[str, Any]) -> Dict[str, Any]:
                 TASK_PROCESSED.labels(status="success").inc()
                 TASK_DURATION.observe(time.time() - start_time)
                 
-                return {"validated_data": validation_output.validated_data or extracted_data, "review_reason": None, "current_node": "validator"}
+                return {"validated_data": normalize_identifiers(validation_output.validated_data or extracted_data), "review_reason": None, "current_node": "validator"}
             else:
                 # 记录验证失败日志
                 logger.warning(f"Validation failed: {validation_output.review_reason}")
@@ -1,9 +1,11 @@
+import os
 import uuid
 import json
 import time
 from fastapi import APIRouter, BackgroundTasks, HTTPException
 from app.services.product_service import process_product_task, save_approved_product_task
-from app.models.schema import ReviewQueue, MasterProduct, ProcessRequest, ReviewQueueItem
+from app.models.schema import ReviewQueue, MasterProduct, ProcessRequest, ReviewQueueItem, BatchMatchRequest, DuplicateCluster, DuplicateClusterItem
+from app.agents.enhanced_matcher_agent import match_products_batch
 from app.database import SessionLocal
 from app.agents.graph import AgentState
 from app.utils.logging_config import get_logger, REQUEST_COUNT, REQUEST_DURATION
@@ -14,6 +16,9 @@ logger = get_logger(__name__)
 
 router = APIRouter()
 
+# 单次批量匹配请求允许的最大记录数，超过时返回413
+BATCH_MATCH_MAX_RECORDS = int(os.getenv("BATCH_MATCH_MAX_RECORDS", "1000"))
+
 tasks = {}
 
 @router.post("/products/process")
@@ -29,6 +34,34 @@ async def process_product(request: ProcessRequest, background_tasks: BackgroundT
     
     return {"task_id": task_id, "status": "PROCESSING"}
 
+@router.post("/products/match/batch")
+def match_batch(request: BatchMatchRequest):
+    """
+    批量匹配验证后的商品数据
+    
+    Args:
+        request: 包含待匹配记录列表的请求体（最多BATCH_MATCH_MAX_RECORDS条），结果按输入顺序返回
+    """
+    start_time = time.time()
+    if len(request.records) > BATCH_MATCH_MAX_RECORDS:
+        # 更新错误监控指标
+        REQUEST_COUNT.labels(method="POST", endpoint="/api/products/match/batch", status=413).inc()
+        REQUEST_DURATION.labels(method="POST", endpoint="/api/products/match/batch").observe(time.time() - start_time)
+        raise HTTPException(status_code=413, detail=f"Too many records: {len(request.records)} > {BATCH_MATCH_MAX_RECORDS}")
+    try:
+        results = match_products_batch(request.records)
+        
+        # 更新监控指标
+        REQUEST_COUNT.labels(method="POST", endpoint="/api/products/match/batch", status=200).inc()
+        REQUEST_DURATION.labels(method="POST", endpoint="/api/products/match/batch").observe(time.time() - start_time)
+        
+        return {"total": len(results), "results": results}
+    except Exception as e:
+        # 更新错误监控指标
+        REQUEST_COUNT.labels(method="POST", endpoint="/api/products/match/batch", status=500).inc()
+        REQUEST_DURATION.labels(method="POST", endpoint="/api/products/match/batch").observe(time.time() - start_time)
+        raise
+
 @router.get("/products/status/{task_id}")
 def get_status(task_id: str):
     start_time = time.time()
@@ -184,6 +217,65 @@ async def submit_review(
     finally:
         db.close()
 
+@router.get("/products/duplicates", response_model=List[DuplicateClusterItem])
+def get_duplicate_clusters(status: str = "PENDING", limit: int = 100):
+    """
+    获取离线去重任务发现的疑似重复商品簇
+    
+    Args:
+        status: 簇状态，PENDING/CONFIRMED/DISMISSED，默认为PENDING
+        limit: 返回的最大簇数量，按簇大小和相似度降序
+    """
+    start_time = time.time()
+    db = SessionLocal()
+    try:
+        items = db.query(DuplicateCluster).filter(DuplicateCluster.status == status).order_by(
+            DuplicateCluster.size.desc(), DuplicateCluster.similarity.desc()
+        ).limit(limit).all()
+        
+        # 更新监控指标
+        REQUEST_COUNT.labels(method="GET", endpoint="/api/products/duplicates", status=200).inc()
+        REQUEST_DURATION.labels(method="GET", endpoint="/api/products/duplicates").observe(time.time() - start_time)
+        
+        return items
+    except Exception as e:
+        # 更新错误监控指标
+        REQUEST_COUNT.labels(method="GET", endpoint="/api/products/duplicates", status=500).inc()
+        REQUEST_DURATION.labels(method="GET", endpoint="/api/products/duplicates").observe(time.time() - start_time)
+        raise
+    finally:
+        db.close()
+
+@router.post("/products/duplicates/{cluster_id}/resolve")
+def resolve_duplicate_cluster(cluster_id: int, confirmed: bool):
+    """
+    审核疑似重复商品簇
+    
+    Args:
+        cluster_id: 簇ID
+        confirmed: True表示确认为重复商品，False表示忽略
+    """
+    start_time = time.time()
+    db = SessionLocal()
+    try:
+        cluster = db.query(DuplicateCluster).filter(DuplicateCluster.cluster_id == cluster_id).first()
+        if not cluster:
+            # 更新错误监控指标
+            REQUEST_COUNT.labels(method="POST", endpoint="/api/products/duplicates/{cluster_id}/resolve", status=404).inc()
+            REQUEST_DURATION.labels(method="POST", endpoint="/api/products/duplicates/{cluster_id}/resolve").observe(time.time() - start_time)
+            raise HTTPException(status_code=404, detail="Duplicate cluster not found")
+        
+        cluster.status = "CONFIRMED" if confirmed else "DISMISSED"
+        db.commit()
+        
+        # 更新监控指标
+        REQUEST_COUNT.labels(method="POST", endpoint="/api/products/duplicates/{cluster_id}/resolve", status=200).inc()
+        REQUEST_DURATION.labels(method="POST", endpoint="/api/products/duplicates/{cluster_id}/resolve").observe(time.time() - start_time)
+        
+        return {"status": "SUCCESS", "cluster_id": cluster_id, "new_status": cluster.status}
+    finally:
+        db.close()
+
 @router.get("/products")
 def get_all_products():
     start_time = time.time()
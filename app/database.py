@@ -1,4 +1,5 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import sessionmaker
 from app.models.schema import Base
 from app.models import nmpa_data # 导入nmpa_data模块以确保其模型被Base.metadata识别
@@ -10,7 +11,42 @@ load_dotenv()
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./test.db")
 
 engine = create_engine(DATABASE_URL)
+
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        # WAL模式下写事务（如NMPA数据导入）不阻塞读取
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.close()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+def dialect_insert(db, model):
+    """按会话绑定的数据库方言构造INSERT语句，以便使用 ON CONFLICT（SQLite、PostgreSQL均支持）"""
+    if db.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+def upgrade_schema(bind=engine):
+    """为已存在的表补充模型中新增的列和索引（仅做增量添加，不修改或删除已有列）"""
+    inspector = inspect(bind)
+    existing_tables = set(inspector.get_table_names())
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_type = column.type.compile(dialect=bind.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+            # 全量导入换入的NMPA表索引名带有导入标识，按列判断索引是否已存在
+            indexed_columns = {tuple(index["column_names"]) for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if tuple(column.name for column in index.columns) not in indexed_columns:
+                    index.create(bind=conn, checkfirst=True)
+
 def init_db():
     Base.metadata.create_all(bind=engine)
+    upgrade_schema()
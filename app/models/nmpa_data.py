@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text
+from sqlalchemy import Column, DateTime, Integer, String, Text, UniqueConstraint, func
 from app.models.schema import Base
 
 class NMPADomesticDrug(Base):
@@ -12,10 +12,25 @@ class NMPADomesticDrug(Base):
     mah = Column(String(255), index=True) # 上市许可持有人
     manufacturer = Column(String(255), index=True) # 生产单位
     remarks = Column(Text) # 药品编码备注
+    row_hash = Column(String(40)) # 源数据行的哈希，增量导入时据此判断记录是否变化
 
     def __repr__(self):
         return f"<NMPADomesticDrug(drug_code='{self.drug_code}', product_name='{self.product_name}')>"
 
+class NMPADomesticApprovalNumber(Base):
+    """国产药品批准文号明细（由approval_numbers拆分并标准化），用于按批准文号的等值查询"""
+    __tablename__ = 'nmpa_domestic_approval_numbers'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    approval_number = Column(String(255), nullable=False) # 标准化后的单个批准文号
+    drug_id = Column(Integer, nullable=False, index=True) # nmpa_domestic_drugs.id
+
+    __table_args__ = (
+        UniqueConstraint('approval_number', 'drug_id', name='uq_nmpa_domestic_approval_numbers_number_drug'),
+    )
+
+    def __repr__(self):
+        return f"<NMPADomesticApprovalNumber(approval_number='{self.approval_number}', drug_id={self.drug_id})>"
+
 class NMPAImportedDrug(Base):
     __tablename__ = 'nmpa_imported_drugs'
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -29,6 +44,17 @@ class NMPAImportedDrug(Base):
     dosage_form = Column(String(100)) # 剂型
     specification = Column(String(255)) # 规格
     remarks = Column(Text) # 药品编码备注
+    row_hash = Column(String(40)) # 源数据行的哈希，增量导入时据此判断记录是否变化
 
     def __repr__(self):
         return f"<NMPAImportedDrug(drug_code='{self.drug_code}', product_name='{self.product_name}')>"
+
+class NMPADataVersion(Base):
+    """NMPA数据版本：导入脚本每次成功导入后追加一行，应用据此使NMPA查询缓存失效"""
+    __tablename__ = 'nmpa_data_versions'
+    version = Column(Integer, primary_key=True, autoincrement=True)
+    description = Column(String(255)) # 本次导入的数据说明
+    imported_at = Column(DateTime, default=func.now())
+
+    def __repr__(self):
+        return f"<NMPADataVersion(version={self.version}, imported_at='{self.imported_at}')>"
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, func, JSON
+from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, func, JSON, Float, Index, PrimaryKeyConstraint, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from pydantic import BaseModel
@@ -23,8 +23,62 @@ class MasterProduct(Base):
     registration_classification = Column(String(100)) # 注册分类 (器械特有)
     main_ingredients = Column(String(500)) # 成分/主要原料 (药妆, 保健品, 中药饮片特有)
     execution_standard = Column(String(255)) # 执行标准 (药妆, 保健品, 中药饮片特有)
+    # 标准化的匹配列（写入时计算一次，匹配和查询时直接使用）
+    product_name_norm = Column(String(255), index=True)
+    manufacturer_norm = Column(String(255), index=True)
+    specification_norm = Column(String(255), index=True)
+    approval_number_norm = Column(String(255), index=True)
+    manufacturer_id = Column(Integer, index=True) # 规范生产企业ID（manufacturers.id）
+    # 结构化规格（由规格解析器写入时计算，含量已换算为mg/ml/iu）
+    spec_strength = Column(Float)
+    spec_strength_unit = Column(String(16))
+    spec_pack_count = Column(Integer)
+    spec_pack_unit = Column(String(16))
     created_at = Column(DateTime, default=func.now())
-    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now(), index=True) # 主数据快照增量刷新的水位线
+
+    __table_args__ = (
+        Index('ix_master_products_spec', 'spec_strength', 'spec_strength_unit', 'spec_pack_count'),
+        Index('ix_master_products_manufacturer_name', 'manufacturer_id', 'product_name_norm'),
+    )
+
+class Manufacturer(Base):
+    """规范生产企业（上市许可持有人/生产单位）实体"""
+    __tablename__ = 'manufacturers'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String(255), nullable=False) # 规范名称（首次出现时的原始写法）
+    name_norm = Column(String(255), nullable=False, unique=True) # 标准化名称
+    created_at = Column(DateTime, default=func.now())
+
+class ManufacturerAlias(Base):
+    """生产企业别名（标准化后）到规范企业的映射，如中英文名称、历史名称等"""
+    __tablename__ = 'manufacturer_aliases'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    alias_norm = Column(String(255), nullable=False, unique=True)
+    manufacturer_id = Column(Integer, nullable=False, index=True)
+
+class MasterProductNgram(Base):
+    """主数据商品名称/生产企业/品牌的字符n-gram倒排索引（posting表）"""
+    __tablename__ = 'master_product_ngrams'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    gram = Column(String(16), nullable=False) # 字符二元/三元组
+    field = Column(String(32), nullable=False) # 来源字段: product_name, manufacturer, brand
+    spu_id = Column(Integer, nullable=False, index=True)
+
+    __table_args__ = (
+        UniqueConstraint('gram', 'field', 'spu_id', name='uq_master_product_ngrams_gram_field_spu'),
+    )
+
+class MasterProductNgramStat(Base):
+    """n-gram的文档频次统计，用于查询时跳过高频（低区分度）的n-gram"""
+    __tablename__ = 'master_product_ngram_stats'
+    gram = Column(String(16), nullable=False)
+    field = Column(String(32), nullable=False)
+    doc_count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        PrimaryKeyConstraint('gram', 'field'),
+    )
 
 class ReviewQueue(Base):
     __tablename__ = 'review_queue'
@@ -42,11 +96,26 @@ class ReviewQueue(Base):
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
 
+class DuplicateCluster(Base):
+    """离线去重任务发现的疑似重复商品簇，供审核界面确认或忽略"""
+    __tablename__ = 'duplicate_clusters'
+    cluster_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    run_id = Column(String(64), index=True, nullable=False) # 去重任务批次
+    spu_ids = Column(JSON, nullable=False) # 簇内商品的SPU ID列表（升序，第一个为代表商品）
+    size = Column(Integer, nullable=False)
+    similarity = Column(Float) # 簇内商品与代表商品的最低估计相似度（MinHash估计的Jaccard相似度）
+    status = Column(String(50), default="PENDING", index=True) # PENDING, CONFIRMED, DISMISSED
+    created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
 # Pydantic models for API request/response
 class ProcessRequest(BaseModel):
     raw_text: str
     sid: Optional[str] = None # Socket ID for real-time updates
 
+class BatchMatchRequest(BaseModel):
+    records: List[Dict[str, Any]] # 验证后的结构化商品数据列表
+
 class ProductCreate(BaseModel):
     product_type: str
     product_name: str
@@ -109,4 +178,17 @@ class ReviewQueueItem(BaseModel):
     updated_at: datetime
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class DuplicateClusterItem(BaseModel):
+    cluster_id: int
+    run_id: str
+    spu_ids: List[int]
+    size: int
+    similarity: Optional[float]
+    status: str
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
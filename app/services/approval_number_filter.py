@@ -0,0 +1,121 @@
+import threading
+import time
+from typing import Any, Optional
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models.nmpa_data import NMPADomesticApprovalNumber, NMPADomesticDrug, NMPAImportedDrug
+from app.models.schema import MasterProduct
+from app.tools.nmpa_db_tools import NMPA_VERSION_CHECK_INTERVAL
+from app.tools.nmpa_search import current_nmpa_data_version
+from app.utils.approval_number import normalize_approval_number
+from app.utils.bloom_filter import BloomFilter
+from app.utils.logging_config import get_logger
+
+# 初始化日志记录器
+logger = get_logger(__name__)
+
+# 布隆过滤器的误判率，以及为加载后新保存的商品预留的容量比例
+APPROVAL_FILTER_ERROR_RATE = 0.001
+APPROVAL_FILTER_HEADROOM = 1.5
+
+class ApprovalNumberFilter:
+    """已登记批准文号的进程内布隆过滤器
+
+    包含NMPA国产药品批准文号、进口药品注册证号和主数据商品的批准文号。
+    判定为不存在的批准文号一定不在构建时的数据中；判定为存在的可能误判。
+    构建时记录NMPA数据版本，导入脚本登记新版本后由refresh重新构建（与NMPA查询缓存的失效方式一致）。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self._bloom: Optional[BloomFilter] = None
+        self._version: Optional[int] = None # 构建时的NMPA数据版本，未构建过时为None
+        self._version_checked_at = 0.0
+
+    @property
+    def loaded(self) -> bool:
+        return self._bloom is not None
+
+    def load(self, db: Session):
+        """全量构建过滤器；尚未导入NMPA数据时不构建（预检随之跳过），避免把所有新批准文号判为未登记"""
+        version = current_nmpa_data_version(db)
+        with self._lock:
+            self._version = version
+            self._version_checked_at = time.monotonic()
+        if db.query(NMPADomesticDrug.id).first() is None and db.query(NMPAImportedDrug.id).first() is None:
+            with self._lock:
+                self._bloom = None
+            logger.warning("NMPA数据为空，跳过批准文号布隆过滤器的构建，批准文号预检不生效")
+            return
+        queries = [
+            db.query(NMPADomesticApprovalNumber.approval_number),
+            db.query(NMPAImportedDrug.registration_number),
+            db.query(MasterProduct.approval_number_norm),
+        ]
+        capacity = int(sum(query.count() for query in queries) * APPROVAL_FILTER_HEADROOM) + 1000
+        bloom = BloomFilter(capacity, APPROVAL_FILTER_ERROR_RATE)
+        for query in queries:
+            for value, in query.yield_per(10000):
+                approval_number = normalize_approval_number(value)
+                if approval_number:
+                    bloom.add(approval_number)
+        with self._lock:
+            self._bloom = bloom
+        logger.info(f"批准文号布隆过滤器构建完成，共 {len(bloom)} 个批准文号")
+
+    def needs_version_check(self) -> bool:
+        """应用启动时构建过，且距上次比对NMPA数据版本已超过检查间隔"""
+        with self._lock:
+            return self._version is not None and time.monotonic() - self._version_checked_at >= NMPA_VERSION_CHECK_INTERVAL
+
+    def refresh(self, db: Session):
+        """按NMPA_VERSION_CHECK_INTERVAL的间隔比对NMPA数据版本，版本变化时重新构建
+
+        重建期间其他线程继续使用旧的过滤器：旧过滤器判定不存在的批准文号还会经过精确查询确认，不会误判。
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._version is None or now - self._version_checked_at < NMPA_VERSION_CHECK_INTERVAL:
+                return
+            self._version_checked_at = now
+        if current_nmpa_data_version(db) == self._version or not self._rebuild_lock.acquire(blocking=False):
+            return
+        try:
+            logger.info("NMPA数据版本已变化，重新构建批准文号布隆过滤器")
+            self.load(db)
+        finally:
+            self._rebuild_lock.release()
+
+    def add(self, approval_number: Any):
+        approval_number = normalize_approval_number(approval_number)
+        if self._bloom is not None and approval_number:
+            self._bloom.add(approval_number)
+
+    def might_exist(self, approval_number: Any) -> bool:
+        """批准文号是否可能已登记（过滤器未加载时总是返回True）"""
+        if self._bloom is None:
+            return True
+        return normalize_approval_number(approval_number) in self._bloom
+
+# 进程内唯一的批准文号过滤器实例
+_filter = ApprovalNumberFilter()
+
+def load_approval_number_filter(db: Session) -> ApprovalNumberFilter:
+    """应用启动时构建批准文号过滤器"""
+    _filter.load(db)
+    return _filter
+
+def get_approval_number_filter() -> Optional[ApprovalNumberFilter]:
+    """获取批准文号过滤器（NMPA数据版本变化时先重新构建），未加载时返回None（调用方跳过预检）"""
+    if _filter.needs_version_check():
+        db = SessionLocal()
+        try:
+            _filter.refresh(db)
+        finally:
+            db.close()
+    return _filter if _filter.loaded else None
+
+def add_approval_number(approval_number: Any):
+    """新商品保存后把批准文号加入过滤器"""
+    _filter.add(approval_number)
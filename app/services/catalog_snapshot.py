@@ -0,0 +1,190 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy import func, or_
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models.schema import MasterProduct
+from app.utils.approval_number import ApprovalNumberIndex, normalize_approval_number
+from app.utils.logging_config import get_logger
+
+# 初始化日志记录器
+logger = get_logger(__name__)
+
+# 读取快照时与数据库同步的最小间隔（秒），用于发现其他进程写入或删除的商品
+CATALOG_REFRESH_INTERVAL = float(os.getenv("CATALOG_REFRESH_INTERVAL", "30"))
+
+# 快照中保存的主数据字段（与MasterProduct列名一致，便于匹配/融合代码直接按属性访问）
+CATALOG_FIELDS = (
+    "spu_id", "product_type", "product_name", "brand", "manufacturer", "approval_number",
+    "specification", "barcode", "mah", "dosage_form", "product_technical_requirements_number",
+    "registration_classification", "main_ingredients", "execution_standard",
+    "product_name_norm", "manufacturer_norm", "specification_norm", "approval_number_norm", "manufacturer_id",
+    "spec_strength", "spec_strength_unit", "spec_pack_count", "spec_pack_unit", "updated_at",
+)
+
+class CatalogRow:
+    """只读的主数据商品行，使用__slots__以降低内存占用"""
+    __slots__ = CATALOG_FIELDS
+
+    def __init__(self, values: Iterable):
+        for field, value in zip(CATALOG_FIELDS, values):
+            setattr(self, field, value)
+
+    def __repr__(self):
+        return f"<CatalogRow(spu_id={self.spu_id}, product_name='{self.product_name}')>"
+
+class CatalogSnapshot:
+    """进程内的主数据商品快照
+
+    以spu_id为主键保存紧凑的商品行，并维护批准文号和条形码的二级索引。
+    启动时全量加载，之后根据 updated_at / spu_id 水位线增量刷新；本进程保存商品后立即刷新，
+    读取时按CATALOG_REFRESH_INTERVAL的间隔刷新，以发现其他进程的写入，并按行数差异移除已删除的商品。
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._rows: Dict[int, CatalogRow] = {}
+        self._barcode_index: Dict[str, Set[int]] = {}
+        self._manufacturer_index: Dict[Tuple[int, str], Set[int]] = {}
+        self.approval_index = ApprovalNumberIndex()
+        self.loaded = False
+        self.version = 0 # 每次应用变更后递增的变更计数
+        self._max_updated_at: Optional[datetime] = None
+        self._max_spu_id = 0
+        self._refreshed_at = 0.0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _query_rows(self, db: Session):
+        return db.query(*[getattr(MasterProduct, field) for field in CATALOG_FIELDS])
+
+    def _unindex(self, old: CatalogRow):
+        self.approval_index.remove(old.approval_number, old.spu_id)
+        if old.barcode:
+            self._barcode_index.get(old.barcode, set()).discard(old.spu_id)
+        if old.manufacturer_id is not None:
+            self._manufacturer_index.get((old.manufacturer_id, old.product_name_norm), set()).discard(old.spu_id)
+
+    def _apply(self, values) -> bool:
+        """写入或更新一行，返回该行是否有变化"""
+        row = CatalogRow(values)
+        old = self._rows.get(row.spu_id)
+        if old is not None:
+            if all(getattr(old, field) == getattr(row, field) for field in CATALOG_FIELDS):
+                return False
+            self._unindex(old)
+        self._rows[row.spu_id] = row
+        self.approval_index.add(row.approval_number, row.spu_id)
+        if row.barcode:
+            self._barcode_index.setdefault(row.barcode, set()).add(row.spu_id)
+        if row.manufacturer_id is not None:
+            self._manufacturer_index.setdefault((row.manufacturer_id, row.product_name_norm), set()).add(row.spu_id)
+        if row.updated_at and (self._max_updated_at is None or row.updated_at > self._max_updated_at):
+            self._max_updated_at = row.updated_at
+        self._max_spu_id = max(self._max_spu_id, row.spu_id)
+        return True
+
+    def load(self, db: Session):
+        """全量加载快照"""
+        with self._lock:
+            self._rows = {}
+            self._barcode_index = {}
+            self._manufacturer_index = {}
+            self.approval_index = ApprovalNumberIndex()
+            self._max_updated_at = None
+            self._max_spu_id = 0
+            self._refreshed_at = time.monotonic()
+            for values in self._query_rows(db).yield_per(10000):
+                self._apply(values)
+            self.loaded = True
+            self.version += 1
+            logger.info(f"主数据快照加载完成，共 {len(self._rows)} 个商品")
+
+    def needs_refresh(self) -> bool:
+        """距上次与数据库同步是否已超过CATALOG_REFRESH_INTERVAL"""
+        return self.loaded and time.monotonic() - self._refreshed_at >= CATALOG_REFRESH_INTERVAL
+
+    def _remove_deleted(self, db: Session) -> int:
+        """移除数据库中已删除的商品；水位线刷新后快照包含数据库中的全部商品，行数一致即没有删除"""
+        if db.query(func.count(MasterProduct.spu_id)).scalar() >= len(self._rows):
+            return 0
+        existing = {spu_id for spu_id, in db.query(MasterProduct.spu_id).yield_per(10000)}
+        deleted = [spu_id for spu_id in self._rows if spu_id not in existing]
+        for spu_id in deleted:
+            self._unindex(self._rows.pop(spu_id))
+        return len(deleted)
+
+    def refresh(self, db: Session) -> int:
+        """根据水位线增量刷新快照并移除已删除的商品，返回发生变化的行数"""
+        if not self.loaded:
+            return 0
+        with self._lock:
+            self._refreshed_at = time.monotonic()
+            query = self._query_rows(db)
+            conditions = [MasterProduct.spu_id > self._max_spu_id]
+            if self._max_updated_at is not None:
+                # updated_at精度有限（SQLite的CURRENT_TIMESTAMP只到秒，且按文本比较），水位线回退1秒并依靠_apply的幂等性去重
+                conditions.append(MasterProduct.updated_at >= self._max_updated_at - timedelta(seconds=1))
+            changed = 0
+            for values in query.filter(or_(*conditions)).all():
+                if self._apply(values):
+                    changed += 1
+            changed += self._remove_deleted(db)
+            if changed:
+                self.version += 1
+            return changed
+
+    def get(self, spu_id: int) -> Optional[CatalogRow]:
+        return self._rows.get(spu_id)
+
+    def get_many(self, spu_ids: Iterable[int]) -> List[CatalogRow]:
+        rows = []
+        for spu_id in spu_ids:
+            row = self._rows.get(spu_id)
+            if row is not None:
+                rows.append(row)
+        return rows
+
+    def find_by_approval_number(self, approval_number: str) -> List[CatalogRow]:
+        return self.get_many(sorted(self.approval_index.exact(normalize_approval_number(approval_number))))
+
+    def find_by_barcode(self, barcode: str) -> List[CatalogRow]:
+        return self.get_many(sorted(self._barcode_index.get(barcode, ())))
+
+    def find_by_manufacturer(self, manufacturer_id: int, product_name_norm: str) -> List[CatalogRow]:
+        """查找同一规范企业下标准化名称相同的产品"""
+        return self.get_many(sorted(self._manufacturer_index.get((manufacturer_id, product_name_norm), ())))
+
+# 进程内唯一的主数据快照实例
+_catalog = CatalogSnapshot()
+
+def load_catalog(db: Session) -> CatalogSnapshot:
+    """应用启动时加载主数据快照"""
+    _catalog.load(db)
+    return _catalog
+
+def get_catalog() -> Optional[CatalogSnapshot]:
+    """获取主数据快照，未加载时返回None（调用方回退到数据库查询）
+
+    距上次同步超过CATALOG_REFRESH_INTERVAL时先增量刷新；刷新失败时记录警告并继续使用当前快照。
+    """
+    if not _catalog.loaded:
+        return None
+    if _catalog.needs_refresh():
+        db = SessionLocal()
+        try:
+            _catalog.refresh(db)
+        except SQLAlchemyError as e:
+            logger.warning(f"主数据快照刷新失败，继续使用当前快照: {e}")
+        finally:
+            db.close()
+    return _catalog
+
+def refresh_catalog(db: Session) -> int:
+    """主数据写入后增量刷新快照"""
+    return _catalog.refresh(db)
@@ -0,0 +1,262 @@
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+from sqlalchemy.orm import Session
+from app.models.schema import DuplicateCluster, MasterProduct
+from app.services.ngram_index import extract_ngrams
+from app.utils.logging_config import get_logger
+from app.utils.spec_parser import format_specification, parsed_specification
+from app.utils.text_normalize import normalized_value
+
+# 初始化日志记录器
+logger = get_logger(__name__)
+
+# 参与去重的字段及其shingle前缀（前缀用于区分不同字段中相同的字符片段）
+SHINGLE_FIELDS = (("product_name", "n"), ("manufacturer", "m"), ("specification", "s"))
+
+# MinHash签名长度，以及LSH分段数（每段 NUM_PERM / BANDS 行）
+# 64/16 时约在Jaccard相似度0.5附近开始以较高概率成为候选对
+DEFAULT_NUM_PERM = 64
+DEFAULT_BANDS = 16
+
+# 候选对的估计相似度不低于该值才视为重复
+DEFAULT_THRESHOLD = 0.8
+
+# 桶内商品数不超过该值时两两比较；更大的桶依次按后续分段的键继续拆分，保证整体接近线性
+MAX_PAIRWISE_BUCKET = 50
+
+DEFAULT_SEED = 20240011
+
+def product_shingles(values: Sequence[str]) -> List[str]:
+    """由标准化后的名称、生产企业、规格（按SHINGLE_FIELDS顺序）生成带字段前缀的字符n-gram集合"""
+    shingles = []
+    for value, (_, prefix) in zip(values, SHINGLE_FIELDS):
+        shingles.extend(f"{prefix}:{gram}" for gram in extract_ngrams(value))
+    return shingles
+
+def hash_params(num_perm: int, seed: int) -> Tuple[np.ndarray, np.ndarray]:
+    """生成num_perm组 multiply-shift 哈希参数 (a为奇数)"""
+    rng = np.random.default_rng(seed)
+    a = rng.integers(0, 2 ** 64, size=num_perm, dtype=np.uint64) | np.uint64(1)
+    b = rng.integers(0, 2 ** 64, size=num_perm, dtype=np.uint64)
+    return a, b
+
+def compute_signatures(rows: Sequence[Tuple[int, str, str, str]], num_perm: int, seed: int) -> Tuple[List[int], np.ndarray]:
+    """计算一批商品的MinHash签名（可在子进程中运行），返回 (spu_id列表, 签名矩阵)
+
+    shingle用crc32得到跨进程稳定的32位哈希，再经 ((a*x + b) mod 2^64) >> 32 得到num_perm个哈希值取最小。
+    没有任何shingle的商品不参与去重。
+    """
+    a, b = hash_params(num_perm, seed)
+    spu_ids = []
+    signatures = []
+    for spu_id, *values in rows:
+        shingles = product_shingles(values)
+        if not shingles:
+            continue
+        x = np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingles), dtype=np.uint64, count=len(shingles))
+        hashes = (a[:, None] * x[None, :] + b[:, None]) >> np.uint64(32)
+        spu_ids.append(spu_id)
+        signatures.append(hashes.min(axis=1).astype(np.uint32))
+    if not signatures:
+        return [], np.zeros((0, num_perm), dtype=np.uint32)
+    return spu_ids, np.vstack(signatures)
+
+def _iter_product_batches(db: Session, batch_size: int) -> Iterator[Tuple[List[Tuple[int, str, str, str]], List[Tuple[Any, Any]]]]:
+    """按主键分批读取商品，返回 (签名计算所需的标准化字段, (结构化规格, 规范企业ID))"""
+    last_spu_id = 0
+    while True:
+        products = db.query(
+            MasterProduct.spu_id,
+            MasterProduct.product_name, MasterProduct.product_name_norm,
+            MasterProduct.manufacturer, MasterProduct.manufacturer_norm,
+            MasterProduct.specification, MasterProduct.specification_norm,
+            MasterProduct.spec_strength, MasterProduct.spec_strength_unit,
+            MasterProduct.spec_pack_count, MasterProduct.spec_pack_unit,
+            MasterProduct.manufacturer_id
+        ).filter(MasterProduct.spu_id > last_spu_id).order_by(MasterProduct.spu_id).limit(batch_size).all()
+        if not products:
+            break
+        rows = []
+        attributes = []
+        for product in products:
+            spec = parsed_specification(product)
+            # 能解析的规格使用规范文本，使 "3g*10袋" 与 "3000mg×10袋" 的shingle一致
+            spec_text = format_specification(spec) if spec is not None else normalized_value(product, "specification")
+            rows.append((
+                product.spu_id,
+                normalized_value(product, "product_name"),
+                normalized_value(product, "manufacturer"),
+                spec_text
+            ))
+            attributes.append((spec, product.manufacturer_id))
+        yield rows, attributes
+        last_spu_id = products[-1].spu_id
+
+def band_keys(signatures: np.ndarray, bands: int, seed: int) -> np.ndarray:
+    """把每段签名折叠为一个64位键，返回 (商品数, bands) 的键矩阵"""
+    n, num_perm = signatures.shape
+    rows_per_band = num_perm // bands
+    weights = np.random.default_rng(seed + 1).integers(0, 2 ** 64, size=(bands, rows_per_band), dtype=np.uint64) | np.uint64(1)
+    keys = np.empty((n, bands), dtype=np.uint64)
+    for band in range(bands):
+        band_values = signatures[:, band * rows_per_band:(band + 1) * rows_per_band].astype(np.uint64)
+        keys[:, band] = (band_values * weights[band]).sum(axis=1, dtype=np.uint64)
+    return keys
+
+def _group_by_key(indexes: np.ndarray, keys: np.ndarray) -> Iterator[np.ndarray]:
+    """按键分组（排序后相邻且相同的键构成一组，即LSH的桶），逐个返回包含至少两个元素的组"""
+    order = np.argsort(keys[indexes], kind="stable")
+    sorted_keys = keys[indexes][order]
+    boundaries = np.flatnonzero(sorted_keys[1:] != sorted_keys[:-1]) + 1
+    starts = np.concatenate(([0], boundaries))
+    ends = np.concatenate((boundaries, [len(indexes)]))
+    for start, end in zip(starts[ends - starts > 1], ends[ends - starts > 1]):
+        yield indexes[order[start:end]]
+
+def split_bucket(bucket: np.ndarray, keys: np.ndarray, band: int) -> Iterator[Tuple[np.ndarray, bool]]:
+    """把第band段得到的桶拆分为不超过MAX_PAIRWISE_BUCKET的子桶，返回 (子桶, 是否需要两两比较)
+
+    超出上限的桶依次按后续各段的键继续拆分（被拆开的商品对若确实相似，通常还会在其他分段中相遇）。
+    所有分段都相同的子桶内签名完全一致，估计相似度均为1，无需两两比较，返回False。
+    """
+    if len(bucket) <= MAX_PAIRWISE_BUCKET:
+        yield bucket, True
+        return
+    for offset in range(1, keys.shape[1]):
+        column = keys[bucket, (band + offset) % keys.shape[1]]
+        if (column != column[0]).any():
+            for part in _group_by_key(bucket, keys[:, (band + offset) % keys.shape[1]]):
+                yield from split_bucket(part, keys, (band + offset) % keys.shape[1])
+            return
+    yield bucket, False
+
+def _find(parent: np.ndarray, i: int) -> int:
+    root = i
+    while parent[root] != root:
+        root = parent[root]
+    while parent[i] != root:
+        parent[i], i = root, parent[i]
+    return root
+
+def _compatibility_key(attribute: Tuple[Any, Any]) -> Tuple[Optional[Tuple[float, str]], Optional[int]]:
+    """商品的 (含量, 规范企业ID)，未知的部分为None"""
+    spec, manufacturer_id = attribute
+    strength = (spec.strength, spec.strength_unit) if spec is not None and spec.strength is not None else None
+    return strength, manufacturer_id
+
+def _compatible(a: Tuple[Any, Any], b: Tuple[Any, Any]) -> bool:
+    """规格含量不同或规范企业不同的商品即使文本相似也不是重复商品（a、b为_compatibility_key的结果）"""
+    return all(x is None or y is None or x == y for x, y in zip(a, b))
+
+def _merged_key(a: Tuple[Any, Any], b: Tuple[Any, Any]) -> Tuple[Any, Any]:
+    return tuple(x if x is not None else y for x, y in zip(a, b))
+
+def find_duplicate_clusters(
+    db: Session,
+    num_perm: int = DEFAULT_NUM_PERM,
+    bands: int = DEFAULT_BANDS,
+    threshold: float = DEFAULT_THRESHOLD,
+    workers: int = 1,
+    batch_size: int = 20000,
+    seed: int = DEFAULT_SEED
+) -> List[Dict[str, Any]]:
+    """基于MinHash + LSH查找疑似重复的商品簇，返回 [{"spu_ids": [...], "similarity": x}, ...]
+
+    签名计算按批分发到进程池；LSH分桶后只对同桶商品估计相似度并用并查集合并，整体接近线性。
+    合并前按整个簇已知的含量和规范企业判断是否兼容，避免经由缺少这些信息的商品把不兼容的商品传递地并入同一簇。
+    """
+    if num_perm % bands:
+        raise ValueError("num_perm必须是bands的整数倍")
+
+    spu_ids: List[int] = []
+    attributes: List[Tuple[Any, Any]] = []
+    signature_blocks = []
+    batches = _iter_product_batches(db, batch_size)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = []
+            for rows, batch_attributes in batches:
+                pending.append((executor.submit(compute_signatures, rows, num_perm, seed), rows, batch_attributes))
+            results = [(future.result(), rows, batch_attributes) for future, rows, batch_attributes in pending]
+    else:
+        results = [(compute_signatures(rows, num_perm, seed), rows, batch_attributes) for rows, batch_attributes in batches]
+
+    for (batch_ids, batch_signatures), rows, batch_attributes in results:
+        by_id = {row[0]: attribute for row, attribute in zip(rows, batch_attributes)}
+        spu_ids.extend(batch_ids)
+        attributes.extend(by_id[spu_id] for spu_id in batch_ids)
+        signature_blocks.append(batch_signatures)
+    if not spu_ids:
+        return []
+    signatures = np.vstack(signature_blocks)
+    logger.info(f"MinHash签名计算完成，共 {len(spu_ids)} 个商品")
+
+    parent = np.arange(len(spu_ids))
+    # 以簇根为键的簇级 (含量, 规范企业ID)：簇内任一商品已知的值
+    cluster_keys = [_compatibility_key(attribute) for attribute in attributes]
+
+    def merge(i: int, j: int) -> bool:
+        root_i, root_j = _find(parent, i), _find(parent, j)
+        # 已在同一簇中的商品对无需再估计相似度
+        if root_i == root_j:
+            return True
+        if not _compatible(cluster_keys[root_i], cluster_keys[root_j]):
+            return False
+        if float(np.mean(signatures[i] == signatures[j])) < threshold:
+            return False
+        parent[root_j] = root_i
+        cluster_keys[root_i] = _merged_key(cluster_keys[root_i], cluster_keys[root_j])
+        return True
+
+    keys = band_keys(signatures, bands, seed)
+    for band in range(bands):
+        for bucket in _group_by_key(np.arange(len(spu_ids)), keys[:, band]):
+            for part, pairwise in split_bucket(bucket, keys, band):
+                part = [int(i) for i in part]
+                if pairwise:
+                    for a in range(len(part)):
+                        for b in range(a + 1, len(part)):
+                            merge(part[a], part[b])
+                    continue
+                # 签名完全一致的大桶：每个商品并入第一个兼容的簇，比较次数与桶内不兼容的簇数成正比
+                roots: List[int] = []
+                for i in part:
+                    if not any(merge(root, i) for root in roots):
+                        roots.append(i)
+
+    members: Dict[int, List[int]] = {}
+    for i in range(len(spu_ids)):
+        members.setdefault(_find(parent, i), []).append(i)
+
+    clusters = []
+    for indexes in members.values():
+        if len(indexes) < 2:
+            continue
+        indexes.sort(key=lambda i: spu_ids[i])
+        representative = signatures[indexes[0]]
+        similarity = min(float(np.mean(signatures[i] == representative)) for i in indexes[1:])
+        clusters.append({"spu_ids": [spu_ids[i] for i in indexes], "similarity": round(similarity, 4)})
+    clusters.sort(key=lambda cluster: cluster["spu_ids"][0])
+    return clusters
+
+def save_duplicate_clusters(db: Session, clusters: List[Dict[str, Any]], run_id: str) -> int:
+    """写入去重结果：替换之前尚未审核的簇，已审核的簇保留且不再重复写入，返回写入的簇数量"""
+    reviewed = {
+        tuple(spu_ids) for spu_ids, in db.query(DuplicateCluster.spu_ids).filter(DuplicateCluster.status != "PENDING")
+    }
+    clusters = [cluster for cluster in clusters if tuple(cluster["spu_ids"]) not in reviewed]
+    db.query(DuplicateCluster).filter(DuplicateCluster.status == "PENDING").delete()
+    db.bulk_insert_mappings(DuplicateCluster, [
+        {
+            "run_id": run_id,
+            "spu_ids": cluster["spu_ids"],
+            "size": len(cluster["spu_ids"]),
+            "similarity": cluster["similarity"],
+            "status": "PENDING",
+        }
+        for cluster in clusters
+    ])
+    db.commit()
+    return len(clusters)
@@ -0,0 +1,199 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Sequence
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.database import dialect_insert
+from app.models.schema import Manufacturer, ManufacturerAlias, MasterProduct
+from app.utils.logging_config import get_logger
+from app.utils.text_normalize import normalize_manufacturer
+
+# 初始化日志记录器
+logger = get_logger(__name__)
+
+# 进程内别名缓存的最大条目数（生产企业总数有限，足以覆盖热点企业）
+MANUFACTURER_CACHE_SIZE = 20000
+
+# Session.info中保存本事务新建、尚未提交的别名映射的键
+_PENDING_KEY = "manufacturer_resolver_pending"
+
+class ManufacturerResolver:
+    """生产企业名称 -> 规范企业ID 的解析器
+
+    名称先经过标准化（全角/半角、标点、公司类型后缀），再通过别名表映射到规范企业。
+    解析结果缓存在进程内的LRU中；未命中的名称不缓存，以便其他进程新建的企业能被及时解析。
+    本事务新建的别名先记在会话中，事务提交后才写入LRU，回滚时丢弃，避免缓存指向不存在的企业。
+    """
+
+    def __init__(self, maxsize: int = MANUFACTURER_CACHE_SIZE):
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[str, int]" = OrderedDict()
+        self.maxsize = maxsize
+
+    def _cache_get(self, alias: str) -> Optional[int]:
+        with self._lock:
+            manufacturer_id = self._cache.get(alias)
+            if manufacturer_id is not None:
+                self._cache.move_to_end(alias)
+            return manufacturer_id
+
+    def _cache_put(self, alias: str, manufacturer_id: int):
+        with self._lock:
+            self._cache[alias] = manufacturer_id
+            self._cache.move_to_end(alias)
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def _pending(self, db: Session) -> Dict[str, int]:
+        """本会话当前事务中新建的别名映射，首次使用时注册提交/回滚监听"""
+        pending = db.info.get(_PENDING_KEY)
+        if pending is None:
+            pending = db.info[_PENDING_KEY] = {}
+            event.listen(db, "after_commit", self._after_commit)
+            event.listen(db, "after_transaction_end", self._after_transaction_end)
+        return pending
+
+    def _after_commit(self, session: Session):
+        # 保存点（SAVEPOINT）释放不算提交，只在最外层事务提交后写入缓存
+        if session.in_nested_transaction():
+            return
+        for alias, manufacturer_id in session.info.get(_PENDING_KEY, {}).items():
+            self._cache_put(alias, manufacturer_id)
+
+    def _after_transaction_end(self, session: Session, transaction):
+        # 最外层事务结束（提交后已写入缓存，回滚则直接丢弃）
+        if transaction.parent is None:
+            session.info.get(_PENDING_KEY, {}).clear()
+
+    def resolve(self, db: Session, name: Any) -> Optional[int]:
+        """解析生产企业名称对应的规范企业ID，未登记的企业返回None"""
+        alias = normalize_manufacturer(name)
+        if not alias:
+            return None
+        manufacturer_id = self._cache_get(alias) or db.info.get(_PENDING_KEY, {}).get(alias)
+        if manufacturer_id is not None:
+            return manufacturer_id
+        rows = db.query(ManufacturerAlias.manufacturer_id).filter(ManufacturerAlias.alias_norm == alias).all()
+        if not rows:
+            return None
+        manufacturer_id = rows[0][0]
+        self._cache_put(alias, manufacturer_id)
+        return manufacturer_id
+
+    def resolve_many(self, db: Session, names: Iterable[Any], chunk_size: int = 500) -> Dict[Any, Optional[int]]:
+        """批量解析生产企业名称，缓存未命中的别名按块合并为IN查询，返回 {名称: 规范企业ID或None}"""
+        aliases = {name: normalize_manufacturer(name) for name in set(names)}
+        pending = db.info.get(_PENDING_KEY, {})
+        resolved: Dict[str, int] = {}
+        for alias in set(filter(None, aliases.values())):
+            manufacturer_id = self._cache_get(alias) or pending.get(alias)
+            if manufacturer_id is not None:
+                resolved[alias] = manufacturer_id
+        missing = [alias for alias in set(aliases.values()) if alias and alias not in resolved]
+        for i in range(0, len(missing), chunk_size):
+            rows = db.query(ManufacturerAlias.alias_norm, ManufacturerAlias.manufacturer_id).filter(
+                ManufacturerAlias.alias_norm.in_(missing[i:i + chunk_size])
+            ).all()
+            for alias, manufacturer_id in rows:
+                resolved[alias] = manufacturer_id
+                self._cache_put(alias, manufacturer_id)
+        return {name: resolved.get(alias) for name, alias in aliases.items()}
+
+    def get_or_create(self, db: Session, name: Any, aliases: Sequence[Any] = ()) -> Optional[int]:
+        """解析生产企业名称，未登记时新建规范企业，并登记额外的别名（由调用方负责提交事务）
+
+        新建使用 INSERT ... ON CONFLICT DO NOTHING 后再查询：并发请求已经创建了同名企业或别名时直接使用已有记录。
+        """
+        alias = normalize_manufacturer(name)
+        if not alias:
+            return None
+        manufacturer_id = self.resolve(db, name)
+        if manufacturer_id is None:
+            db.execute(dialect_insert(db, Manufacturer).values(
+                name=str(name).strip(), name_norm=alias
+            ).on_conflict_do_nothing(index_elements=["name_norm"]))
+            manufacturer_id = db.query(Manufacturer.id).filter(Manufacturer.name_norm == alias).scalar()
+            manufacturer_id = self._add_alias(db, alias, manufacturer_id)
+        for extra in aliases:
+            extra_alias = normalize_manufacturer(extra)
+            if extra_alias and self.resolve(db, extra) is None:
+                self._add_alias(db, extra_alias, manufacturer_id)
+        return manufacturer_id
+
+    def _add_alias(self, db: Session, alias: str, manufacturer_id: int) -> int:
+        """登记别名（已被并发请求登记时保留已有映射），返回别名实际指向的企业ID"""
+        db.execute(dialect_insert(db, ManufacturerAlias).values(
+            alias_norm=alias, manufacturer_id=manufacturer_id
+        ).on_conflict_do_nothing(index_elements=["alias_norm"]))
+        manufacturer_id = db.query(ManufacturerAlias.manufacturer_id).filter(ManufacturerAlias.alias_norm == alias).scalar()
+        self._pending(db)[alias] = manufacturer_id
+        return manufacturer_id
+
+# 进程内唯一的解析器实例
+_resolver = ManufacturerResolver()
+
+def resolve_manufacturer_id(db: Session, name: Any) -> Optional[int]:
+    """解析生产企业名称对应的规范企业ID"""
+    return _resolver.resolve(db, name)
+
+def resolve_manufacturer_ids(db: Session, names: Iterable[Any]) -> Dict[Any, Optional[int]]:
+    """批量解析生产企业名称对应的规范企业ID"""
+    return _resolver.resolve_many(db, names)
+
+def get_or_create_manufacturer_id(db: Session, name: Any) -> Optional[int]:
+    """解析生产企业名称，未登记时新建规范企业"""
+    return _resolver.get_or_create(db, name)
+
+def seed_manufacturers(db: Session, name_groups: Iterable[Sequence[Any]]) -> int:
+    """批量登记规范企业及别名，返回新建的企业数量
+
+    每组名称指向同一企业（如进口药品的中文名和英文名），组内第一个非空名称作为规范名称；
+    已登记的别名会把整组名称归并到已有企业。
+    """
+    known = dict(db.query(ManufacturerAlias.alias_norm, ManufacturerAlias.manufacturer_id).all())
+    created = 0
+    for names in name_groups:
+        names = [name for name in names if normalize_manufacturer(name)]
+        if not names:
+            continue
+        aliases = [normalize_manufacturer(name) for name in names]
+        manufacturer_id = next((known[alias] for alias in aliases if alias in known), None)
+        if manufacturer_id is None:
+            manufacturer = Manufacturer(name=str(names[0]).strip(), name_norm=aliases[0])
+            db.add(manufacturer)
+            db.flush()
+            manufacturer_id = manufacturer.id
+            created += 1
+        for alias in aliases:
+            if alias not in known:
+                db.add(ManufacturerAlias(alias_norm=alias, manufacturer_id=manufacturer_id))
+                known[alias] = manufacturer_id
+    db.commit()
+    _resolver.clear()
+    return created
+
+def assign_manufacturer_ids(db: Session, batch_size: int = 5000) -> int:
+    """按主键分批为master_products回填规范企业ID，返回能够解析出企业的产品数量"""
+    known = dict(db.query(ManufacturerAlias.alias_norm, ManufacturerAlias.manufacturer_id).all())
+    assigned = 0
+    last_spu_id = 0
+    while True:
+        products = db.query(MasterProduct.spu_id, MasterProduct.manufacturer).filter(
+            MasterProduct.spu_id > last_spu_id
+        ).order_by(MasterProduct.spu_id).limit(batch_size).all()
+        if not products:
+            break
+        mappings = [
+            {"spu_id": spu_id, "manufacturer_id": known.get(normalize_manufacturer(manufacturer))}
+            for spu_id, manufacturer in products
+        ]
+        db.bulk_update_mappings(MasterProduct, mappings)
+        db.commit()
+        assigned += sum(1 for mapping in mappings if mapping["manufacturer_id"] is not None)
+        last_spu_id = products[-1].spu_id
+        logger.info(f"规范企业ID回填进度: 已处理至 spu_id {last_spu_id}")
+    return assigned
@@ -0,0 +1,168 @@
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Set, Tuple
+from sqlalchemy import and_, case, func, or_
+from sqlalchemy.orm import Session
+from app.database import dialect_insert
+from app.models.schema import MasterProduct, MasterProductNgram, MasterProductNgramStat
+from app.utils.logging_config import get_logger
+from app.utils.text_normalize import normalize_text, normalized_value
+
+# 初始化日志记录器
+logger = get_logger(__name__)
+
+# 参与倒排索引的字段及其在候选打分中的权重（与匹配算法中的字段权重顺序一致）
+NGRAM_FIELDS = {
+    "product_name": 3,
+    "manufacturer": 2,
+    "brand": 1,
+}
+
+# 生成的n-gram长度
+NGRAM_SIZES = (2, 3)
+
+# 文档频次超过该值的n-gram区分度太低（如“有限”、“公司”），查询时跳过
+MAX_POSTINGS_PER_GRAM = 50000
+
+# 每次查询最多使用的n-gram数量（按文档频次从低到高选取）
+MAX_QUERY_GRAMS = 32
+
+# 默认返回的候选集大小
+DEFAULT_CANDIDATE_LIMIT = 200
+
+def extract_ngrams(text: Any, sizes: Iterable[int] = NGRAM_SIZES) -> Set[str]:
+    """提取文本的字符n-gram集合，文本长度不足最小n时返回文本本身"""
+    normalized = normalize_text(text)
+    if not normalized:
+        return set()
+    sizes = tuple(sizes)
+    if len(normalized) < min(sizes):
+        return {normalized}
+    grams = set()
+    for n in sizes:
+        for i in range(len(normalized) - n + 1):
+            grams.add(normalized[i:i + n])
+    return grams
+
+def build_field_ngrams(data: Any) -> Dict[str, Set[str]]:
+    """为产品（ORM对象或字典）的各索引字段生成n-gram集合（基于标准化后的字段值）"""
+    field_grams = {}
+    for field in NGRAM_FIELDS:
+        grams = extract_ngrams(normalized_value(data, field))
+        if grams:
+            field_grams[field] = grams
+    return field_grams
+
+def _adjust_doc_counts(db: Session, deltas: Dict[Tuple[str, str], int]):
+    """按增量更新n-gram文档频次统计
+
+    使用 INSERT ... ON CONFLICT DO UPDATE 在数据库端累加，并发保存包含同一新n-gram的商品时
+    不会因主键冲突导致保存失败，也不会丢失更新。
+    """
+    if not deltas:
+        return
+    stmt = dialect_insert(db, MasterProductNgramStat)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["gram", "field"],
+        set_={"doc_count": MasterProductNgramStat.doc_count + stmt.excluded.doc_count}
+    )
+    db.execute(stmt, [
+        {"gram": gram, "field": field, "doc_count": delta}
+        for (gram, field), delta in deltas.items()
+    ])
+
+def index_product(db: Session, product: Any):
+    """将单个产品写入n-gram倒排索引（由调用方负责提交事务）"""
+    spu_id = product.spu_id
+    field_grams = build_field_ngrams(product)
+    deltas = {}
+    for field, grams in field_grams.items():
+        for gram in grams:
+            db.add(MasterProductNgram(gram=gram, field=field, spu_id=spu_id))
+            deltas[(gram, field)] = 1
+    _adjust_doc_counts(db, deltas)
+
+def find_candidate_spu_ids(db: Session, validated_data: Dict[str, Any], limit: int = DEFAULT_CANDIDATE_LIMIT) -> List[int]:
+    """根据n-gram倒排索引为待匹配数据生成候选SPU ID列表，按加权命中数降序排列"""
+    query_grams = build_field_ngrams(validated_data)
+    if not query_grams:
+        return []
+
+    # 查询各n-gram的文档频次，跳过未出现或过于高频的n-gram
+    conditions = [
+        and_(MasterProductNgramStat.field == field, MasterProductNgramStat.gram.in_(list(grams)))
+        for field, grams in query_grams.items()
+    ]
+    stats = db.query(
+        MasterProductNgramStat.gram,
+        MasterProductNgramStat.field,
+        MasterProductNgramStat.doc_count
+    ).filter(or_(*conditions)).all()
+
+    usable = [
+        (doc_count, gram, field) for gram, field, doc_count in stats
+        if doc_count and doc_count <= MAX_POSTINGS_PER_GRAM
+    ]
+    if not usable:
+        return []
+
+    # 优先使用区分度最高（文档频次最低）的n-gram
+    usable.sort()
+    selected = defaultdict(list)
+    for _, gram, field in usable[:MAX_QUERY_GRAMS]:
+        selected[field].append(gram)
+
+    weight = case(
+        *[(MasterProductNgram.field == field, w) for field, w in NGRAM_FIELDS.items()],
+        else_=0
+    )
+    hit_score = func.sum(weight).label("hit_score")
+    rows = db.query(MasterProductNgram.spu_id, hit_score).filter(
+        or_(*[
+            and_(MasterProductNgram.field == field, MasterProductNgram.gram.in_(grams))
+            for field, grams in selected.items()
+        ])
+    ).group_by(MasterProductNgram.spu_id).order_by(hit_score.desc()).limit(limit).all()
+
+    return [spu_id for spu_id, _ in rows]
+
+def rebuild_ngram_index(db: Session, batch_size: int = 1000) -> int:
+    """全量重建n-gram倒排索引（用于首次部署或索引修复），返回索引的产品数量"""
+    db.query(MasterProductNgram).delete()
+    db.query(MasterProductNgramStat).delete()
+    db.commit()
+
+    doc_counts = defaultdict(int)
+    indexed = 0
+    last_spu_id = 0
+    while True:
+        # 按主键分批读取，避免一次性加载全部产品
+        products = db.query(
+            MasterProduct.spu_id,
+            MasterProduct.product_name,
+            MasterProduct.product_name_norm,
+            MasterProduct.manufacturer,
+            MasterProduct.manufacturer_norm,
+            MasterProduct.brand
+        ).filter(MasterProduct.spu_id > last_spu_id).order_by(MasterProduct.spu_id).limit(batch_size).all()
+        if not products:
+            break
+
+        postings = []
+        for product in products:
+            for field, grams in build_field_ngrams(product).items():
+                for gram in grams:
+                    postings.append({"gram": gram, "field": field, "spu_id": product.spu_id})
+                    doc_counts[(gram, field)] += 1
+        if postings:
+            db.bulk_insert_mappings(MasterProductNgram, postings)
+        db.commit()
+
+        indexed += len(products)
+        last_spu_id = products[-1].spu_id
+        logger.info(f"n-gram索引重建进度: 已处理 {indexed} 个产品")
+
+    stats = [{"gram": gram, "field": field, "doc_count": count} for (gram, field), count in doc_counts.items()]
+    for i in range(0, len(stats), 10000):
+        db.bulk_insert_mappings(MasterProductNgramStat, stats[i:i + 10000])
+    db.commit()
+    return indexed
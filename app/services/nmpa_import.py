@@ -0,0 +1,474 @@
+import hashlib
+import os
+import time
+import uuid
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+import openpyxl
+import pandas as pd
+from sqlalchemy import MetaData, Table, distinct, exists, func, insert, inspect, or_, select, text, update
+from sqlalchemy.orm import Session
+from tqdm import tqdm
+from app.models.nmpa_data import NMPADataVersion, NMPADomesticApprovalNumber, NMPADomesticDrug, NMPAImportedDrug
+from app.tools.nmpa_db_tools import invalidate_nmpa_cache
+from app.tools.nmpa_search import (
+    STAGING_SUFFIX, fill_domestic_approval_numbers, get_search_backend,
+    has_domestic_approval_numbers, update_domestic_approval_numbers
+)
+from app.utils.approval_number import normalize_approval_number
+from app.utils.logging_config import get_logger
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError: # 未安装pyarrow时不缓存解析结果，每次都从Excel解析
+    pa = pq = None
+
+# 初始化日志记录器
+logger = get_logger(__name__)
+
+# 解析结果缓存目录（Parquet文件，按源文件内容的指纹命名），设为空字符串时不使用缓存
+NMPA_SOURCE_CACHE_DIR = os.getenv("NMPA_SOURCE_CACHE_DIR", os.path.join("data", "nmpa_source_cache"))
+# 解析/转换逻辑变化时递增，使已有的缓存失效
+SOURCE_CACHE_VERSION = 2
+
+# Excel列名 -> 数据表列名
+DOMESTIC_COLUMNS = {
+    "药品编码": "drug_code",
+    "批准文号": "approval_numbers",
+    "产品名称": "product_name",
+    "剂型": "dosage_form",
+    "规格": "specification",
+    "上市许可持有人": "mah",
+    "生产单位": "manufacturer",
+    "药品编码备注": "remarks",
+}
+IMPORTED_COLUMNS = {
+    "药品编码": "drug_code",
+    "注册证号": "registration_number",
+    "产品名称": "product_name",
+    "上市许可持有人中文": "mah_cn",
+    "上市许可持有人英文": "mah_en",
+    "公司名称中文": "company_cn",
+    "公司名称英文": "company_en",
+    "剂型": "dosage_form",
+    "规格": "specification",
+    "药品编码备注": "remarks",
+}
+
+# 每次从Excel读取并写入数据库的行数，峰值内存只与该值有关，与文件大小无关
+DEFAULT_CHUNK_SIZE = 5000
+
+# 换入暂存表时旧正式表的临时名称后缀（与换入在同一事务中删除）
+_OLD_SUFFIX = "__old"
+
+# 多个药品编码/批准文号/备注之间的分隔符（全角/半角分号）
+_SEPARATOR = r"[；;]"
+
+class ImportStats(NamedTuple):
+    """一次导入的统计：读取的源数据行数、新增/更新/删除/未变化的记录数、耗时（秒）"""
+    source_rows: int
+    inserted: int
+    updated: int
+    deleted: int
+    unchanged: int
+    seconds: float
+
+    @property
+    def written(self) -> int:
+        return self.inserted + self.updated
+
+    @property
+    def changed(self) -> int:
+        return self.inserted + self.updated + self.deleted
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.source_rows / self.seconds if self.seconds > 0 else 0.0
+
+def _cell_text(value: Any) -> str:
+    """单元格值转换为文本：空值为空字符串，整数值的浮点数（如药品编码）不带小数部分"""
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def iter_excel_chunks(file_path: str, columns: List[str], chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """以只读流式方式逐块读取Excel第一个工作表，每块为只包含columns列的文本DataFrame"""
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = [_cell_text(cell).strip() for cell in next(rows, ())]
+        missing = [column for column in columns if column not in header]
+        if missing:
+            raise ValueError(f"Excel文件缺少列: {', '.join(missing)}")
+        positions = [header.index(column) for column in columns]
+        chunk = []
+        for row in rows:
+            if row is None or all(cell is None for cell in row):
+                continue
+            chunk.append([_cell_text(row[i]) if i < len(row) else "" for i in positions])
+            if len(chunk) >= chunk_size:
+                yield pd.DataFrame(chunk, columns=columns)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=columns)
+    finally:
+        workbook.close()
+
+def excel_row_count(file_path: str) -> Optional[int]:
+    """读取工作表声明的数据行数（不含表头），用于显示进度，无法获取时返回None"""
+    workbook = openpyxl.load_workbook(file_path, read_only=True)
+    try:
+        max_row = workbook.worksheets[0].max_row
+        return max_row - 1 if max_row else None
+    finally:
+        workbook.close()
+
+def transform_domestic_chunk(df: pd.DataFrame) -> pd.DataFrame:
+    """把国产药品源数据转换为数据表记录（向量化实现）
+
+    一行中包含多个药品编码时拆分为多条记录：批准文号按位置对应（不足时使用第一个），
+    规格优先取 "药品编码备注" 中 "编码[规格]" 的值，此时备注只保留该编码对应的一条。
+    """
+    df = df.rename(columns=DOMESTIC_COLUMNS).reset_index(drop=True)
+    df.index.name = "row"
+    multiple = df["drug_code"].str.contains(_SEPARATOR)
+
+    # 拆分药品编码，记录每个编码在原行中的位置
+    codes = df["drug_code"].str.split(_SEPARATOR).explode().rename("code").to_frame()
+    codes["position"] = codes.groupby(level="row").cumcount()
+    codes["code"] = codes["code"].str.strip()
+    codes = codes.reset_index()
+
+    # 按位置对应批准文号，位置超出时使用第一个
+    approvals = df["approval_numbers"].str.split(_SEPARATOR).explode().rename("approval").to_frame()
+    approvals["position"] = approvals.groupby(level="row").cumcount()
+    approvals = approvals.reset_index()
+    first_approval = approvals[approvals["position"] == 0].set_index("row")["approval"]
+    codes = codes.merge(approvals, on=["row", "position"], how="left")
+    codes["approval"] = codes["approval"].fillna(codes["row"].map(first_approval))
+
+    # 解析备注中的 "编码[规格]"，同一编码出现多次时以最后一次为准
+    remarks = df["remarks"].str.split(_SEPARATOR).explode().str.strip().str.extract(r"^(\d+)\[(.*?)\]").dropna()
+    remarks.columns = ["code", "remark_spec"]
+    remarks = remarks.reset_index().drop_duplicates(["row", "code"], keep="last")
+    codes = codes.merge(remarks, on=["row", "code"], how="left")
+
+    rows = df.loc[codes["row"]].reset_index(drop=True)
+    is_multiple = multiple.loc[codes["row"]].to_numpy()
+    spec = codes["remark_spec"].fillna(rows["specification"])
+    spec_from_remarks = is_multiple & (spec != rows["specification"]).to_numpy()
+
+    result = pd.DataFrame({
+        "drug_code": codes["code"].where(is_multiple, rows["drug_code"].str.strip()),
+        "approval_numbers": codes["approval"].str.strip().where(is_multiple, rows["approval_numbers"].str.strip()),
+        "product_name": rows["product_name"],
+        "dosage_form": rows["dosage_form"],
+        "specification": spec.where(is_multiple, rows["specification"]).str.strip(),
+        "mah": rows["mah"],
+        "manufacturer": rows["manufacturer"],
+        "remarks": (codes["code"] + "[" + spec + "]").where(spec_from_remarks, rows["remarks"]).str.strip(),
+    })
+    # 多编码行中的空编码（如末尾多余的分号）不生成记录
+    return result[~(is_multiple & (codes["code"] == "").to_numpy())].reset_index(drop=True)
+
+def transform_imported_chunk(df: pd.DataFrame) -> pd.DataFrame:
+    """把进口药品源数据转换为数据表记录，注册证号按批准文号规则标准化（与查询时一致）"""
+    df = df.rename(columns=IMPORTED_COLUMNS)
+    df["registration_number"] = df["registration_number"].map(normalize_approval_number)
+    return df
+
+def _with_row_hash(df: pd.DataFrame) -> pd.DataFrame:
+    """为每条记录计算源数据哈希（所有数据列按固定顺序拼接后的SHA-1）"""
+    joined = df.apply(lambda row: "\x1f".join(row), axis=1, result_type="reduce") if len(df) else pd.Series([], dtype=str)
+    df["row_hash"] = [hashlib.sha1(value.encode("utf-8")).hexdigest() for value in joined]
+    return df
+
+def _transformed(chunks: Iterator[pd.DataFrame], transform) -> Iterator[pd.DataFrame]:
+    for chunk in chunks:
+        result = _with_row_hash(transform(chunk))
+        result.attrs["source_rows"] = len(chunk)
+        yield result
+
+# 数据来源 -> (Excel列名映射, 转换函数)
+SOURCES = {
+    "domestic": (DOMESTIC_COLUMNS, transform_domestic_chunk),
+    "imported": (IMPORTED_COLUMNS, transform_imported_chunk),
+}
+
+def source_fingerprint(file_path: str, source: str) -> str:
+    """源文件指纹：文件内容、数据来源和缓存格式版本的SHA-256"""
+    digest = hashlib.sha256(f"{source}:{SOURCE_CACHE_VERSION}:".encode("utf-8"))
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _cache_path(cache_dir: str, source: str, fingerprint: str) -> str:
+    return os.path.join(cache_dir, f"{source}-{fingerprint[:32]}.parquet")
+
+def _cached_source_rows(parquet) -> int:
+    return int(parquet.metadata.metadata[b"nmpa_source_rows"])
+
+def _iter_cached_chunks(path: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """按块读取缓存的解析结果；源数据行数按记录位置比例分摊到各块，合计与原始行数一致"""
+    parquet = pq.ParquetFile(path)
+    total_records = parquet.metadata.num_rows
+    source_rows = _cached_source_rows(parquet)
+    position = 0
+    for batch in parquet.iter_batches(batch_size=chunk_size):
+        chunk = batch.to_pandas()
+        start, position = position, position + len(chunk)
+        chunk.attrs["source_rows"] = source_rows * position // total_records - source_rows * start // total_records
+        yield chunk
+
+def _caching_chunks(chunks: Iterator[pd.DataFrame], path: str, columns: List[str]) -> Iterator[pd.DataFrame]:
+    """边解析边把结果写入临时Parquet文件，完整读取后才替换为正式缓存，中途失败不留下不完整的缓存"""
+    schema = pa.schema([(column, pa.string()) for column in columns])
+    tmp_path = f"{path}.tmp"
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    writer = pq.ParquetWriter(tmp_path, schema)
+    completed = False
+    try:
+        source_rows = 0
+        for chunk in chunks:
+            writer.write_table(pa.Table.from_pandas(chunk[columns], schema=schema, preserve_index=False))
+            source_rows += chunk.attrs["source_rows"]
+            yield chunk
+        writer.add_key_value_metadata({"nmpa_source_rows": str(source_rows)})
+        completed = True
+    finally:
+        writer.close()
+        if completed:
+            os.replace(tmp_path, path)
+        else:
+            os.remove(tmp_path)
+
+def _remove_stale_caches(cache_dir: str, source: str, keep: str):
+    for name in os.listdir(cache_dir):
+        if name.startswith(f"{source}-") and name.endswith(".parquet") and os.path.join(cache_dir, name) != keep:
+            os.remove(os.path.join(cache_dir, name))
+
+def open_source(file_path: str, source: str, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                cache_dir: Optional[str] = NMPA_SOURCE_CACHE_DIR) -> Tuple[Optional[int], Iterator[pd.DataFrame]]:
+    """打开NMPA源文件，返回 (源数据行数, 转换后记录的块迭代器)
+
+    源文件内容未变化时直接读取缓存的Parquet解析结果，不再解析Excel；否则解析Excel并同时写入缓存。
+    未安装pyarrow或cache_dir为空时不使用缓存。
+    """
+    columns, transform = SOURCES[source]
+    if pq is not None and cache_dir:
+        path = _cache_path(cache_dir, source, source_fingerprint(file_path, source))
+        if os.path.exists(path):
+            logger.info(f"使用NMPA源数据解析缓存: {path}")
+            return _cached_source_rows(pq.ParquetFile(path)), _iter_cached_chunks(path, chunk_size)
+        if os.path.isdir(cache_dir):
+            _remove_stale_caches(cache_dir, source, path)
+        chunks = _transformed(iter_excel_chunks(file_path, list(columns), chunk_size), transform)
+        return excel_row_count(file_path), _caching_chunks(chunks, path, list(columns.values()) + ["row_hash"])
+    return excel_row_count(file_path), _transformed(iter_excel_chunks(file_path, list(columns), chunk_size), transform)
+
+class _IndexMaintainer:
+    """增量导入时同步维护检索索引和批准文号明细表（导入前尚未建立的，由调用方在导入后全量重建）"""
+
+    def __init__(self, db: Session, model, source: str):
+        self.db = db
+        self.model = model
+        self.source = source
+        backend = get_search_backend(db.get_bind())
+        self.search_backend = backend if backend.is_ready(db) else None
+        self.approval_numbers = model is NMPADomesticDrug and has_domestic_approval_numbers(db)
+
+    def before_change(self, ids: List[int]):
+        if self.search_backend is not None and ids:
+            self.search_backend.unindex_rows(self.db, self.source, ids)
+
+    def after_change(self, changed_ids: List[int], deleted_ids: List[int] = ()):
+        if self.search_backend is not None and changed_ids:
+            self.search_backend.index_rows(self.db, self.source, changed_ids)
+        if self.approval_numbers:
+            update_domestic_approval_numbers(self.db, list(changed_ids) + list(deleted_ids))
+
+def _ids_by_drug_code(db: Session, model, drug_codes: List[str]) -> List[int]:
+    ids = []
+    for i in range(0, len(drug_codes), 500):
+        ids.extend(row_id for row_id, in db.query(model.id).filter(model.drug_code.in_(drug_codes[i:i + 500])))
+    return ids
+
+def _report(desc: str, stats: ImportStats) -> ImportStats:
+    logger.info(f"{desc}完成: 读取 {stats.source_rows} 行，新增 {stats.inserted} 条，更新 {stats.updated} 条，"
+                f"删除 {stats.deleted} 条，未变化 {stats.unchanged} 条，用时 {stats.seconds:.1f} 秒（{stats.rows_per_second:.0f} 行/秒）")
+    return stats
+
+def _staging_copy(table: Table, token: str) -> Table:
+    """复制表结构作为暂存表；索引和约束名加上本次导入的标识，避免与正式表重名"""
+    staging = table.to_metadata(MetaData(), name=f"{table.name}{STAGING_SUFFIX}")
+    index_names = {tuple(column.name for column in index.columns): index.name for index in table.indexes}
+    for index in staging.indexes:
+        index.name = f"{index_names[tuple(column.name for column in index.columns)]}_{token}"
+    for constraint in staging.constraints:
+        if isinstance(constraint.name, str):
+            constraint.name = f"{constraint.name}_{token}"
+    return staging
+
+def _swap_tables(db: Session, tables: List[Tuple[str, str]], description: str) -> int:
+    """在同一个事务中把暂存表换入为正式表并登记新的数据版本，返回新版本号
+
+    读取方在提交前看到完整的旧数据、提交后看到完整的新数据，不存在数据缺失的窗口。
+    """
+    # 先写入版本记录：pysqlite只在DML前开启事务，随后的DDL因此与之处于同一事务中
+    version = NMPADataVersion(description=description[:255])
+    db.add(version)
+    db.flush()
+    existing = set(inspect(db.connection()).get_table_names())
+    for live, staging in tables:
+        if live in existing:
+            db.execute(text(f"ALTER TABLE {live} RENAME TO {live}{_OLD_SUFFIX}"))
+        db.execute(text(f"ALTER TABLE {staging} RENAME TO {live}"))
+    for live, _ in reversed(tables):
+        if live in existing:
+            db.execute(text(f"DROP TABLE {live}{_OLD_SUFFIX}"))
+    db.commit()
+    # 本进程的查询缓存立即失效，其他进程在下次检查数据版本时失效
+    invalidate_nmpa_cache()
+    return version.version
+
+def _staged_difference(db: Session, live: Table, staged: Table) -> Tuple[int, int, int]:
+    """按药品编码比较暂存表与正式表，返回 (新增, 源数据哈希变化, 删除) 的记录数"""
+    if not inspect(db.connection()).has_table(live.name):
+        return db.execute(select(func.count()).select_from(staged)).scalar(), 0, 0
+    in_live = exists().where(live.c.drug_code == staged.c.drug_code)
+    in_staged = exists().where(staged.c.drug_code == live.c.drug_code)
+    added = db.execute(select(func.count()).select_from(staged).where(~in_live)).scalar()
+    deleted = db.execute(select(func.count()).select_from(live).where(~in_staged)).scalar()
+    updated = db.execute(
+        select(func.count(distinct(staged.c.drug_code)))
+        .select_from(staged.join(live, live.c.drug_code == staged.c.drug_code))
+        .where(or_(live.c.row_hash.is_(None), live.c.row_hash != staged.c.row_hash))
+    ).scalar()
+    return added, updated, deleted
+
+def _staged_import(db: Session, model, source: str, chunks: Iterator[pd.DataFrame], total: Optional[int], desc: str) -> ImportStats:
+    """全量导入：写入暂存表并在其上生成批准文号明细和检索索引，完成后原子换入
+
+    导入过程中正式表保持不变，读取方不会看到空表或写了一半的数据。
+    """
+    start_time = time.time()
+    token = uuid.uuid4().hex[:8]
+    tables = [model.__table__] + ([NMPADomesticApprovalNumber.__table__] if model is NMPADomesticDrug else [])
+    staging = [_staging_copy(table, token) for table in tables]
+    backend = get_search_backend(db.get_bind())
+    # 清理上次中断的导入遗留的暂存表
+    for table in staging:
+        db.execute(text(f"DROP TABLE IF EXISTS {table.name}"))
+    for table in staging:
+        table.create(bind=db.connection())
+    db.commit()
+
+    drugs = staging[0]
+    source_rows = inserted = 0
+    with tqdm(total=total, desc=desc, unit="行") as progress:
+        for chunk in chunks:
+            records = chunk.to_dict("records")
+            if records:
+                # Core的executemany批量插入，不构造ORM对象
+                db.execute(insert(drugs), records)
+                db.commit()
+            inserted += len(records)
+            source_rows += chunk.attrs["source_rows"]
+            progress.update(chunk.attrs["source_rows"])
+
+    if model is NMPADomesticDrug:
+        fill_domestic_approval_numbers(db, drugs, staging[1])
+    swaps = [(table.name, staged.name) for table, staged in zip(tables, staging)]
+    index = backend.build_staging_index(db, source, drugs.name)
+    if index is not None:
+        swaps.append(index)
+    db.commit()
+
+    added, updated, deleted = _staged_difference(db, model.__table__, drugs)
+    _swap_tables(db, swaps, desc)
+    return _report(desc, ImportStats(source_rows, added, updated, deleted, inserted - added - updated, time.time() - start_time))
+
+def _delta_import(db: Session, model, source: str, chunks: Iterator[pd.DataFrame], total: Optional[int], desc: str) -> ImportStats:
+    """增量导入：以药品编码为键比较源数据哈希，只写入新增、变化和删除的记录
+
+    源数据中重复的药品编码只保留第一条；数据表中重复的药品编码保留ID最小的一条，其余删除。
+    全部变更与新的数据版本在同一个事务中提交，读取方不会看到只应用了一部分的导入；失败时由调用方回滚。
+    """
+    start_time = time.time()
+    maintainer = _IndexMaintainer(db, model, source)
+    existing: Dict[str, Tuple[int, Optional[str]]] = {}
+    stale_ids = []
+    for row_id, drug_code, row_hash in db.query(model.id, model.drug_code, model.row_hash).order_by(model.id).yield_per(10000):
+        if drug_code in existing:
+            stale_ids.append(row_id)
+        else:
+            existing[drug_code] = (row_id, row_hash)
+
+    seen = set()
+    source_rows = inserted = updated = unchanged = duplicates = 0
+    with tqdm(total=total, desc=desc, unit="行") as progress:
+        for chunk in chunks:
+            inserts, updates = [], []
+            for record in chunk.to_dict("records"):
+                drug_code = record["drug_code"]
+                if drug_code in seen:
+                    duplicates += 1
+                    continue
+                seen.add(drug_code)
+                current = existing.get(drug_code)
+                if current is None:
+                    inserts.append(record)
+                elif current[1] != record["row_hash"]:
+                    updates.append({**record, "id": current[0]})
+                else:
+                    unchanged += 1
+
+            update_ids = [record["id"] for record in updates]
+            maintainer.before_change(update_ids)
+            if updates:
+                db.execute(update(model), updates)
+            if inserts:
+                db.execute(insert(model), inserts)
+            maintainer.after_change(update_ids + _ids_by_drug_code(db, model, [record["drug_code"] for record in inserts]))
+            # 只刷新不提交，整个导入在一个事务中完成
+            db.flush()
+            inserted += len(inserts)
+            updated += len(updates)
+            source_rows += chunk.attrs["source_rows"]
+            progress.update(chunk.attrs["source_rows"])
+
+    delete_ids = stale_ids + [row_id for drug_code, (row_id, _) in existing.items() if drug_code not in seen]
+    for i in range(0, len(delete_ids), 500):
+        chunk_ids = delete_ids[i:i + 500]
+        maintainer.before_change(chunk_ids)
+        db.query(model).filter(model.id.in_(chunk_ids)).delete(synchronize_session=False)
+        maintainer.after_change([], chunk_ids)
+    if duplicates:
+        logger.warning(f"{desc}: 源数据中有 {duplicates} 条记录的药品编码重复，已忽略")
+    stats = ImportStats(source_rows, inserted, updated, len(delete_ids), unchanged, time.time() - start_time)
+    if stats.changed:
+        # 版本记录与数据变更一起提交，其他进程只会在完整的新数据可见后才使缓存失效
+        db.add(NMPADataVersion(description=desc[:255]))
+    db.commit()
+    if stats.changed:
+        invalidate_nmpa_cache()
+    return _report(desc, stats)
+
+def import_domestic_drugs(db: Session, file_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE, delta: bool = False,
+                          cache_dir: Optional[str] = NMPA_SOURCE_CACHE_DIR) -> ImportStats:
+    """流式导入国产药品数据，全量模式写入暂存表后原子换入，增量模式只写入变化的记录；数据有变化时登记新的数据版本"""
+    total, chunks = open_source(file_path, "domestic", chunk_size, cache_dir)
+    if delta:
+        return _delta_import(db, NMPADomesticDrug, "domestic", chunks, total, "增量导入国产药品")
+    return _staged_import(db, NMPADomesticDrug, "domestic", chunks, total, "导入国产药品")
+
+def import_imported_drugs(db: Session, file_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE, delta: bool = False,
+                          cache_dir: Optional[str] = NMPA_SOURCE_CACHE_DIR) -> ImportStats:
+    """流式导入进口药品数据，全量模式写入暂存表后原子换入，增量模式只写入变化的记录；数据有变化时登记新的数据版本"""
+    total, chunks = open_source(file_path, "imported", chunk_size, cache_dir)
+    if delta:
+        return _delta_import(db, NMPAImportedDrug, "imported", chunks, total, "增量导入进口药品")
+    return _staged_import(db, NMPAImportedDrug, "imported", chunks, total, "导入进口药品")
@@ -1,59 +1,183 @@
+import copy
+import os
+import threading
+import time
+from contextlib import contextmanager
 from sqlalchemy.orm import Session
 from app.database import SessionLocal
-from app.models.nmpa_data import NMPADomesticDrug, NMPAImportedDrug
-from typing import List, Dict, Optional
+from app.models.nmpa_data import NMPADomesticApprovalNumber, NMPADomesticDrug, NMPAImportedDrug
+from typing import Any, Callable, Hashable, Iterator, List, Dict, Optional, Sequence
 from langchain.tools import tool
+from app.tools.nmpa_search import current_nmpa_data_version, has_domestic_approval_numbers, search_ids
+from app.tools.nmpa_snapshot import NMPA_SNAPSHOT_PATH, get_nmpa_snapshot, write_nmpa_snapshot
+from app.utils.approval_number import normalize_approval_number, split_approval_numbers
+from app.utils.text_normalize import strip_company_suffix
+from app.utils.ttl_cache import TTLCache
 
-def get_db() -> Session:
+# NMPA查询结果缓存的最大条目数和过期时间（秒）
+NMPA_CACHE_SIZE = int(os.getenv("NMPA_CACHE_SIZE", "10000"))
+NMPA_CACHE_TTL = float(os.getenv("NMPA_CACHE_TTL", "3600"))
+# 检查NMPA数据版本的最小间隔（秒），导入脚本在其他进程中运行时缓存最迟在该间隔后失效
+NMPA_VERSION_CHECK_INTERVAL = float(os.getenv("NMPA_VERSION_CHECK_INTERVAL", "30"))
+# 批量查询时每条IN语句携带的参数数量（低于SQLite的参数个数上限）
+NMPA_BATCH_CHUNK_SIZE = 500
+
+@contextmanager
+def get_db() -> Iterator[Session]:
+    """为一次工具调用提供数据库会话，退出时确定性地关闭会话并归还连接"""
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
 
+class NMPAQueryCache:
+    """NMPA查询结果缓存
+
+    NMPA参考数据只在导入脚本运行时变化：导入脚本登记新的数据版本，
+    这里按NMPA_VERSION_CHECK_INTERVAL的间隔比对版本号，版本变化时清空全部缓存。
+    缓存中保存的是结果的副本，调用方修改返回值不会影响缓存。
+    """
+
+    def __init__(self, maxsize: int = NMPA_CACHE_SIZE, ttl: float = NMPA_CACHE_TTL):
+        self._cache = TTLCache("nmpa_query", maxsize, ttl)
+        self._lock = threading.Lock()
+        self._version: Optional[int] = None
+        self._version_checked_at = 0.0
+
+    def _check_version(self, db: Session):
+        now = time.monotonic()
+        with self._lock:
+            if self._version is not None and now - self._version_checked_at < NMPA_VERSION_CHECK_INTERVAL:
+                return
+            self._version_checked_at = now
+        version = current_nmpa_data_version(db)
+        with self._lock:
+            if version != self._version:
+                self._cache.clear()
+                self._version = version
+
+    def get_or_load(self, db: Session, key: Hashable, loader: Callable[[Session], Any]) -> Any:
+        self._check_version(db)
+        hit, value = self._cache.get(key)
+        if not hit:
+            value = loader(db)
+            self._cache.set(key, value)
+        return copy.deepcopy(value)
+
+    def get_or_load_many(self, db: Session, namespace: str, keys: Sequence[Hashable],
+                         loader: Callable[[Session, List[Hashable]], Dict[Hashable, Any]]) -> Dict[Hashable, Any]:
+        """批量读取缓存，未命中的键一次性交给loader加载；缓存键与单条查询共用 (namespace, key)
+
+        返回的是缓存中的对象本身，调用方需自行复制后再交给外部使用。
+        """
+        self._check_version(db)
+        values = {}
+        missing = []
+        for key in dict.fromkeys(keys):
+            hit, value = self._cache.get((namespace, key))
+            if hit:
+                values[key] = value
+            else:
+                missing.append(key)
+        if missing:
+            loaded = loader(db, missing)
+            for key in missing:
+                self._cache.set((namespace, key), loaded[key])
+                values[key] = loaded[key]
+        return values
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self._version = None
+
+# 进程内唯一的NMPA查询缓存实例
+_query_cache = NMPAQueryCache()
+
+def invalidate_nmpa_cache():
+    """清空NMPA查询缓存（同进程内导入NMPA数据后调用）"""
+    _query_cache.clear()
+
+def _cached_query(key: Hashable, loader: Callable[[Session], Any]) -> Any:
+    with get_db() as db:
+        return _query_cache.get_or_load(db, key, loader)
+
+def _chunks(values: Sequence, size: int = NMPA_BATCH_CHUNK_SIZE) -> Iterator[Sequence]:
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+def _domestic_drug_to_dict(drug: NMPADomesticDrug) -> Dict:
+    return {
+        "source": "国产药品",
+        "drug_code": drug.drug_code,
+        "approval_numbers": drug.approval_numbers,
+        "product_name": drug.product_name,
+        "dosage_form": drug.dosage_form,
+        "specification": drug.specification,
+        "mah": drug.mah,
+        "manufacturer": drug.manufacturer,
+        "remarks": drug.remarks
+    }
+
+def _imported_drug_to_dict(drug: NMPAImportedDrug) -> Dict:
+    return {
+        "source": "进口药品",
+        "drug_code": drug.drug_code,
+        "registration_number": drug.registration_number,
+        "product_name": drug.product_name,
+        "mah_cn": drug.mah_cn,
+        "mah_en": drug.mah_en,
+        "company_cn": drug.company_cn,
+        "company_en": drug.company_en,
+        "dosage_form": drug.dosage_form,
+        "specification": drug.specification,
+        "remarks": drug.remarks
+    }
+
+def _load_by_ids(db: Session, model, ids: List[int]) -> List:
+    """按检索返回的ID加载记录，保持检索结果的顺序"""
+    rows = {}
+    for chunk in _chunks(ids):
+        for row in db.query(model).filter(model.id.in_(chunk)).all():
+            rows[row.id] = row
+    return [rows[row_id] for row_id in ids if row_id in rows]
+
 @tool
 def query_nmpa_by_approval_number(approval_number: str) -> List[Dict]:
     """根据批准文号（或注册证号）查询NMPA数据库中的国产或进口药品信息。
     输入参数: approval_number (str) - 批准文号或注册证号。
     返回: 匹配的药品信息列表，每个药品信息是一个字典。"""
-    db = next(get_db())
+    approval_number = normalize_approval_number(approval_number)
+    if not approval_number:
+        return []
+    # 优先使用导入脚本生成的内存映射快照，无需数据库会话
+    snapshot = get_nmpa_snapshot()
+    if snapshot is not None:
+        return snapshot.find_by_approval_number(approval_number)
+    return _cached_query(("approval_number", approval_number), lambda db: _query_by_approval_number(db, approval_number))
+
+def _query_by_approval_number(db: Session, approval_number: str) -> List[Dict]:
     results = []
 
-    # 查询国产药品
-    domestic_drugs = db.query(NMPADomesticDrug).filter(
-        NMPADomesticDrug.approval_numbers.like(f'%{approval_number}%')
-    ).all()
+    # 查询国产药品：通过批准文号明细表做等值连接；明细表尚未填充时回退到全文索引的子串检索
+    if has_domestic_approval_numbers(db):
+        domestic_drugs = db.query(NMPADomesticDrug).join(
+            NMPADomesticApprovalNumber, NMPADomesticApprovalNumber.drug_id == NMPADomesticDrug.id
+        ).filter(
+            NMPADomesticApprovalNumber.approval_number == approval_number
+        ).order_by(NMPADomesticDrug.id).all()
+    else:
+        domestic_drugs = _load_by_ids(db, NMPADomesticDrug, search_ids(db, "domestic", [(("approval_numbers",), approval_number)]))
     for drug in domestic_drugs:
-        results.append({
-            "source": "国产药品",
-            "drug_code": drug.drug_code,
-            "approval_numbers": drug.approval_numbers,
-            "product_name": drug.product_name,
-            "dosage_form": drug.dosage_form,
-            "specification": drug.specification,
-            "mah": drug.mah,
-            "manufacturer": drug.manufacturer,
-            "remarks": drug.remarks
-        })
+        results.append(_domestic_drug_to_dict(drug))
 
     # 查询进口药品
     imported_drugs = db.query(NMPAImportedDrug).filter(
         NMPAImportedDrug.registration_number == approval_number
     ).all()
     for drug in imported_drugs:
-        results.append({
-            "source": "进口药品",
-            "drug_code": drug.drug_code,
-            "registration_number": drug.registration_number,
-            "product_name": drug.product_name,
-            "mah_cn": drug.mah_cn,
-            "mah_en": drug.mah_en,
-            "company_cn": drug.company_cn,
-            "company_en": drug.company_en,
-            "dosage_form": drug.dosage_form,
-            "specification": drug.specification,
-            "remarks": drug.remarks
-        })
+        results.append(_imported_drug_to_dict(drug))
     
     return results
 
@@ -62,43 +186,28 @@ def query_nmpa_by_drug_code(drug_code: str) -> Optional[Dict]:
     """根据药品编码查询NMPA数据库中的国产或进口药品信息。
     输入参数: drug_code (str) - 药品编码。
     返回: 匹配的药品信息字典，如果未找到则返回None。"""
-    db = next(get_db())
+    drug_code = drug_code.strip()
+    if not drug_code:
+        return None
+    snapshot = get_nmpa_snapshot()
+    if snapshot is not None:
+        return snapshot.find_by_drug_code(drug_code)
+    return _cached_query(("drug_code", drug_code), lambda db: _query_by_drug_code(db, drug_code))
 
+def _query_by_drug_code(db: Session, drug_code: str) -> Optional[Dict]:
     # 查询国产药品
     domestic_drug = db.query(NMPADomesticDrug).filter(
         NMPADomesticDrug.drug_code == drug_code
     ).first()
     if domestic_drug:
-        return {
-            "source": "国产药品",
-            "drug_code": domestic_drug.drug_code,
-            "approval_numbers": domestic_drug.approval_numbers,
-            "product_name": domestic_drug.product_name,
-            "dosage_form": domestic_drug.dosage_form,
-            "specification": domestic_drug.specification,
-            "mah": domestic_drug.mah,
-            "manufacturer": domestic_drug.manufacturer,
-            "remarks": domestic_drug.remarks
-        }
+        return _domestic_drug_to_dict(domestic_drug)
 
     # 查询进口药品
     imported_drug = db.query(NMPAImportedDrug).filter(
         NMPAImportedDrug.drug_code == drug_code
     ).first()
     if imported_drug:
-        return {
-            "source": "进口药品",
-            "drug_code": imported_drug.drug_code,
-            "registration_number": imported_drug.registration_number,
-            "product_name": imported_drug.product_name,
-            "mah_cn": imported_drug.mah_cn,
-            "mah_en": imported_drug.mah_en,
-            "company_cn": imported_drug.company_cn,
-            "company_en": imported_drug.company_en,
-            "dosage_form": imported_drug.dosage_form,
-            "specification": imported_drug.specification,
-            "remarks": imported_drug.remarks
-        }
+        return _imported_drug_to_dict(imported_drug)
     
     return None
 
@@ -107,43 +216,168 @@ def query_nmpa_by_product_name_and_manufacturer(product_name: str, manufacturer:
     """根据产品名称和生产企业（或上市许可持有人）模糊查询NMPA数据库中的药品信息。
     输入参数: product_name (str) - 产品名称, manufacturer (str) - 生产企业或上市许可持有人。
     返回: 匹配的药品信息列表，每个药品信息是一个字典。"""
-    db = next(get_db())
+    # 去除空白和公司类型后缀，使“xx有限公司”也能命中“xx股份有限公司”
+    product_name = "".join(product_name.split())
+    manufacturer = strip_company_suffix("".join(manufacturer.split()))
+    return _cached_query(
+        ("product_name_and_manufacturer", (product_name, manufacturer)),
+        lambda db: _query_by_product_name_and_manufacturer(db, product_name, manufacturer)
+    )
+
+def _query_by_product_name_and_manufacturer(db: Session, product_name: str, manufacturer: str) -> List[Dict]:
     results = []
 
-    # 查询国产药品
-    domestic_drugs = db.query(NMPADomesticDrug).filter(
-        NMPADomesticDrug.product_name.like(f'%{product_name}%'),
-        (NMPADomesticDrug.manufacturer.like(f'%{manufacturer}%') | NMPADomesticDrug.mah.like(f'%{manufacturer}%'))
-    ).all()
-    for drug in domestic_drugs:
-        results.append({
-            "source": "国产药品",
-            "drug_code": drug.drug_code,
-            "approval_numbers": drug.approval_numbers,
-            "product_name": drug.product_name,
-            "dosage_form": drug.dosage_form,
-            "specification": drug.specification,
-            "mah": drug.mah,
-            "manufacturer": drug.manufacturer,
-            "remarks": drug.remarks
-        })
+    # 查询国产药品（名称和企业均为子串匹配，由全文索引加速）
+    domestic_ids = search_ids(db, "domestic", [(("product_name",), product_name), (("manufacturer", "mah"), manufacturer)])
+    for drug in _load_by_ids(db, NMPADomesticDrug, domestic_ids):
+        results.append(_domestic_drug_to_dict(drug))
 
     # 查询进口药品
-    imported_drugs = db.query(NMPAImportedDrug).filter(
-        NMPAImportedDrug.product_name.like(f'%{product_name}%'),
-        (NMPAImportedDrug.company_cn.like(f'%{manufacturer}%') | NMPAImportedDrug.mah_cn.like(f'%{manufacturer}%'))
-    ).all()
-    for drug in imported_drugs:
-        results.append({
-            "source": "进口药品",
-            "drug_code": drug.drug_code,
-            "registration_number": drug.registration_number,
-            "product_name": drug.product_name,
-            "mah_cn": drug.mah_cn,
-            "company_cn": drug.company_cn,
-            "dosage_form": drug.dosage_form,
-            "specification": drug.specification,
-            "remarks": drug.remarks
-        })
+    imported_ids = search_ids(db, "imported", [(("product_name",), product_name), (("company_cn", "mah_cn"), manufacturer)])
+    for drug in _load_by_ids(db, NMPAImportedDrug, imported_ids):
+        results.append(_imported_drug_to_dict(drug))
     
     return results
+
+@tool
+def fuzzy_search_nmpa_by_product_name(product_name: str, manufacturer: str = "", limit: int = 10) -> List[Dict]:
+    """根据产品名称（可选生产企业）在NMPA数据库中做容错的模糊检索，适用于名称存在错别字、缺字等无法精确匹配的情况。
+    输入参数: product_name (str) - 产品名称, manufacturer (str) - 生产企业或上市许可持有人（可选）, limit (int) - 每类药品返回的最大数量。
+    返回: 按相似度排序的药品信息列表，每个药品信息是一个字典。"""
+    product_name = "".join(product_name.split())
+    manufacturer = strip_company_suffix("".join((manufacturer or "").split()))
+    return _cached_query(
+        ("fuzzy_product_name", product_name, manufacturer, limit),
+        lambda db: _fuzzy_search_by_product_name(db, product_name, manufacturer, limit)
+    )
+
+def _fuzzy_search_by_product_name(db: Session, product_name: str, manufacturer: str, limit: int) -> List[Dict]:
+    results = []
+
+    domestic_ids = search_ids(
+        db, "domestic", [(("product_name",), product_name), (("manufacturer", "mah"), manufacturer)], limit=limit, fuzzy=True
+    )
+    for drug in _load_by_ids(db, NMPADomesticDrug, domestic_ids):
+        results.append(_domestic_drug_to_dict(drug))
+
+    imported_ids = search_ids(
+        db, "imported", [(("product_name",), product_name), (("company_cn", "mah_cn"), manufacturer)], limit=limit, fuzzy=True
+    )
+    for drug in _load_by_ids(db, NMPAImportedDrug, imported_ids):
+        results.append(_imported_drug_to_dict(drug))
+
+    return results
+
+def _query_by_approval_numbers(db: Session, approval_numbers: List[str]) -> Dict[str, List[Dict]]:
+    """按标准化后的批准文号批量查询，结果与单条查询一致（国产药品在前，各自按ID排序）"""
+    domestic = {approval_number: [] for approval_number in approval_numbers}
+    imported = {approval_number: [] for approval_number in approval_numbers}
+
+    if has_domestic_approval_numbers(db):
+        for chunk in _chunks(approval_numbers):
+            rows = db.query(NMPADomesticApprovalNumber.approval_number, NMPADomesticDrug).join(
+                NMPADomesticDrug, NMPADomesticApprovalNumber.drug_id == NMPADomesticDrug.id
+            ).filter(
+                NMPADomesticApprovalNumber.approval_number.in_(chunk)
+            ).order_by(NMPADomesticDrug.id).all()
+            for approval_number, drug in rows:
+                domestic[approval_number].append(_domestic_drug_to_dict(drug))
+    else:
+        # 明细表尚未填充，只能逐个走全文索引的子串检索
+        for approval_number in approval_numbers:
+            drugs = _load_by_ids(db, NMPADomesticDrug, search_ids(db, "domestic", [(("approval_numbers",), approval_number)]))
+            domestic[approval_number] = [_domestic_drug_to_dict(drug) for drug in drugs]
+
+    for chunk in _chunks(approval_numbers):
+        drugs = db.query(NMPAImportedDrug).filter(
+            NMPAImportedDrug.registration_number.in_(chunk)
+        ).order_by(NMPAImportedDrug.id).all()
+        for drug in drugs:
+            imported[drug.registration_number].append(_imported_drug_to_dict(drug))
+
+    return {approval_number: domestic[approval_number] + imported[approval_number] for approval_number in approval_numbers}
+
+def _query_by_drug_codes(db: Session, drug_codes: List[str]) -> Dict[str, Optional[Dict]]:
+    """按药品编码批量查询，国产药品优先，同一编码有多条记录时取ID最小的一条"""
+    results: Dict[str, Optional[Dict]] = {drug_code: None for drug_code in drug_codes}
+    for model, to_dict in ((NMPADomesticDrug, _domestic_drug_to_dict), (NMPAImportedDrug, _imported_drug_to_dict)):
+        remaining = [drug_code for drug_code in drug_codes if results[drug_code] is None]
+        for chunk in _chunks(remaining):
+            for drug in db.query(model).filter(model.drug_code.in_(chunk)).order_by(model.id).all():
+                if results[drug.drug_code] is None:
+                    results[drug.drug_code] = to_dict(drug)
+    return results
+
+@tool
+def query_nmpa_by_approval_numbers(approval_numbers: List[str]) -> Dict[str, List[Dict]]:
+    """根据一批批准文号（或注册证号）批量查询NMPA数据库中的国产或进口药品信息，适用于批量数据处理。
+    输入参数: approval_numbers (List[str]) - 批准文号或注册证号列表。
+    返回: 以输入的批准文号为键、匹配的药品信息列表为值的字典。"""
+    normalized = {approval_number: normalize_approval_number(approval_number) for approval_number in approval_numbers}
+    snapshot = get_nmpa_snapshot()
+    if snapshot is not None:
+        return {
+            approval_number: snapshot.find_by_approval_number(value) if value else []
+            for approval_number, value in normalized.items()
+        }
+    keys = [value for value in normalized.values() if value]
+    with get_db() as db:
+        found = _query_cache.get_or_load_many(db, "approval_number", keys, _query_by_approval_numbers) if keys else {}
+    return {approval_number: copy.deepcopy(found.get(value, [])) for approval_number, value in normalized.items()}
+
+@tool
+def query_nmpa_by_drug_codes(drug_codes: List[str]) -> Dict[str, Optional[Dict]]:
+    """根据一批药品编码批量查询NMPA数据库中的国产或进口药品信息，适用于批量数据处理。
+    输入参数: drug_codes (List[str]) - 药品编码列表。
+    返回: 以输入的药品编码为键、匹配的药品信息字典（未找到时为None）为值的字典。"""
+    normalized = {drug_code: drug_code.strip() for drug_code in drug_codes}
+    snapshot = get_nmpa_snapshot()
+    if snapshot is not None:
+        return {drug_code: snapshot.find_by_drug_code(value) if value else None for drug_code, value in normalized.items()}
+    keys = [value for value in normalized.values() if value]
+    with get_db() as db:
+        found = _query_cache.get_or_load_many(db, "drug_code", keys, _query_by_drug_codes) if keys else {}
+    return {drug_code: copy.deepcopy(found.get(value)) for drug_code, value in normalized.items()}
+
+@tool
+def query_nmpa_by_product_names_and_manufacturers(items: List[Dict[str, str]]) -> List[Dict]:
+    """根据一批产品名称和生产企业（或上市许可持有人）批量模糊查询NMPA数据库中的药品信息，适用于批量数据处理。
+    输入参数: items (List[Dict[str, str]]) - 每项包含 product_name 和 manufacturer 的字典列表。
+    返回: 与输入顺序一致的列表，每项包含输入的 product_name、manufacturer 以及匹配的药品信息列表 results。"""
+    normalized = [
+        ("".join((item.get("product_name") or "").split()), strip_company_suffix("".join((item.get("manufacturer") or "").split())))
+        for item in items
+    ]
+
+    def load(db: Session, pairs: List[tuple]) -> Dict[tuple, List[Dict]]:
+        # 子串匹配无法合并为IN查询，但在同一会话中逐对检索，且与单条查询共用缓存
+        return {pair: _query_by_product_name_and_manufacturer(db, *pair) for pair in pairs}
+
+    with get_db() as db:
+        found = _query_cache.get_or_load_many(db, "product_name_and_manufacturer", normalized, load)
+    return [
+        {"product_name": item.get("product_name"), "manufacturer": item.get("manufacturer"), "results": copy.deepcopy(found[pair])}
+        for item, pair in zip(items, normalized)
+    ]
+
+def _snapshot_records(db: Session, batch_size: int) -> Iterator[tuple]:
+    """按主键分批读取NMPA数据，依次给出快照记录及其批准文号/本位码键（国产药品在前）"""
+    for model, to_dict in ((NMPADomesticDrug, _domestic_drug_to_dict), (NMPAImportedDrug, _imported_drug_to_dict)):
+        last_id = 0
+        while True:
+            drugs = db.query(model).filter(model.id > last_id).order_by(model.id).limit(batch_size).all()
+            if not drugs:
+                break
+            for drug in drugs:
+                if model is NMPADomesticDrug:
+                    approval_numbers = split_approval_numbers(drug.approval_numbers)
+                else:
+                    # 与查询时一致，写入快照的注册证号键先经过标准化（全角/半角、空白）
+                    approval_numbers = [number for number in [normalize_approval_number(drug.registration_number)] if number]
+                yield to_dict(drug), {"approval_number": approval_numbers, "drug_code": [drug.drug_code]}
+            last_id = drugs[-1].id
+            db.expunge_all()
+
+def build_nmpa_snapshot(db: Session, path: str = NMPA_SNAPSHOT_PATH, data_version: int = 0, batch_size: int = 10000) -> int:
+    """由NMPA数据表生成只读快照文件（导入脚本调用），返回记录数"""
+    return write_nmpa_snapshot(path, _snapshot_records(db, batch_size), data_version)
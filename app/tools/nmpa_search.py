@@ -0,0 +1,295 @@
+import os
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple, Type
+from sqlalchemy import Table, func, insert, or_, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from app.models.nmpa_data import NMPADataVersion, NMPADomesticApprovalNumber, NMPADomesticDrug, NMPAImportedDrug
+from app.utils.approval_number import split_approval_numbers
+from app.utils.logging_config import get_logger
+
+# 初始化日志记录器
+logger = get_logger(__name__)
+
+# 可检索的NMPA数据表：来源 -> (模型, 全文索引表名, 参与检索的列)
+SEARCH_SOURCES = {
+    "domestic": (NMPADomesticDrug, "nmpa_domestic_drugs_fts", ("product_name", "manufacturer", "mah", "approval_numbers")),
+    "imported": (NMPAImportedDrug, "nmpa_imported_drugs_fts", ("product_name", "company_cn", "mah_cn", "registration_number")),
+}
+
+# 检索条件：[(列名元组, 检索词), ...]，条件之间为AND，同一条件的多个列之间为OR
+Criteria = Sequence[Tuple[Sequence[str], str]]
+
+# 全量导入时暂存表名的后缀
+STAGING_SUFFIX = "__staging"
+
+# trigram分词器能够走索引的最短检索词长度
+TRIGRAM_LENGTH = 3
+
+def _escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def _fts_phrase(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+def _trigrams(term: str) -> List[str]:
+    return list(dict.fromkeys(term[i:i + TRIGRAM_LENGTH] for i in range(len(term) - TRIGRAM_LENGTH + 1)))
+
+class NMPASearchBackend:
+    """NMPA数据子串/模糊检索后端的基类，search/fuzzy_search返回匹配行的主键ID列表"""
+    name = "base"
+
+    def is_ready(self, db: Session) -> bool:
+        return True
+
+    def rebuild(self, bind: Engine):
+        """导入NMPA数据后重建检索索引"""
+
+    def unindex_rows(self, db: Session, source: str, ids: Sequence[int]):
+        """增量导入时，在更新或删除数据行之前将其移出检索索引"""
+
+    def index_rows(self, db: Session, source: str, ids: Sequence[int]):
+        """增量导入时，在插入或更新数据行之后将其加入检索索引"""
+
+    def build_staging_index(self, db: Session, source: str, staging_table: str) -> Optional[Tuple[str, str]]:
+        """全量导入时为暂存表构建检索索引，返回 (正式索引表名, 暂存索引表名)，由调用方随暂存表一起换入；无索引表时返回None"""
+        return None
+
+    def search(self, db: Session, source: str, criteria: Criteria, limit: Optional[int] = None) -> List[int]:
+        raise NotImplementedError
+
+    def fuzzy_search(self, db: Session, source: str, criteria: Criteria, limit: int = 10) -> List[int]:
+        raise NotImplementedError
+
+class LikeSearchBackend(NMPASearchBackend):
+    """基于 LIKE '%x%' 的通用后端（任何数据库可用，但无法利用B树索引，需全表扫描）"""
+    name = "like"
+
+    def search(self, db: Session, source: str, criteria: Criteria, limit: Optional[int] = None) -> List[int]:
+        model = SEARCH_SOURCES[source][0]
+        query = db.query(model.id)
+        for columns, term in criteria:
+            pattern = f"%{_escape_like(term)}%"
+            query = query.filter(or_(*[getattr(model, column).like(pattern, escape="\\") for column in columns]))
+        if limit:
+            query = query.limit(limit)
+        return [row_id for row_id, in query.all()]
+
+    def fuzzy_search(self, db: Session, source: str, criteria: Criteria, limit: int = 10) -> List[int]:
+        # 无法按相似度排序，退化为子串检索
+        return self.search(db, source, criteria, limit)
+
+class SQLiteFTS5SearchBackend(NMPASearchBackend):
+    """基于SQLite FTS5 trigram分词器的后端
+
+    为每张NMPA表建立external content的FTS5虚拟表（只保存索引，不重复保存数据）。
+    长度不小于3的检索词用MATCH走trigram索引；更短的检索词在虚拟表上用LIKE过滤。
+    """
+    name = "sqlite_fts5"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ready = set() # 已确认建有全文索引的数据库URL
+
+    def is_ready(self, db: Session) -> bool:
+        key = str(db.get_bind().url)
+        if key in self._ready:
+            return True
+        # 未就绪的结果不缓存，导入脚本在其他进程中构建索引后即可生效
+        tables = {fts_table for _, fts_table, _ in SEARCH_SOURCES.values()}
+        existing = {
+            name for name, in db.execute(text("SELECT name FROM sqlite_master WHERE type = 'table'")).fetchall()
+        }
+        if not tables <= existing:
+            return False
+        with self._lock:
+            self._ready.add(key)
+        return True
+
+    def rebuild(self, bind: Engine):
+        with bind.begin() as conn:
+            for model, fts_table, columns in SEARCH_SOURCES.values():
+                conn.execute(text(f"DROP TABLE IF EXISTS {fts_table}"))
+                conn.execute(text(
+                    f"CREATE VIRTUAL TABLE {fts_table} USING fts5("
+                    f"{', '.join(columns)}, content='{model.__tablename__}', content_rowid='id', tokenize='trigram')"
+                ))
+                conn.execute(text(f"INSERT INTO {fts_table}({fts_table}) VALUES('rebuild')"))
+        with self._lock:
+            self._ready.add(str(bind.url))
+
+    def _copy_rows(self, db: Session, source: str, ids: Sequence[int], delete: bool):
+        # external content表只能按写入索引时的列值删除，因此删除必须在数据行变化之前执行
+        model, fts_table, columns = SEARCH_SOURCES[source]
+        column_list = ", ".join(columns)
+        command = "'delete', " if delete else ""
+        target = f"{fts_table}({fts_table}, rowid, {column_list})" if delete else f"{fts_table}(rowid, {column_list})"
+        for i in range(0, len(ids), 500):
+            chunk = list(ids[i:i + 500])
+            placeholders = ", ".join(f":id{j}" for j in range(len(chunk)))
+            db.execute(
+                text(f"INSERT INTO {target} SELECT {command}id, {column_list} FROM {model.__tablename__} WHERE id IN ({placeholders})"),
+                {f"id{j}": row_id for j, row_id in enumerate(chunk)}
+            )
+
+    def unindex_rows(self, db: Session, source: str, ids: Sequence[int]):
+        self._copy_rows(db, source, ids, delete=True)
+
+    def index_rows(self, db: Session, source: str, ids: Sequence[int]):
+        self._copy_rows(db, source, ids, delete=False)
+
+    def build_staging_index(self, db: Session, source: str, staging_table: str) -> Optional[Tuple[str, str]]:
+        # content指向正式表名：换入后即读取新数据；索引内容直接从暂存表写入，不依赖content表
+        model, fts_table, columns = SEARCH_SOURCES[source]
+        staging_fts = f"{fts_table}{STAGING_SUFFIX}"
+        column_list = ", ".join(columns)
+        db.execute(text(f"DROP TABLE IF EXISTS {staging_fts}"))
+        db.execute(text(
+            f"CREATE VIRTUAL TABLE {staging_fts} USING fts5("
+            f"{column_list}, content='{model.__tablename__}', content_rowid='id', tokenize='trigram')"
+        ))
+        db.execute(text(f"INSERT INTO {staging_fts}(rowid, {column_list}) SELECT id, {column_list} FROM {staging_table}"))
+        return fts_table, staging_fts
+
+    def _like_condition(self, columns: Sequence[str], term: str, params: Dict[str, str]) -> str:
+        name = f"like{len(params)}"
+        params[name] = f"%{_escape_like(term)}%"
+        return "(" + " OR ".join(f"{column} LIKE :{name} ESCAPE '\\'" for column in columns) + ")"
+
+    def search(self, db: Session, source: str, criteria: Criteria, limit: Optional[int] = None) -> List[int]:
+        _, fts_table, _ = SEARCH_SOURCES[source]
+        match, likes, like_params = [], [], {}
+        for columns, term in criteria:
+            if len(term) >= TRIGRAM_LENGTH:
+                match.append(f"{{{' '.join(columns)}}} : {_fts_phrase(term)}")
+            else:
+                likes.append(self._like_condition(columns, term, like_params))
+        conditions = likes
+        params = like_params
+        if match:
+            conditions = [f"{fts_table} MATCH :match"] + likes
+            params["match"] = " AND ".join(match)
+        sql = f"SELECT rowid FROM {fts_table} WHERE {' AND '.join(conditions)}"
+        if limit:
+            sql += " LIMIT :limit"
+            params["limit"] = limit
+        return [row_id for row_id, in db.execute(text(sql), params).fetchall()]
+
+    def fuzzy_search(self, db: Session, source: str, criteria: Criteria, limit: int = 10) -> List[int]:
+        """按共有trigram数量（bm25）排序的模糊检索，检索词中只要有一个trigram命中即可召回"""
+        _, fts_table, _ = SEARCH_SOURCES[source]
+        groups = []
+        for columns, term in criteria:
+            grams = _trigrams(term)
+            if grams:
+                groups.append(f"{{{' '.join(columns)}}} : ({' OR '.join(_fts_phrase(gram) for gram in grams)})")
+        if not groups:
+            return self.search(db, source, criteria, limit)
+        sql = f"SELECT rowid FROM {fts_table} WHERE {fts_table} MATCH :match ORDER BY rank LIMIT :limit"
+        return [row_id for row_id, in db.execute(text(sql), {"match": " OR ".join(groups), "limit": limit}).fetchall()]
+
+# 已注册的检索后端，其他数据库（如PostgreSQL pg_trgm）可通过register_search_backend接入
+SEARCH_BACKENDS: Dict[str, Type[NMPASearchBackend]] = {
+    LikeSearchBackend.name: LikeSearchBackend,
+    SQLiteFTS5SearchBackend.name: SQLiteFTS5SearchBackend,
+}
+
+_backends: Dict[str, NMPASearchBackend] = {}
+_backends_lock = threading.Lock()
+
+def register_search_backend(backend_class: Type[NMPASearchBackend]):
+    SEARCH_BACKENDS[backend_class.name] = backend_class
+
+def _backend_name(dialect_name: str) -> str:
+    configured = os.getenv("NMPA_SEARCH_BACKEND")
+    if configured:
+        return configured
+    return SQLiteFTS5SearchBackend.name if dialect_name == "sqlite" else LikeSearchBackend.name
+
+def get_search_backend(bind: Engine) -> NMPASearchBackend:
+    """按数据库方言（或NMPA_SEARCH_BACKEND环境变量）选择检索后端"""
+    name = _backend_name(bind.dialect.name)
+    backend = _backends.get(name)
+    if backend is None:
+        with _backends_lock:
+            backend = _backends.setdefault(name, SEARCH_BACKENDS[name]())
+    return backend
+
+def search_ids(db: Session, source: str, criteria: Criteria, limit: Optional[int] = None, fuzzy: bool = False) -> List[int]:
+    """在NMPA数据中检索，索引尚未构建时回退到LIKE后端"""
+    criteria = [(columns, term) for columns, term in criteria if term]
+    if not criteria:
+        return []
+    backend = get_search_backend(db.get_bind())
+    if not backend.is_ready(db):
+        logger.warning(f"NMPA检索索引尚未构建（后端: {backend.name}），回退到LIKE查询，请重新运行导入脚本")
+        backend = _backends.setdefault(LikeSearchBackend.name, LikeSearchBackend())
+    if fuzzy:
+        return backend.fuzzy_search(db, source, criteria, limit or 10)
+    return backend.search(db, source, criteria, limit)
+
+def rebuild_search_index(bind: Engine) -> str:
+    """导入NMPA数据后重建检索索引，返回使用的后端名称"""
+    backend = get_search_backend(bind)
+    backend.rebuild(bind)
+    return backend.name
+
+def fill_domestic_approval_numbers(db: Session, drugs: Table, approval_numbers: Table, batch_size: int = 10000) -> int:
+    """由国产药品表的approval_numbers生成批准文号明细写入approval_numbers表（可以是暂存表），返回写入的行数"""
+    written = 0
+    last_id = 0
+    while True:
+        rows = db.execute(
+            select(drugs.c.id, drugs.c.approval_numbers).where(drugs.c.id > last_id).order_by(drugs.c.id).limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        numbers = [
+            {"approval_number": approval_number, "drug_id": drug_id}
+            for drug_id, approval_numbers in rows
+            for approval_number in split_approval_numbers(approval_numbers)
+        ]
+        if numbers:
+            db.execute(insert(approval_numbers), numbers)
+        db.commit()
+        written += len(numbers)
+        last_id = rows[-1].id
+    return written
+
+def rebuild_domestic_approval_numbers(db: Session, batch_size: int = 10000) -> int:
+    """由nmpa_domestic_drugs.approval_numbers重建批准文号明细表，返回写入的行数"""
+    db.query(NMPADomesticApprovalNumber).delete()
+    db.commit()
+    return fill_domestic_approval_numbers(db, NMPADomesticDrug.__table__, NMPADomesticApprovalNumber.__table__, batch_size)
+
+def update_domestic_approval_numbers(db: Session, drug_ids: Sequence[int]) -> int:
+    """增量维护批准文号明细表：重新生成指定国产药品的明细行（已删除的药品只删除明细），返回写入的行数"""
+    written = 0
+    for i in range(0, len(drug_ids), 500):
+        chunk = list(drug_ids[i:i + 500])
+        db.query(NMPADomesticApprovalNumber).filter(NMPADomesticApprovalNumber.drug_id.in_(chunk)).delete(synchronize_session=False)
+        drugs = db.query(NMPADomesticDrug.id, NMPADomesticDrug.approval_numbers).filter(NMPADomesticDrug.id.in_(chunk)).all()
+        rows = [
+            {"approval_number": approval_number, "drug_id": drug_id}
+            for drug_id, approval_numbers in drugs
+            for approval_number in split_approval_numbers(approval_numbers)
+        ]
+        if rows:
+            db.bulk_insert_mappings(NMPADomesticApprovalNumber, rows)
+        written += len(rows)
+    return written
+
+def has_domestic_approval_numbers(db: Session) -> bool:
+    """批准文号明细表是否已填充（未填充时调用方回退到全文检索）"""
+    return db.query(NMPADomesticApprovalNumber.id).first() is not None
+
+def current_nmpa_data_version(db: Session) -> int:
+    """当前NMPA数据版本号，从未导入过时为0"""
+    return db.query(func.max(NMPADataVersion.version)).scalar() or 0
+
+def bump_nmpa_data_version(db: Session, description: str = "") -> int:
+    """导入NMPA数据后登记新的数据版本，使各进程的NMPA查询缓存失效，返回新版本号"""
+    version = NMPADataVersion(description=description[:255])
+    db.add(version)
+    db.commit()
+    return version.version
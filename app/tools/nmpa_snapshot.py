@@ -0,0 +1,183 @@
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from app.utils.logging_config import get_logger
+
+# 初始化日志记录器
+logger = get_logger(__name__)
+
+# NMPA只读快照文件路径（由导入脚本生成），文件不存在时查询工具回退到数据库
+NMPA_SNAPSHOT_PATH = os.getenv("NMPA_SNAPSHOT_PATH", os.path.join("data", "nmpa_snapshot.bin"))
+# 检查快照文件是否被替换的最小间隔（秒）
+NMPA_SNAPSHOT_CHECK_INTERVAL = float(os.getenv("NMPA_SNAPSHOT_CHECK_INTERVAL", "30"))
+
+# 文件格式：魔数(8字节) + 头部长度(uint32) + JSON头部 + 8字节对齐的各数据段
+# 数据段：records_offsets(uint64[n+1]) + records(UTF-8 JSON字符串堆)
+#        + 每个索引的 keys(定长字节串，有序) + ids(uint32，记录下标)
+SNAPSHOT_MAGIC = b"NMPASNP1"
+SNAPSHOT_FORMAT_VERSION = 1
+_HEADER_LENGTH = struct.Struct("<I")
+
+# 快照中的索引：批准文号（国产药品批准文号明细 + 进口药品注册证号）和药品本位码
+SNAPSHOT_INDEXES = ("approval_number", "drug_code")
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+def _sorted_key_array(entries: List[Tuple[str, int]]) -> Tuple[np.ndarray, np.ndarray]:
+    """按 (键, 记录下标) 排序，返回定长字节串键数组和记录下标数组"""
+    entries = sorted((key.encode("utf-8"), record_id) for key, record_id in entries)
+    width = max((len(key) for key, _ in entries), default=1) or 1
+    keys = np.array([key for key, _ in entries], dtype=f"S{width}")
+    ids = np.array([record_id for _, record_id in entries], dtype="<u4")
+    return keys, ids
+
+def write_nmpa_snapshot(path: str, records: Iterable[Tuple[Dict[str, Any], Dict[str, Sequence[str]]]], data_version: int = 0) -> int:
+    """写入NMPA只读快照，返回记录数
+
+    records 依次给出 (查询工具返回的药品信息字典, {索引名: [键, ...]})，记录顺序即同一键下结果的顺序。
+    先写入临时文件再原子替换，正在读取旧快照的进程不受影响。
+    """
+    offsets = [0]
+    heap = bytearray()
+    entries: Dict[str, List[Tuple[str, int]]] = {name: [] for name in SNAPSHOT_INDEXES}
+    for record_id, (record, keys) in enumerate(records):
+        heap += json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        offsets.append(len(heap))
+        for name in SNAPSHOT_INDEXES:
+            entries[name].extend((key, record_id) for key in dict.fromkeys(keys.get(name, ())) if key)
+
+    sections = [("record_offsets", np.array(offsets, dtype="<u8")), ("records", np.frombuffer(bytes(heap), dtype="u1"))]
+    for name in SNAPSHOT_INDEXES:
+        keys, ids = _sorted_key_array(entries[name])
+        sections += [(f"{name}_keys", keys), (f"{name}_ids", ids)]
+
+    header = {"format_version": SNAPSHOT_FORMAT_VERSION, "data_version": data_version, "record_count": len(offsets) - 1, "sections": {}}
+    # 先按占位偏移计算头部长度，再填入真实偏移（偏移的位数变化时重新计算）
+    header_bytes = b""
+    while True:
+        position = _align(len(SNAPSHOT_MAGIC) + _HEADER_LENGTH.size + len(header_bytes))
+        for name, array in sections:
+            header["sections"][name] = {"offset": position, "dtype": array.dtype.str, "count": len(array)}
+            position = _align(position + array.nbytes)
+        encoded = json.dumps(header).encode("utf-8")
+        if len(encoded) == len(header_bytes):
+            break
+        header_bytes = encoded
+
+    tmp_path = f"{path}.tmp"
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(tmp_path, "wb") as f:
+        f.write(SNAPSHOT_MAGIC + _HEADER_LENGTH.pack(len(header_bytes)) + header_bytes)
+        for name, array in sections:
+            f.write(b"\0" * (header["sections"][name]["offset"] - f.tell()))
+            f.write(array.tobytes())
+    os.replace(tmp_path, path)
+    return header["record_count"]
+
+class NMPASnapshot:
+    """内存映射的NMPA只读快照
+
+    键数组和记录偏移直接以numpy数组视图映射文件内容（零拷贝），用二分查找定位；
+    多个工作进程映射同一文件时共享操作系统页缓存中的同一份数据。
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+            raise ValueError(f"不是有效的NMPA快照文件: {path}")
+        start = len(SNAPSHOT_MAGIC) + _HEADER_LENGTH.size
+        header_length, = _HEADER_LENGTH.unpack_from(self._mmap, len(SNAPSHOT_MAGIC))
+        header = json.loads(self._mmap[start:start + header_length])
+        if header["format_version"] != SNAPSHOT_FORMAT_VERSION:
+            raise ValueError(f"不支持的NMPA快照格式版本: {header['format_version']}")
+        self.path = path
+        self.data_version = header["data_version"]
+        self.record_count = header["record_count"]
+        self._sections = {
+            name: np.frombuffer(self._mmap, dtype=section["dtype"], count=section["count"], offset=section["offset"])
+            if section["count"] else np.empty(0, dtype=section["dtype"])
+            for name, section in header["sections"].items()
+        }
+        self._records_offset = header["sections"]["records"]["offset"]
+
+    def __len__(self) -> int:
+        return self.record_count
+
+    def _record(self, record_id: int) -> Dict[str, Any]:
+        offsets = self._sections["record_offsets"]
+        start = self._records_offset + int(offsets[record_id])
+        end = self._records_offset + int(offsets[record_id + 1])
+        return json.loads(self._mmap[start:end])
+
+    def _record_ids(self, index: str, key: str) -> List[int]:
+        keys = self._sections[f"{index}_keys"]
+        encoded = key.encode("utf-8")
+        if not encoded or len(encoded) > keys.dtype.itemsize:
+            return []
+        left = int(np.searchsorted(keys, encoded, side="left"))
+        right = int(np.searchsorted(keys, encoded, side="right"))
+        return self._sections[f"{index}_ids"][left:right].tolist()
+
+    def find_by_approval_number(self, approval_number: str) -> List[Dict[str, Any]]:
+        """按标准化后的批准文号/注册证号精确查询"""
+        return [self._record(record_id) for record_id in self._record_ids("approval_number", approval_number)]
+
+    def find_by_drug_code(self, drug_code: str) -> Optional[Dict[str, Any]]:
+        """按药品本位码精确查询，同一编码有多条记录时返回写入顺序中的第一条"""
+        record_ids = self._record_ids("drug_code", drug_code)
+        return self._record(record_ids[0]) if record_ids else None
+
+class _SnapshotHolder:
+    """按文件的 (inode, 修改时间, 大小) 判断快照是否已被导入脚本替换，替换后重新映射"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot: Optional[NMPASnapshot] = None
+        self._stat: Optional[Tuple[str, int, int, int]] = None
+        self._checked_at: Optional[float] = None
+
+    def get(self, path: str) -> Optional[NMPASnapshot]:
+        now = time.monotonic()
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < NMPA_SNAPSHOT_CHECK_INTERVAL \
+                    and self._stat is not None and self._stat[0] == path:
+                return self._snapshot
+            self._checked_at = now
+            try:
+                stat = os.stat(path)
+                key = (path, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                # 快照文件不存在，同样在检查间隔内不再重复检查
+                self._snapshot, self._stat = None, (path, 0, 0, 0)
+                return None
+            if key != self._stat:
+                try:
+                    self._snapshot = NMPASnapshot(path)
+                    logger.info(f"NMPA快照已加载: {path}，共 {len(self._snapshot)} 条记录")
+                except (OSError, ValueError) as e:
+                    logger.warning(f"NMPA快照加载失败，回退到数据库查询: {e}")
+                    self._snapshot = None
+                self._stat = key
+            return self._snapshot
+
+    def clear(self):
+        with self._lock:
+            self._snapshot, self._stat, self._checked_at = None, None, None
+
+# 进程内唯一的快照实例
+_holder = _SnapshotHolder()
+
+def get_nmpa_snapshot() -> Optional[NMPASnapshot]:
+    """获取NMPA只读快照，快照文件不存在或无效时返回None（调用方回退到数据库查询）"""
+    return _holder.get(NMPA_SNAPSHOT_PATH)
+
+def reset_nmpa_snapshot():
+    """丢弃已映射的快照，下次查询时重新检查快照文件"""
+    _holder.clear()
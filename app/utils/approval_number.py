@@ -0,0 +1,129 @@
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from typing import Any, Dict, Hashable, Iterable, List, Set, Tuple
+
+# 空白字符（含全角空格）及零宽字符
+_WHITESPACE_PATTERN = re.compile(r"[\s\u200b\u200c\u200d\ufeff]+")
+
+# 多个批准文号之间的分隔符（全角/半角分号）
+_SEPARATOR_PATTERN = re.compile(r"[；;]")
+
+# 国产药品批准文号（含进口分包装的国药准字HJ/ZJ等），在标准化后的文本上匹配
+DRUG_APPROVAL_NUMBER_PATTERN = re.compile(r"国药准字[A-Z]{1,2}\d{8}(?!\d)")
+
+# 前缀查询的最小长度，避免“国药准字”之类的公共前缀命中全部数据
+MIN_PREFIX_LENGTH = 6
+
+# 单次前缀查询最多返回的键数量
+MAX_PREFIX_RESULTS = 200
+
+def normalize_approval_number(value: Any) -> str:
+    """标准化批准文号/注册证号/备案号（国药准字、械注准、国妆特字等）
+
+    全角字符转半角（NFKC），去除所有空白和零宽字符，字母统一为大写。
+    例如 "国药准字 Ｈ２０２４０００１" -> "国药准字H20240001"。
+    """
+    if not value:
+        return ""
+    text = unicodedata.normalize("NFKC", str(value))
+    text = _WHITESPACE_PATTERN.sub("", text)
+    return text.upper()
+
+def split_approval_numbers(value: Any) -> List[str]:
+    """拆分以全角/半角分号分隔的多个批准文号，返回去重后的标准化结果（保持原有顺序）"""
+    if not value:
+        return []
+    numbers = (normalize_approval_number(part) for part in _SEPARATOR_PATTERN.split(str(value)))
+    return list(dict.fromkeys(number for number in numbers if number))
+
+class ApprovalNumberIndex:
+    """基于有序键数组的批准文号索引，支持精确查询和双向前缀查询
+
+    精确查询走哈希表；前缀查询在有序键数组上二分定位，复杂度为O(log n + 键长 + 结果数)。
+    所有键在写入和查询时都会先经过normalize_approval_number标准化。
+    """
+
+    def __init__(self, entries: Iterable[Tuple[Any, Hashable]] = ()):
+        self._lock = threading.RLock()
+        postings: Dict[str, Set[Hashable]] = {}
+        for approval_number, item_id in entries:
+            key = normalize_approval_number(approval_number)
+            if key:
+                postings.setdefault(key, set()).add(item_id)
+        self._postings = postings
+        self._sorted_keys: List[str] = sorted(postings)
+
+    def __len__(self) -> int:
+        return len(self._postings)
+
+    def add(self, approval_number: Any, item_id: Hashable):
+        """添加一条 批准文号 -> ID 映射"""
+        key = normalize_approval_number(approval_number)
+        if not key:
+            return
+        with self._lock:
+            ids = self._postings.get(key)
+            if ids is None:
+                self._postings[key] = {item_id}
+                insort(self._sorted_keys, key)
+            else:
+                ids.add(item_id)
+
+    def remove(self, approval_number: Any, item_id: Hashable):
+        """删除一条 批准文号 -> ID 映射"""
+        key = normalize_approval_number(approval_number)
+        with self._lock:
+            ids = self._postings.get(key)
+            if not ids:
+                return
+            ids.discard(item_id)
+            if not ids:
+                del self._postings[key]
+                i = bisect_left(self._sorted_keys, key)
+                if i < len(self._sorted_keys) and self._sorted_keys[i] == key:
+                    del self._sorted_keys[i]
+
+    def exact(self, approval_number: Any) -> Set[Hashable]:
+        """精确查询"""
+        key = normalize_approval_number(approval_number)
+        with self._lock:
+            return set(self._postings.get(key, ()))
+
+    def with_prefix(self, prefix: Any, limit: int = MAX_PREFIX_RESULTS) -> Set[Hashable]:
+        """查询以prefix开头的所有批准文号对应的ID（不含与prefix完全相同的键）"""
+        prefix = normalize_approval_number(prefix)
+        if len(prefix) < MIN_PREFIX_LENGTH:
+            return set()
+        result = set()
+        with self._lock:
+            i = bisect_left(self._sorted_keys, prefix)
+            scanned = 0
+            while i < len(self._sorted_keys) and scanned < limit:
+                key = self._sorted_keys[i]
+                if not key.startswith(prefix):
+                    break
+                if key != prefix:
+                    result.update(self._postings[key])
+                    scanned += 1
+                i += 1
+        return result
+
+    def prefixes_of(self, approval_number: Any) -> Set[Hashable]:
+        """查询作为approval_number真前缀的所有批准文号对应的ID"""
+        key = normalize_approval_number(approval_number)
+        result = set()
+        with self._lock:
+            for length in range(MIN_PREFIX_LENGTH, len(key)):
+                ids = self._postings.get(key[:length])
+                if ids:
+                    result.update(ids)
+        return result
+
+    def related(self, approval_number: Any) -> Dict[Hashable, str]:
+        """查询与approval_number完全一致或存在前缀关系的ID，返回 {ID: "EXACT" | "PREFIX"}"""
+        related = {item_id: "PREFIX" for item_id in self.prefixes_of(approval_number)}
+        related.update({item_id: "PREFIX" for item_id in self.with_prefix(approval_number)})
+        related.update({item_id: "EXACT" for item_id in self.exact(approval_number)})
+        return related
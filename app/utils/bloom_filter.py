@@ -0,0 +1,48 @@
+import hashlib
+import math
+import struct
+import threading
+from typing import Iterable
+import numpy as np
+
+class BloomFilter:
+    """基于numpy位数组的布隆过滤器
+
+    不在集合中的元素以至少 1 - error_rate 的概率被判定为不存在，集合中的元素一定判定为存在。
+    元素只能添加不能删除；每个元素用blake2b得到两个64位哈希，再以双重哈希生成k个位置。
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        capacity = max(capacity, 1)
+        self.num_bits = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._bits = np.zeros((self.num_bits + 7) // 8, dtype=np.uint8)
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """已添加的元素数量（含重复添加）"""
+        return self._count
+
+    def _positions(self, item: str) -> np.ndarray:
+        h1, h2 = struct.unpack("<QQ", hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest())
+        i = np.arange(self.num_hashes, dtype=np.uint64)
+        with np.errstate(over="ignore"):
+            return (np.uint64(h1) + i * np.uint64(h2 | 1)) % np.uint64(self.num_bits)
+
+    def add(self, item: str):
+        positions = self._positions(item)
+        with self._lock:
+            np.bitwise_or.at(self._bits, positions >> np.uint64(3), np.left_shift(1, positions & np.uint64(7)).astype(np.uint8))
+            self._count += 1
+
+    def update(self, items: Iterable[str]):
+        for item in items:
+            self.add(item)
+
+    def __contains__(self, item: str) -> bool:
+        positions = self._positions(item)
+        masks = np.left_shift(1, positions & np.uint64(7)).astype(np.uint8)
+        return bool(np.all(self._bits[positions >> np.uint64(3)] & masks))
@@ -0,0 +1,216 @@
+import contextvars
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.prompts import BasePromptTemplate
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+from app.utils.logging_config import CACHE_ENTRIES, CACHE_REQUESTS, get_logger
+
+# 初始化日志记录器
+logger = get_logger(__name__)
+
+# LLM响应缓存的SQLite文件路径，设为空字符串时不使用缓存
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join("data", "llm_cache.db"))
+# 缓存条目的有效期（秒），默认7天
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+# 缓存的最大条目数，超出时淘汰最久未使用的条目
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "100000"))
+# 为true时不读取缓存（仍写入新的响应，相当于强制刷新）
+LLM_CACHE_BYPASS = os.getenv("LLM_CACHE_BYPASS", "false").lower() in ("1", "true", "yes")
+
+CACHE_NAME = "llm_response"
+
+# 每写入多少条执行一次过期和超量淘汰
+_EVICT_EVERY = 100
+# 命中时的最近使用时间先记在内存中，累积到该条数（或写入、淘汰、关闭时）再批量写回
+_TOUCH_EVERY = 100
+
+_bypass = contextvars.ContextVar("llm_cache_bypass", default=False)
+
+class LLMResponseCache:
+    """基于SQLite的LLM响应缓存，进程重启后仍然有效，多个工作进程可共用同一文件"""
+
+    def __init__(self, path: str, ttl: float = LLM_CACHE_TTL, max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._touched: Dict[str, float] = {}
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_responses ("
+            "key TEXT PRIMARY KEY, namespace TEXT NOT NULL, response TEXT NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_responses_accessed_at ON llm_responses (accessed_at)")
+        self._conn.commit()
+        self.evict()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0]
+
+    def get(self, key: str) -> Optional[str]:
+        """返回缓存的响应，不存在或已过期时返回None"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT response, created_at FROM llm_responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[1] > now - self.ttl:
+                # 命中路径不写库，最近使用时间只用于超量淘汰，批量写回即可
+                self._touched[key] = now
+                if len(self._touched) >= _TOUCH_EVERY:
+                    self._flush_touched_locked()
+                    self._conn.commit()
+                CACHE_REQUESTS.labels(cache=CACHE_NAME, result="hit").inc()
+                return row[0]
+        CACHE_REQUESTS.labels(cache=CACHE_NAME, result="miss").inc()
+        return None
+
+    def set(self, key: str, namespace: str, response: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_responses (key, namespace, response, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, namespace, response, now, now)
+            )
+            self._touched.pop(key, None)
+            self._flush_touched_locked()
+            self._conn.commit()
+            self._writes += 1
+            if self._writes % _EVICT_EVERY == 0:
+                self._evict_locked()
+
+    def _flush_touched_locked(self):
+        if self._touched:
+            self._conn.executemany("UPDATE llm_responses SET accessed_at = ? WHERE key = ?",
+                                   [(accessed_at, key) for key, accessed_at in self._touched.items()])
+            self._touched.clear()
+
+    def _evict_locked(self) -> int:
+        self._flush_touched_locked()
+        removed = self._conn.execute("DELETE FROM llm_responses WHERE created_at <= ?", (time.time() - self.ttl,)).rowcount
+        count = self._conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0]
+        if count > self.max_entries:
+            removed += self._conn.execute(
+                "DELETE FROM llm_responses WHERE key IN (SELECT key FROM llm_responses ORDER BY accessed_at LIMIT ?)",
+                (count - self.max_entries,)
+            ).rowcount
+            count = self.max_entries
+        self._conn.commit()
+        CACHE_ENTRIES.labels(cache=CACHE_NAME).set(count)
+        return removed
+
+    def evict(self) -> int:
+        """删除过期条目，并按最近使用时间淘汰超出max_entries的条目，返回删除的条目数"""
+        with self._lock:
+            return self._evict_locked()
+
+    def clear(self):
+        with self._lock:
+            self._touched.clear()
+            self._conn.execute("DELETE FROM llm_responses")
+            self._conn.commit()
+            CACHE_ENTRIES.labels(cache=CACHE_NAME).set(0)
+
+    def close(self):
+        with self._lock:
+            self._flush_touched_locked()
+            self._conn.commit()
+            self._conn.close()
+
+# 进程内唯一的缓存实例（首次使用时打开）
+_cache: Optional[LLMResponseCache] = None
+_cache_failed = False
+_cache_lock = threading.Lock()
+
+def get_llm_response_cache() -> Optional[LLMResponseCache]:
+    """获取LLM响应缓存，未配置路径或无法打开时返回None（调用方直接调用LLM）"""
+    global _cache, _cache_failed
+    if _cache is None and not _cache_failed and LLM_CACHE_PATH:
+        with _cache_lock:
+            if _cache is None and not _cache_failed:
+                try:
+                    _cache = LLMResponseCache(LLM_CACHE_PATH)
+                except sqlite3.Error as e:
+                    logger.warning(f"LLM响应缓存无法打开，不使用缓存: {e}")
+                    _cache_failed = True
+    return _cache
+
+def reset_llm_response_cache():
+    """关闭并丢弃缓存实例，下次使用时按当前配置重新打开"""
+    global _cache, _cache_failed
+    with _cache_lock:
+        if _cache is not None:
+            _cache.close()
+        _cache, _cache_failed = None, False
+
+@contextmanager
+def bypass_llm_cache() -> Iterator[None]:
+    """在该上下文中调用的链不读取缓存，直接调用LLM并以新的响应覆盖缓存"""
+    token = _bypass.set(True)
+    try:
+        yield
+    finally:
+        _bypass.reset(token)
+
+def _llm_identity(llm: Any) -> List[str]:
+    model = getattr(llm, "model_name", None) or getattr(llm, "model", None) or ""
+    return [getattr(llm, "_llm_type", type(llm).__name__), str(model)]
+
+def response_cache_key(llm: Any, namespace: str, version: int, messages: List[BaseMessage]) -> str:
+    """缓存键：(提供方, 模型, 链名称, 模板版本, 渲染后的消息) 的SHA-256"""
+    payload = [*_llm_identity(llm), namespace, version, [[message.type, message.content] for message in messages]]
+    return hashlib.sha256(json.dumps(payload, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+def _dump(output: Any) -> str:
+    if isinstance(output, BaseMessage):
+        return json.dumps({"message": output.content}, ensure_ascii=False)
+    return json.dumps({"value": output}, ensure_ascii=False)
+
+def _load(response: str) -> Any:
+    data = json.loads(response)
+    return AIMessage(content=data["message"]) if "message" in data else data["value"]
+
+def cached_chain(namespace: str, version: int, prompt: BasePromptTemplate, llm: Any, parser: Optional[Runnable] = None) -> Runnable:
+    """构建等价于 prompt | llm | parser 的链，按渲染后的输入缓存最终输出
+
+    缓存的是解析后的结果，LLM调用或解析失败时不写入缓存。version是调用方的提示词版本
+    （各Agent模块中的PROMPT_VERSION），参与缓存键的计算：修改提示词模板或输出解析逻辑时须将其递增，
+    否则会继续返回按旧提示词得到的缓存结果。
+    """
+    model = llm if parser is None else llm | parser
+
+    def invoke(inputs: dict, config: RunnableConfig) -> Any:
+        prompt_value = prompt.invoke(inputs, config)
+        cache = get_llm_response_cache()
+        if cache is None:
+            return model.invoke(prompt_value, config)
+        key = response_cache_key(llm, namespace, version, prompt_value.to_messages())
+        if LLM_CACHE_BYPASS or _bypass.get():
+            CACHE_REQUESTS.labels(cache=CACHE_NAME, result="bypass").inc()
+        else:
+            try:
+                response = cache.get(key)
+            except sqlite3.Error as e:
+                logger.warning(f"读取LLM响应缓存失败: {e}")
+                response = None
+            if response is not None:
+                return _load(response)
+        output = model.invoke(prompt_value, config)
+        try:
+            cache.set(key, namespace, _dump(output))
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            logger.warning(f"写入LLM响应缓存失败: {e}")
+        return output
+
+    return RunnableLambda(invoke, name=f"{namespace}_chain")
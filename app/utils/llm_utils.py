@@ -2,34 +2,137 @@ from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_deepseek import ChatDeepSeek
 from langchain_openai import ChatOpenAI # 导入 ChatOpenAI
 import os
+import threading
+import httpx
 from dotenv import load_dotenv
-from typing import Any
+from typing import Any, Dict, Optional, Tuple
+from app.utils.logging_config import LLM_CLIENTS, LLM_HTTP_POOL_CONNECTIONS, LLM_HTTP_REQUESTS, get_logger
 
 load_dotenv()
 
-def get_llm_instance(model_provider: str = None) -> Any:
-    """根据配置获取LLM模型实例"""
-    model_provider = model_provider or os.getenv("LLM_MODEL", "gemini")
+# 初始化日志记录器
+logger = get_logger(__name__)
+
+# LLM HTTP连接池参数：最大连接数、最大空闲（keep-alive）连接数、空闲连接保留时间（秒）
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "20"))
+LLM_HTTP_MAX_KEEPALIVE = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "10"))
+LLM_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "60"))
+
+# OpenAI兼容协议的提供方（DeepSeek、Volces）共用的连接池名称
+SHARED_POOL = "shared"
+
+def _pool_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=LLM_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=LLM_HTTP_KEEPALIVE_EXPIRY
+    )
+
+def _event_hooks(pool: str) -> Dict[str, list]:
+    """统计每个请求是新建连接还是复用连接池中的连接（通过httpcore的trace扩展观察TCP建连事件）"""
+    def on_request(request: httpx.Request):
+        state = {"new": False}
+        previous = request.extensions.get("trace")
+
+        def trace(event_name: str, info: Dict[str, Any]):
+            if event_name == "connection.connect_tcp.complete":
+                state["new"] = True
+            if previous is not None:
+                previous(event_name, info)
 
+        request.extensions["trace"] = trace
+        request.extensions["llm_connection"] = state
+
+    def on_response(response: httpx.Response):
+        state = response.request.extensions.get("llm_connection") or {}
+        LLM_HTTP_REQUESTS.labels(pool=pool, connection="new" if state.get("new") else "reused").inc()
+
+    return {"request": [on_request], "response": [on_response]}
+
+def _open_connections(client: httpx.Client) -> int:
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    return len(getattr(pool, "connections", ()))
+
+def _provider_config(model_provider: str) -> Tuple[str, ...]:
+    """读取提供方的模型配置，返回 (提供方, 模型名称, API Key, Base URL)；配置变化时注册表会新建客户端"""
     if model_provider == "gemini":
         api_key = os.getenv("GEMINI_API_KEY")
         if not api_key:
             raise ValueError("GEMINI_API_KEY not found in environment variables.")
         gemini_model = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
-        return ChatGoogleGenerativeAI(model=gemini_model, api_key=api_key)
+        return model_provider, gemini_model, api_key, ""
     elif model_provider == "deepseek":
         api_key = os.getenv("DEEPSEEK_API_KEY")
         if not api_key:
             raise ValueError("DEEPSEEK_API_KEY not found in environment variables.")
         deepseek_model = os.getenv("DEEPSEEK_MODEL", "deepseek-chat") # 从环境变量获取模型名称
-        return ChatDeepSeek(model=deepseek_model, api_key=api_key)
+        return model_provider, deepseek_model, api_key, ""
     elif model_provider == "volces":
         api_key = os.getenv("VOLCES_API_KEY")
         base_url = os.getenv("VOLCES_BASE_URL")
         if not api_key or not base_url:
             raise ValueError("VOLCES_API_KEY or VOLCES_BASE_URL not found in environment variables for Volces model.")
         volces_model = os.getenv("VOLCES_MODEL", "volces-model-default") # 从环境变量获取模型名称
-        # Volces兼容OpenAI协议，使用ChatOpenAI
-        return ChatOpenAI(base_url=base_url, api_key=api_key, model_name=volces_model)
+        return model_provider, volces_model, api_key, base_url
     else:
-        raise ValueError(f"Unsupported LLM model provider: {model_provider}")
\ No newline at end of file
+        raise ValueError(f"Unsupported LLM model provider: {model_provider}")
+
+class LLMClientRegistry:
+    """按提供方和配置缓存LLM客户端，进程内的所有Agent和线程共用
+
+    OpenAI兼容的提供方共用同一个httpx连接池（连接按主机区分，互不影响）；
+    Gemini的SDK自行创建httpx客户端，只能传入连接池参数，随Gemini客户端一起复用。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients: Dict[Tuple[str, ...], Any] = {}
+        self._http_client: Optional[httpx.Client] = None
+
+    def _shared_http_client(self) -> httpx.Client:
+        if self._http_client is None:
+            self._http_client = httpx.Client(limits=_pool_limits(), event_hooks=_event_hooks(SHARED_POOL))
+            client = self._http_client
+            LLM_HTTP_POOL_CONNECTIONS.labels(pool=SHARED_POOL).set_function(lambda: _open_connections(client))
+        return self._http_client
+
+    def _build(self, config: Tuple[str, ...]) -> Any:
+        model_provider, model, api_key, base_url = config
+        if model_provider == "gemini":
+            client_args = {"limits": _pool_limits(), "event_hooks": _event_hooks(model_provider)}
+            return ChatGoogleGenerativeAI(model=model, api_key=api_key, client_args=client_args)
+        if model_provider == "deepseek":
+            return ChatDeepSeek(model=model, api_key=api_key, http_client=self._shared_http_client())
+        # Volces兼容OpenAI协议，使用ChatOpenAI
+        return ChatOpenAI(base_url=base_url, api_key=api_key, model_name=model, http_client=self._shared_http_client())
+
+    def get(self, model_provider: str) -> Any:
+        config = _provider_config(model_provider)
+        with self._lock:
+            client = self._clients.get(config)
+            created = client is None
+            if created:
+                client = self._clients[config] = self._build(config)
+                logger.info(f"已创建LLM客户端: {model_provider}/{config[1]}")
+        LLM_CLIENTS.labels(provider=model_provider, result="created" if created else "reused").inc()
+        return client
+
+    def clear(self):
+        """丢弃已创建的客户端并关闭共用的连接池"""
+        with self._lock:
+            self._clients.clear()
+            if self._http_client is not None:
+                self._http_client.close()
+                self._http_client = None
+
+# 进程内唯一的LLM客户端注册表
+_registry = LLMClientRegistry()
+
+def get_llm_instance(model_provider: str = None) -> Any:
+    """根据配置获取LLM模型实例（同一提供方和配置只创建一次，复用HTTP连接）"""
+    model_provider = model_provider or os.getenv("LLM_MODEL", "gemini")
+    return _registry.get(model_provider)
+
+def reset_llm_clients():
+    """关闭并丢弃所有LLM客户端，下次获取时按当前配置重新创建"""
+    _registry.clear()
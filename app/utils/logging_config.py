@@ -22,6 +22,27 @@ TASK_DURATION = Histogram('task_processing_duration_seconds', 'Task processing d
 # 错误总数，按错误类型和端点分类
 ERROR_COUNT = Counter('errors_total', 'Total errors', ['type', 'endpoint'])
 
+# 进程内缓存的查询次数，按缓存名称和结果（hit/miss）分类
+CACHE_REQUESTS = Counter('cache_requests_total', 'Total cache lookups', ['cache', 'result'])
+# 进程内缓存的当前条目数
+CACHE_ENTRIES = Gauge('cache_entries', 'Number of entries in cache', ['cache'])
+
+# NMPA快速通道的执行结果（hit/miss/error）
+NMPA_FAST_PATH = Counter('nmpa_fast_path_total', 'NMPA fast path results', ['result'])
+
+# 批准文号预检结果（passed/invalid_format/not_registered/skipped）
+APPROVAL_NUMBER_PRECHECK = Counter('approval_number_precheck_total', 'Approval number precheck results', ['result'])
+
+# 分类+提取融合节点的执行结果（success/fallback/error）
+FUSED_CLASSIFY_EXTRACT = Counter('fused_classify_extract_total', 'Fused classify-and-extract results', ['result'])
+
+# LLM客户端获取次数，按模型提供方和结果（created/reused）分类
+LLM_CLIENTS = Counter('llm_client_requests_total', 'LLM client lookups', ['provider', 'result'])
+# 发往LLM服务的HTTP请求数，按连接池和连接是否复用（new/reused）分类
+LLM_HTTP_REQUESTS = Counter('llm_http_requests_total', 'HTTP requests sent to LLM providers', ['pool', 'connection'])
+# LLM连接池中当前的连接数
+LLM_HTTP_POOL_CONNECTIONS = Gauge('llm_http_pool_connections', 'Open connections in LLM HTTP pools', ['pool'])
+
 
 def configure_structlog() -> None:
     """配置structlog用于结构化日志记录"""
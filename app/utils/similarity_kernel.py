@@ -0,0 +1,240 @@
+import heapq
+from difflib import SequenceMatcher
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from app.utils.approval_number import normalize_approval_number
+from app.utils.spec_parser import ParsedSpecification, parsed_specification
+from app.utils.text_normalize import normalized_value
+
+# 批准文号匹配得分：完全一致 / 前缀关系
+APPROVAL_EXACT_SCORE = 40
+APPROVAL_PREFIX_SCORE = 20
+
+# 结构化规格得分：含量和包装数量一致 / 仅含量一致
+SPEC_EXACT_SCORE = 10
+SPEC_STRENGTH_SCORE = 5
+
+# 规范企业ID一致时的生产企业得分
+MANUFACTURER_MATCH_SCORE = 20
+
+# 各字段的相似度分档规则：[(相似度下限(不含), 得分), ...]，按下限从高到低排列
+FIELD_SCORE_RULES: Dict[str, List[Tuple[float, int]]] = {
+    "product_name": [(0.9, 25), (0.8, 20), (0.7, 15), (0.6, 10)], # 权重25%
+    "manufacturer": [(0.9, 20), (0.8, 10)], # 权重20%
+    "specification": [(0.9, 10), (0.8, 5)], # 权重10%
+    "brand": [(0.9, 5), (0.8, 2)], # 权重5%
+}
+
+# 按权重从高到低的字段计算顺序
+FIELD_ORDER = ("approval_number",) + tuple(FIELD_SCORE_RULES)
+
+# 各字段可获得的最高分，用于计算分数上界
+FIELD_MAX_SCORES: Dict[str, int] = {
+    "approval_number": APPROVAL_EXACT_SCORE,
+    **{field: rules[0][1] for field, rules in FIELD_SCORE_RULES.items()},
+}
+
+def _codepoints(text: str) -> np.ndarray:
+    return np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+
+def char_overlaps(value: str, candidates: Sequence[str]) -> np.ndarray:
+    """各候选与value的字符多重集交集大小（SequenceMatcher.quick_ratio的分子）
+
+    所有候选的码点拼接为一个数组，按value的字符表计数后与value中的字符数取较小值求和，无逐候选的Python循环。
+    """
+    vocab, value_counts = np.unique(_codepoints(value), return_counts=True)
+    lengths = np.fromiter(map(len, candidates), dtype=np.int64, count=len(candidates))
+    codes = _codepoints("".join(candidates))
+    owners = np.repeat(np.arange(len(candidates)), lengths)
+    slots = np.minimum(np.searchsorted(vocab, codes), len(vocab) - 1)
+    known = vocab[slots] == codes
+    counts = np.bincount(owners[known] * len(vocab) + slots[known], minlength=len(candidates) * len(vocab))
+    return np.minimum(counts.reshape(len(candidates), len(vocab)), value_counts).sum(axis=1)
+
+def similarity_column(value: str, candidates: Sequence[str], min_ratio: float = 0.0) -> np.ndarray:
+    """计算一个字符串与一列候选字符串的相似度（与SequenceMatcher.ratio()语义一致）
+
+    相同的候选值只计算一次。ratio()的两个上界——real_quick_ratio（长度）和quick_ratio（字符多重集交集）——
+    对所有候选向量化计算，上界不超过min_ratio的候选直接记为0（该字段无论如何都不会得分）；
+    只有存活的候选才逐个调用ratio()，其最长匹配块算法无法等价地向量化。
+    """
+    similarities = np.zeros(len(candidates), dtype=np.float64)
+    if not value:
+        return similarities
+
+    value = value.lower()
+    # 原始候选值 -> 去重后（小写）的下标，空值为-1
+    slots: Dict[Optional[str], int] = {None: -1, "": -1}
+    lowered: Dict[str, int] = {}
+    for candidate in candidates:
+        if candidate not in slots:
+            slots[candidate] = lowered.setdefault(candidate.lower(), len(lowered))
+    if not lowered:
+        return similarities
+    positions = np.fromiter(map(slots.__getitem__, candidates), dtype=np.int64, count=len(candidates))
+
+    unique = list(lowered)
+    lengths = np.fromiter(map(len, unique), dtype=np.int64, count=len(unique)) + len(value)
+    # 与difflib相同的计算方式（2.0 * 匹配数 / 总长度），上界与逐个调用时完全一致
+    real_quick = 2.0 * np.minimum(lengths - len(value), len(value)) / lengths
+    quick = 2.0 * char_overlaps(value, unique) / lengths
+    ratios = np.zeros(len(unique), dtype=np.float64)
+    matcher = SequenceMatcher(None, value, "")
+    for k in np.flatnonzero((real_quick > min_ratio) & (quick > min_ratio)):
+        if unique[k] == value:
+            ratios[k] = 1.0
+        else:
+            matcher.set_seq2(unique[k])
+            ratios[k] = matcher.ratio()
+    present = positions >= 0
+    similarities[present] = ratios[positions[present]]
+    return similarities
+
+def bucket_scores(similarities: np.ndarray, rules: List[Tuple[float, int]]) -> np.ndarray:
+    """按分档规则将相似度数组向量化地转换为得分数组"""
+    conditions = [similarities > lower for lower, _ in rules]
+    choices = [points for _, points in rules]
+    return np.select(conditions, choices, default=0)
+
+def approval_number_scores(approval_number: str, candidates: Sequence[str]) -> np.ndarray:
+    """批准文号得分：标准化后完全一致得40分，存在前缀关系得20分"""
+    scores = np.zeros(len(candidates), dtype=np.int64)
+    approval_number = normalize_approval_number(approval_number)
+    if not approval_number:
+        return scores
+    for i, candidate in enumerate(candidates):
+        candidate = normalize_approval_number(candidate)
+        if not candidate:
+            continue
+        if candidate == approval_number:
+            scores[i] = APPROVAL_EXACT_SCORE
+        elif approval_number.startswith(candidate) or candidate.startswith(approval_number):
+            scores[i] = APPROVAL_PREFIX_SCORE
+    return scores
+
+def _get(data: Any, key: str) -> Any:
+    return data.get(key) if isinstance(data, dict) else getattr(data, key, None)
+
+def _structured_scores(field: str, value: Tuple[str, Any], candidates: Sequence[Tuple[str, Any]], compare: Callable[[Any, Any], Optional[int]]) -> np.ndarray:
+    """结构化字段得分：compare对双方的结构化值给出得分，无法比较（返回None）时回退到文本相似度
+
+    value和candidates均为 (标准化文本, 结构化值) 二元组。
+    """
+    scores = np.zeros(len(candidates), dtype=np.int64)
+    text, structured = value
+    fallback = []
+    for i, (_, candidate_structured) in enumerate(candidates):
+        score = compare(structured, candidate_structured)
+        if score is None:
+            fallback.append(i)
+        else:
+            scores[i] = score
+    if fallback:
+        rules = FIELD_SCORE_RULES[field]
+        similarities = similarity_column(text or "", [candidates[i][0] for i in fallback], min_ratio=rules[-1][0])
+        scores[fallback] = bucket_scores(similarities, rules)
+    return scores
+
+def compare_specifications(spec: Optional[ParsedSpecification], candidate_spec: Optional[ParsedSpecification]) -> Optional[int]:
+    """规格得分：双方都能解析出含量时按数值比较，否则返回None"""
+    if spec is None or candidate_spec is None or spec.strength is None or candidate_spec.strength is None:
+        return None
+    if (spec.strength, spec.strength_unit) != (candidate_spec.strength, candidate_spec.strength_unit):
+        return 0
+    if (spec.pack_count, spec.pack_unit) == (candidate_spec.pack_count, candidate_spec.pack_unit):
+        return SPEC_EXACT_SCORE
+    return SPEC_STRENGTH_SCORE
+
+def compare_manufacturer_ids(manufacturer_id: Optional[int], candidate_id: Optional[int]) -> Optional[int]:
+    """生产企业得分：双方规范企业ID一致时得满分，否则返回None
+
+    ID不同时回退到文本相似度：新保存的商品会为未登记的名称新建企业，写法相近的同一企业可能得到不同ID。
+    """
+    if manufacturer_id is None or manufacturer_id != candidate_id:
+        return None
+    return MANUFACTURER_MATCH_SCORE
+
+# 结构化字段 -> (读取结构化值的函数, 比较函数)
+STRUCTURED_FIELDS: Dict[str, Tuple[Callable[[Any], Any], Callable[[Any, Any], Optional[int]]]] = {
+    "specification": (parsed_specification, compare_specifications),
+    "manufacturer": (lambda data: _get(data, "manufacturer_id"), compare_manufacturer_ids),
+}
+
+def field_value(data: Any, field: str) -> Any:
+    """获取参与打分的字段值：结构化字段为 (标准化文本, 结构化值)，其余字段为标准化文本"""
+    value = normalized_value(data, field)
+    structured = STRUCTURED_FIELDS.get(field)
+    if structured is not None:
+        return value, structured[0](data)
+    return value
+
+def field_scores(field: str, value: Any, candidates: Sequence[Any]) -> np.ndarray:
+    """计算单个字段对一列候选值（由field_value得到）的得分"""
+    if field == "approval_number":
+        return approval_number_scores(value or "", candidates)
+    structured = STRUCTURED_FIELDS.get(field)
+    if structured is not None:
+        return _structured_scores(field, value, candidates, structured[1])
+    rules = FIELD_SCORE_RULES[field]
+    return bucket_scores(similarity_column(value or "", candidates, min_ratio=rules[-1][0]), rules)
+
+def score_candidates(validated_data: Dict[str, Any], products: Sequence[Any]) -> np.ndarray:
+    """对一条待匹配数据和N个候选产品批量计算匹配分数，返回长度为N的整数数组
+
+    字段值先经过标准化（全角/半角、大小写、标点、企业后缀等），规格按解析后的含量/包装数量比较，
+    规范企业ID一致时生产企业直接得满分；候选产品优先使用预计算的标准化列和结构化列。
+    """
+    scores = np.zeros(len(products), dtype=np.int64)
+    if not products:
+        return scores
+
+    for field in FIELD_ORDER:
+        # 按列组织候选产品的标准化字段值
+        column = [field_value(product, field) for product in products]
+        scores = scores + field_scores(field, field_value(validated_data, field), column)
+    return scores
+
+def _can_score(field: str, value: Any) -> bool:
+    """字段值（由field_value得到）是否可能得分：结构化字段有文本或结构化值，其余字段文本非空"""
+    if field in STRUCTURED_FIELDS:
+        text, structured = value
+        return bool(text) or structured is not None
+    return bool(value)
+
+def top_k_candidates(validated_data: Dict[str, Any], products: Sequence[Any], threshold: int, limit: int) -> List[Tuple[int, int]]:
+    """带分数上界剪枝的Top-K选择，返回按分数降序排列的 [(候选下标, 分数), ...]
+
+    按字段权重从高到低逐列计算得分，每算完一列就用“已得分 + 剩余字段最高分”作为上界：
+    上界低于threshold，或低于当前第K高的已得分（最终分数的下界）的候选会被立即淘汰，
+    后续更昂贵的字符串相似度计算只对存活的候选进行。结果与全量打分后稳定排序取前K个一致。
+    """
+    if not products or limit <= 0:
+        return []
+
+    # 待匹配数据只标准化一次；与score_candidates的规则一致，文本为空且没有结构化值的字段不可能得分，不计入上界
+    query = {field: field_value(validated_data, field) for field in FIELD_ORDER}
+    fields = [field for field in FIELD_ORDER if _can_score(field, query[field])]
+    remaining_max = sum(FIELD_MAX_SCORES[field] for field in fields)
+    if remaining_max < threshold:
+        return []
+
+    alive = np.arange(len(products))
+    partial = np.zeros(len(products), dtype=np.int64)
+    for field in fields:
+        column = [field_value(products[i], field) for i in alive]
+        partial[alive] += field_scores(field, query[field], column)
+        remaining_max -= FIELD_MAX_SCORES[field]
+
+        upper = partial[alive] + remaining_max
+        cutoff = threshold
+        if len(alive) > limit:
+            # 已得分是最终分数的下界，第K高的下界之下的候选不可能进入Top-K
+            kth_lower_bound = np.partition(partial[alive], len(alive) - limit)[len(alive) - limit]
+            cutoff = max(cutoff, kth_lower_bound)
+        alive = alive[upper >= cutoff]
+        if len(alive) == 0:
+            return []
+
+    # 有界堆选出Top-K，分数相同时保持原始顺序
+    survivors = [(int(i), int(partial[i])) for i in alive if partial[i] >= threshold]
+    return heapq.nsmallest(limit, survivors, key=lambda item: (-item[1], item[0]))
@@ -0,0 +1,118 @@
+import re
+from functools import lru_cache
+from typing import Any, Dict, NamedTuple, Optional
+from app.utils.text_normalize import normalize_specification, normalized_value
+
+# 含量单位 -> (标准单位, 换算系数)，质量统一为mg，体积统一为ml，效价统一为iu
+STRENGTH_UNITS = {
+    "kg": ("mg", 1000000),
+    "g": ("mg", 1000),
+    "mg": ("mg", 1),
+    "mcg": ("mg", 0.001),
+    "μg": ("mg", 0.001),
+    "ug": ("mg", 0.001),
+    "l": ("ml", 1000),
+    "ml": ("ml", 1),
+    "万iu": ("iu", 10000),
+    "万u": ("iu", 10000),
+    "万单位": ("iu", 10000),
+    "iu": ("iu", 1),
+    "u": ("iu", 1),
+    "单位": ("iu", 1),
+}
+
+# 同一规格中出现多个含量（如 "2ml:10mg"）时优先使用的标准单位
+STRENGTH_UNIT_PRIORITY = ("mg", "iu", "ml")
+
+# 包装单位的同义写法：只有粒与片视为同一种（同一药品的片剂/胶囊规格常混写），
+# 丸、颗、枚等对应不同的剂型或计数方式，保持区分，"24丸"与"24片"不是同一规格
+PACK_UNIT_ALIASES = {
+    "粒": "片",
+}
+
+PACK_UNITS = ("片", "粒", "丸", "颗", "枚", "袋", "包", "支", "瓶", "贴", "板", "盒", "条", "揿", "喷")
+
+# 单位按长度降序排列，避免 "mg" 被 "g" 截断匹配
+_STRENGTH_PATTERN = re.compile(
+    r"(\d+(?:\.\d+)?)(" + "|".join(sorted(map(re.escape, STRENGTH_UNITS), key=len, reverse=True)) + r")(?![a-z])"
+)
+_PACK_UNIT_PATTERN = "|".join(PACK_UNITS)
+# 乘号后的数量，如 "*10袋"、"*2板"
+_MULTIPLIER_PATTERN = re.compile(r"\*(\d+)(" + _PACK_UNIT_PATTERN + r")?")
+# 无乘号时的数量，如 "24粒/盒"
+_COUNT_PATTERN = re.compile(r"(?<![\d.])(\d+)(" + _PACK_UNIT_PATTERN + r")")
+
+class ParsedSpecification(NamedTuple):
+    """结构化规格：含量（已换算为标准单位）、含量单位、最小包装数量、包装单位"""
+    strength: Optional[float]
+    strength_unit: Optional[str]
+    pack_count: Optional[int]
+    pack_unit: Optional[str]
+
+@lru_cache(maxsize=65536)
+def _parse(text: str) -> Optional[ParsedSpecification]:
+    strength = strength_unit = None
+    for value, unit in _STRENGTH_PATTERN.findall(text):
+        canonical_unit, factor = STRENGTH_UNITS[unit]
+        if strength_unit is None or STRENGTH_UNIT_PRIORITY.index(canonical_unit) < STRENGTH_UNIT_PRIORITY.index(strength_unit):
+            strength, strength_unit = round(float(value) * factor, 6), canonical_unit
+
+    pack_count = pack_unit = None
+    multipliers = _MULTIPLIER_PATTERN.findall(text)
+    if multipliers:
+        # "0.25g*12粒*2板" 的最小包装数量为 12*2=24粒
+        pack_count = 1
+        for count, unit in multipliers:
+            pack_count *= int(count)
+            if pack_unit is None and unit:
+                pack_unit = unit
+    else:
+        match = _COUNT_PATTERN.search(text)
+        if match:
+            pack_count, pack_unit = int(match.group(1)), match.group(2)
+    if pack_unit is not None:
+        pack_unit = PACK_UNIT_ALIASES.get(pack_unit, pack_unit)
+
+    if strength is None and pack_count is None:
+        return None
+    return ParsedSpecification(strength, strength_unit, pack_count, pack_unit)
+
+def parse_specification(value: Any) -> Optional[ParsedSpecification]:
+    """将规格文本解析为结构化规格，无法解析时返回None
+
+    例如 "0.25g×24粒" 和 "250mg*24片" 都解析为 (250.0, "mg", 24, "片")。
+    """
+    text = normalize_specification(value)
+    if not text:
+        return None
+    return _parse(text)
+
+def specification_columns(value: Any) -> Dict[str, Any]:
+    """计算写入master_products时需要同步保存的结构化规格列"""
+    parsed = parse_specification(value) or ParsedSpecification(None, None, None, None)
+    return {
+        "spec_strength": parsed.strength,
+        "spec_strength_unit": parsed.strength_unit,
+        "spec_pack_count": parsed.pack_count,
+        "spec_pack_unit": parsed.pack_unit,
+    }
+
+def parsed_specification(data: Any) -> Optional[ParsedSpecification]:
+    """获取记录（字典或ORM/快照对象）的结构化规格，优先使用写入时预计算的规格列"""
+    if not isinstance(data, dict):
+        strength_unit = getattr(data, "spec_strength_unit", None)
+        pack_count = getattr(data, "spec_pack_count", None)
+        if strength_unit is not None or pack_count is not None:
+            return ParsedSpecification(data.spec_strength, strength_unit, pack_count, data.spec_pack_unit)
+    return parse_specification(normalized_value(data, "specification"))
+
+def format_specification(parsed: ParsedSpecification) -> str:
+    """将结构化规格格式化为规范文本，如 (250.0, "mg", 24, "片") -> "250mg*24片" """
+    text = f"{parsed.strength:g}{parsed.strength_unit}" if parsed.strength is not None else ""
+    if parsed.pack_count is not None:
+        text += f"*{parsed.pack_count}{parsed.pack_unit or ''}"
+    return text
+
+def specifications_equivalent(a: Optional[ParsedSpecification], b: Optional[ParsedSpecification]) -> bool:
+    """两个规格解析结果是否表示同一规格（含量和包装数量均一致）"""
+    return a is not None and a == b
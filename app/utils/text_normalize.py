@@ -0,0 +1,86 @@
+import re
+import unicodedata
+from typing import Any, Dict
+from app.utils.approval_number import normalize_approval_number
+
+# 非文字字符（标点、括号、空白、下划线等）
+_NON_WORD_PATTERN = re.compile(r"[\W_]+", re.UNICODE)
+
+# 规格中的空白
+_SPEC_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+# 规格中表示“乘”的各种写法
+_SPEC_MULTIPLY_PATTERN = re.compile(r"[×x✕✖]")
+
+# 企业名称的常见后缀（按长度降序，标准化后匹配）
+COMPANY_SUFFIXES = (
+    "股份有限公司", "有限责任公司", "有限公司", "股份公司", "总公司", "公司",
+    "corporation", "limited", "coltd", "corp", "ltd", "inc",
+)
+
+def normalize_text(value: Any) -> str:
+    """通用文本标准化：全角转半角（NFKC）、小写、去除空白/标点/括号"""
+    if not value:
+        return ""
+    text = unicodedata.normalize("NFKC", str(value)).lower()
+    return _NON_WORD_PATTERN.sub("", text)
+
+def normalize_product_name(value: Any) -> str:
+    """标准化产品名称"""
+    return normalize_text(value)
+
+def strip_company_suffix(name: str) -> str:
+    """去除企业名称末尾的公司类型后缀，可重复去除（如 “xx有限公司 Co.,Ltd”）"""
+    stripped = True
+    while stripped:
+        stripped = False
+        for suffix in COMPANY_SUFFIXES:
+            if name.endswith(suffix) and len(name) > len(suffix):
+                name = name[:-len(suffix)]
+                stripped = True
+                break
+    return name
+
+def normalize_manufacturer(value: Any) -> str:
+    """标准化生产企业/上市许可持有人名称：通用标准化后去除公司类型后缀"""
+    return strip_company_suffix(normalize_text(value))
+
+def normalize_specification(value: Any) -> str:
+    """标准化规格：全角转半角、小写、去除空白，统一乘号写法"""
+    if not value:
+        return ""
+    text = unicodedata.normalize("NFKC", str(value)).lower()
+    text = _SPEC_WHITESPACE_PATTERN.sub("", text)
+    return _SPEC_MULTIPLY_PATTERN.sub("*", text)
+
+# 主数据字段 -> (标准化列名, 标准化函数)
+NORMALIZED_COLUMNS = {
+    "product_name": ("product_name_norm", normalize_product_name),
+    "manufacturer": ("manufacturer_norm", normalize_manufacturer),
+    "specification": ("specification_norm", normalize_specification),
+    "approval_number": ("approval_number_norm", normalize_approval_number),
+}
+
+def normalize_field(field: str, value: Any) -> str:
+    """按字段类型标准化，未定义标准化规则的字段使用通用文本标准化"""
+    rule = NORMALIZED_COLUMNS.get(field)
+    if rule is None:
+        return normalize_text(value)
+    return rule[1](value)
+
+def normalized_columns(data: Dict[str, Any]) -> Dict[str, Any]:
+    """计算写入master_products时需要同步保存的标准化列"""
+    return {
+        column: normalize(data.get(field)) or None
+        for field, (column, normalize) in NORMALIZED_COLUMNS.items()
+    }
+
+def normalized_value(data: Any, field: str) -> str:
+    """获取记录（字典或ORM/快照对象）某字段的标准化值，优先使用写入时预计算的标准化列"""
+    rule = NORMALIZED_COLUMNS.get(field)
+    if rule is not None:
+        precomputed = data.get(rule[0]) if isinstance(data, dict) else getattr(data, rule[0], None)
+        if precomputed is not None:
+            return precomputed
+    value = data.get(field) if isinstance(data, dict) else getattr(data, field, None)
+    return normalize_field(field, value)
@@ -0,0 +1,45 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Tuple
+from app.utils.logging_config import CACHE_REQUESTS, CACHE_ENTRIES
+
+class TTLCache:
+    """线程安全的有界LRU缓存，条目在写入ttl秒后过期，命中/未命中计入Prometheus指标"""
+
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """返回 (是否命中, 值)，过期条目视为未命中并删除"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                CACHE_REQUESTS.labels(cache=self.name, result="hit").inc()
+                return True, entry[1]
+            if entry is not None:
+                del self._entries[key]
+                CACHE_ENTRIES.labels(cache=self.name).set(len(self._entries))
+        CACHE_REQUESTS.labels(cache=self.name, result="miss").inc()
+        return False, None
+
+    def set(self, key: Hashable, value: Any):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            CACHE_ENTRIES.labels(cache=self.name).set(len(self._entries))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            CACHE_ENTRIES.labels(cache=self.name).set(0)
@@ -23,6 +23,8 @@ const API_BASE_URL = import.meta.env.VITE_API_BASE_URL || 'http://localhost:8000
 const socket = io(API_BASE_URL); // Socket.IO也需要连接到后端
 
 const initialNodes: Node[] = [
+    { id: 'nmpa_fast_path', position: { x: 0, y: -50 }, data: { label: 'NMPA快速通道' } },
+    { id: 'classify_extract', position: { x: 350, y: 25 }, data: { label: '分类提取(融合)' } },
     { id: 'classifier', position: { x: 0, y: 100 }, data: { label: '商品分类' } },
     { id: 'drug_extractor', position: { x: -350, y: 250 }, data: { label: '药品提取' } },
     { id: 'device_extractor', position: { x: -200, y: 250 }, data: { label: '器械提取' } },
@@ -38,6 +40,11 @@ const initialNodes: Node[] = [
 ];
 
 const initialEdges: Edge[] = [
+    { id: 'e-fastpath-classifier', source: 'nmpa_fast_path', target: 'classifier', label: '未命中', animated: true },
+    { id: 'e-fastpath-matcher', source: 'nmpa_fast_path', target: 'matcher', label: 'NMPA命中', animated: true },
+    { id: 'e-fastpath-fused', source: 'nmpa_fast_path', target: 'classify_extract', label: '融合模式', animated: true },
+    { id: 'e-fused-validator', source: 'classify_extract', target: 'validator', label: '解析成功', animated: true },
+    { id: 'e-fused-classifier', source: 'classify_extract', target: 'classifier', label: '回退', animated: true },
     { id: 'e-classifier-drug', source: 'classifier', target: 'drug_extractor', animated: true },
     { id: 'e-classifier-device', source: 'classifier', target: 'device_extractor', animated: true },
     { id: 'e-classifier-cosmeceutical', source: 'classifier', target: 'cosmeceutical_extractor', animated: true },
@@ -66,6 +73,14 @@ const nodeStyles = {
   pending: { backgroundColor: '#fff3cd', color: '#856404' },
 };
 
+// 审核原因可能是文本，也可能是结构化原因列表（如批准文号预检给出的 {type, message}）
+const formatReviewReason = (reason: any): string => {
+  if (Array.isArray(reason)) {
+    return reason.map((item) => (typeof item === 'string' ? item : item?.message ?? JSON.stringify(item))).join('；');
+  }
+  return reason == null ? '' : String(reason);
+};
+
 function App() {
     const [nodes, setNodes, onNodesChange] = useNodesState(initialNodes);
     const [edges, setEdges, onEdgesChange] = useEdgesState(initialEdges);
@@ -223,7 +238,7 @@ function App() {
                                     <Card className="mb-3 border-warning">
                                         <Card.Body>
                                             <Card.Title className="text-warning">人工审核 (ID: {reviewItem.review_id})</Card.Title>
-                                            <p><strong>原因:</strong> {reviewItem.review_reason}</p>
+                                            <p><strong>原因:</strong> {formatReviewReason(reviewItem.review_reason)}</p>
                                             <Button variant="success" className="me-2" onClick={() => handleReviewSubmit(true)}>批准</Button>
                                             <Button variant="danger" onClick={() => handleReviewSubmit(false)}>拒绝</Button>
                                         </Card.Body>
@@ -4,8 +4,11 @@ import os
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from app.api import products
-from app.database import init_db
+from app.database import init_db, SessionLocal
+from app.services.approval_number_filter import load_approval_number_filter
+from app.services.catalog_snapshot import load_catalog
 from app.socket import sio_app
+from app.utils.llm_utils import reset_llm_clients
 from app.utils.logging_config import get_logger, REQUEST_COUNT, REQUEST_DURATION, ACTIVE_CONNECTIONS, ERROR_COUNT
 
 # 初始化日志记录器
@@ -25,11 +28,21 @@ app = FastAPI()
 @app.on_event("startup")
 def on_startup():
     init_db()
+    # 加载进程内的主数据快照，匹配和融合优先从快照读取
+    db = SessionLocal()
+    try:
+        load_catalog(db)
+        # 构建已登记批准文号的布隆过滤器，验证时快速排除未登记的批准文号
+        load_approval_number_filter(db)
+    finally:
+        db.close()
     # 记录应用启动日志
     logger.info("Application startup", extra={"event": "startup"})
 
 @app.on_event("shutdown")
 def on_shutdown():
+    # 关闭LLM客户端共用的HTTP连接池
+    reset_llm_clients()
     # 记录应用关闭日志
     logger.info("Application shutdown", extra={"event": "shutdown"})
 
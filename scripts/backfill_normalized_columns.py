@@ -0,0 +1,64 @@
+import sys
+import os
+import argparse
+import time
+
+# 将项目根目录添加到Python路径
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.database import SessionLocal, init_db
+from app.models.schema import MasterProduct
+from app.services.ngram_index import rebuild_ngram_index
+from app.utils.spec_parser import specification_columns
+from app.utils.text_normalize import NORMALIZED_COLUMNS, normalized_columns
+
+def backfill_normalized_columns(session, batch_size: int = 5000) -> int:
+    """按主键分批计算并回填master_products的标准化列和结构化规格列，返回处理的产品数量"""
+    processed = 0
+    last_spu_id = 0
+    while True:
+        products = session.query(
+            MasterProduct.spu_id,
+            *[getattr(MasterProduct, field) for field in NORMALIZED_COLUMNS]
+        ).filter(MasterProduct.spu_id > last_spu_id).order_by(MasterProduct.spu_id).limit(batch_size).all()
+        if not products:
+            break
+
+        mappings = [
+            {
+                "spu_id": product.spu_id,
+                **normalized_columns(product._asdict()),
+                **specification_columns(product.specification)
+            }
+            for product in products
+        ]
+        session.bulk_update_mappings(MasterProduct, mappings)
+        session.commit()
+
+        processed += len(products)
+        last_spu_id = products[-1].spu_id
+        print(f"标准化列回填进度: 已处理 {processed} 个产品")
+    return processed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="回填master_products的标准化匹配列，并重建n-gram倒排索引")
+    parser.add_argument("--batch-size", type=int, default=5000, help="每批处理的产品数量")
+    parser.add_argument("--skip-ngram", action="store_true", help="只回填标准化列，不重建n-gram倒排索引")
+    args = parser.parse_args()
+
+    init_db() # 为已有数据库补充标准化列及其索引
+
+    start_time = time.time()
+    session = SessionLocal()
+    try:
+        processed = backfill_normalized_columns(session, batch_size=args.batch_size)
+        print(f"标准化列回填完成，共处理 {processed} 个产品，耗时 {time.time() - start_time:.1f} 秒。")
+        if not args.skip_ngram:
+            # n-gram索引基于标准化后的字段值生成，需要随之重建
+            indexed = rebuild_ngram_index(session)
+            print(f"n-gram倒排索引重建完成，共索引 {indexed} 个产品，耗时 {time.time() - start_time:.1f} 秒。")
+    except Exception as e:
+        session.rollback()
+        print(f"标准化列回填失败: {e}")
+    finally:
+        session.close()
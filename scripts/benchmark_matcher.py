@@ -0,0 +1,240 @@
+import sys
+import os
+import argparse
+import random
+import resource
+import statistics
+import time
+
+# 将项目根目录添加到Python路径
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# 合成目录的规模档位
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+DRUG_ROOTS = [
+    "蒙脱石", "布洛芬", "阿莫西林", "头孢克肟", "对乙酰氨基酚", "奥美拉唑", "氯雷他定", "阿奇霉素", "二甲双胍",
+    "硝苯地平", "阿托伐他汀", "氨溴索", "复方甘草", "板蓝根", "连花清瘟", "藿香正气", "六味地黄", "银黄",
+    "维生素C", "葡萄糖酸钙", "左氧氟沙星", "甲硝唑", "盐酸小檗碱", "双氯芬酸钠", "罗红霉素", "感冒灵",
+]
+DOSAGE_FORMS = ["散", "片", "胶囊", "缓释胶囊", "颗粒", "口服液", "注射液", "软膏", "滴眼液", "分散片", "肠溶片", "丸"]
+PROVINCES = ["湖北", "广东", "江苏", "浙江", "山东", "四川", "河北", "北京", "上海", "天津", "吉林", "云南", "江西"]
+COMPANY_WORDS = ["午时", "白云山", "恒瑞", "华润", "同仁堂", "修正", "石药", "扬子江", "齐鲁", "康恩贝", "仁和", "太极", "以岭", "步长", "九芝堂"]
+COMPANY_KINDS = ["药业", "制药", "医药", "生物制药", "制药厂"]
+COMPANY_SUFFIXES = ["股份有限公司", "有限公司", "有限责任公司", "集团有限公司"]
+STRENGTHS = [("0.1", "g"), ("0.25", "g"), ("0.3", "g"), ("3", "g"), ("10", "mg"), ("250", "mg"), ("5", "ml"), ("10", "ml")]
+PACK_UNITS = ["片", "粒", "袋", "支", "丸"]
+CONTAINERS = ["盒", "瓶", "板"]
+APPROVAL_LETTERS = ["H", "Z", "S"]
+
+def generate_product(rng: random.Random, serial: int) -> dict:
+    """生成一条合成但贴近真实分布的药品主数据"""
+    name = rng.choice(DRUG_ROOTS) + rng.choice(DOSAGE_FORMS)
+    manufacturer = rng.choice(PROVINCES) + rng.choice(COMPANY_WORDS) + rng.choice(COMPANY_KINDS) + rng.choice(COMPANY_SUFFIXES)
+    strength, unit = rng.choice(STRENGTHS)
+    specification = f"{strength}{unit}*{rng.choice([6, 10, 12, 20, 24, 36])}{rng.choice(PACK_UNITS)}/{rng.choice(CONTAINERS)}"
+    approval_number = f"国药准字{rng.choice(APPROVAL_LETTERS)}{20000000 + serial:08d}"
+    return {
+        "product_type": "药品",
+        "product_name": name,
+        "brand": rng.choice(COMPANY_WORDS) if rng.random() < 0.5 else None,
+        "manufacturer": manufacturer,
+        "approval_number": approval_number,
+        "specification": specification,
+        "dosage_form": name[-2:],
+    }
+
+def perturb(rng: random.Random, product: dict) -> dict:
+    """模拟供应商数据中的常见噪声：缺失/变形的批准文号、全角字符、公司后缀差异、错别字等"""
+    record = {key: value for key, value in product.items() if key not in ("spu_id", "product_type")}
+    choice = rng.random()
+    if choice < 0.25:
+        record["approval_number"] = ""
+    elif choice < 0.4:
+        # 全角字符和空白
+        record["approval_number"] = record["approval_number"].replace("H", "Ｈ").replace("Z", "Ｚ")[:4] + " " + record["approval_number"][4:]
+    elif choice < 0.5:
+        # 截断的批准文号（前缀关系）
+        record["approval_number"] = record["approval_number"][:-2]
+    if rng.random() < 0.4:
+        for suffix in COMPANY_SUFFIXES:
+            if record["manufacturer"].endswith(suffix):
+                record["manufacturer"] = record["manufacturer"][:-len(suffix)] + rng.choice(COMPANY_SUFFIXES)
+                break
+    if rng.random() < 0.2 and len(record["product_name"]) > 3:
+        i = rng.randrange(len(record["product_name"]))
+        record["product_name"] = record["product_name"][:i] + record["product_name"][i + 1:]
+    if rng.random() < 0.3:
+        record["specification"] = record["specification"].replace("*", "×")
+    return record
+
+def seed_benchmark_manufacturers(session) -> dict:
+    """登记合成数据可能出现的全部生产企业，返回 标准化名称 -> 规范企业ID"""
+    from itertools import product as combinations
+    from app.models.schema import ManufacturerAlias
+    from app.services.manufacturer_resolver import seed_manufacturers
+
+    seed_manufacturers(session, (
+        ("".join(parts),) for parts in combinations(PROVINCES, COMPANY_WORDS, COMPANY_KINDS, COMPANY_SUFFIXES)
+    ))
+    return dict(session.query(ManufacturerAlias.alias_norm, ManufacturerAlias.manufacturer_id).all())
+
+def catalog_row(product: dict, manufacturer_ids: dict) -> dict:
+    """按save_product的方式补全写入列：标准化批准文号、标准化匹配列、结构化规格列和规范企业ID"""
+    from app.utils.approval_number import normalize_approval_number
+    from app.utils.spec_parser import specification_columns
+    from app.utils.text_normalize import normalize_manufacturer, normalized_columns
+
+    return {
+        **product,
+        "approval_number": normalize_approval_number(product.get("approval_number")) or None,
+        "manufacturer_id": manufacturer_ids.get(normalize_manufacturer(product.get("manufacturer"))),
+        **normalized_columns(product),
+        **specification_columns(product.get("specification")),
+    }
+
+def build_catalog(size: int, db_path: str, seed: int):
+    """生成合成主数据目录并写入SQLite（写入列与save_product一致）"""
+    from app.database import SessionLocal, init_db
+    from app.models.schema import MasterProduct
+
+    init_db()
+    rng = random.Random(seed)
+    session = SessionLocal()
+    try:
+        start = time.time()
+        manufacturer_ids = seed_benchmark_manufacturers(session)
+        batch = []
+        for serial in range(size):
+            batch.append(catalog_row(generate_product(rng, serial), manufacturer_ids))
+            if len(batch) >= 10000:
+                session.bulk_insert_mappings(MasterProduct, batch)
+                session.commit()
+                batch = []
+        if batch:
+            session.bulk_insert_mappings(MasterProduct, batch)
+            session.commit()
+        print(f"  已生成 {size} 条合成商品（{len(manufacturer_ids)} 个生产企业别名），耗时 {time.time() - start:.1f} 秒")
+    finally:
+        session.close()
+
+def rebuild_index():
+    """计时前重建n-gram倒排索引，保证索引与目录数据及当前分词规则一致"""
+    from app.database import SessionLocal
+    from app.services.ngram_index import rebuild_ngram_index
+
+    session = SessionLocal()
+    try:
+        start = time.time()
+        rebuild_ngram_index(session, batch_size=20000)
+        print(f"  n-gram倒排索引构建完成，耗时 {time.time() - start:.1f} 秒")
+    finally:
+        session.close()
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(int(round(q / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+def run_queries(size: int, queries: int, top_k: int, seed: int, use_snapshot: bool) -> dict:
+    """对合成目录执行匹配查询，统计延迟、吞吐、内存峰值和召回率"""
+    from app.database import SessionLocal
+    from app.models.schema import MasterProduct
+    from app.agents.enhanced_matcher_agent import find_matching_products, match_product
+    from app.services.catalog_snapshot import load_catalog
+
+    rng = random.Random(seed + 1)
+    session = SessionLocal()
+    try:
+        if use_snapshot:
+            load_catalog(session)
+        sample_ids = rng.sample(range(1, size + 1), min(queries, size))
+        truth = {}
+        for spu_id in sample_ids:
+            product = session.get(MasterProduct, spu_id)
+            truth[spu_id] = {column.name: getattr(product, column.name) for column in MasterProduct.__table__.columns}
+    finally:
+        session.close()
+
+    records = [(spu_id, perturb(rng, truth[spu_id])) for spu_id in sample_ids]
+    results = {}
+    for name, run in (
+        ("find_matching_products", lambda record: find_matching_products(record, limit=top_k)),
+        ("match_product", lambda record: match_product({"validated_data": record})),
+    ):
+        latencies = []
+        hits = 0
+        start = time.perf_counter()
+        for spu_id, record in records:
+            t0 = time.perf_counter()
+            output = run(record)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            if name == "find_matching_products":
+                hits += any(candidate["product"].spu_id == spu_id for candidate in output[:top_k])
+            else:
+                match_result = output["match_result"]
+                hits += match_result["spu_id"] == spu_id or any(
+                    candidate["spu_id"] == spu_id for candidate in match_result["candidates"]
+                )
+        elapsed = time.perf_counter() - start
+        results[name] = {
+            "p50_ms": percentile(latencies, 50),
+            "p95_ms": percentile(latencies, 95),
+            "p99_ms": percentile(latencies, 99),
+            "mean_ms": statistics.mean(latencies),
+            "throughput_qps": len(records) / elapsed if elapsed else 0.0,
+            "recall": hits / len(records) if records else 0.0,
+        }
+    return results
+
+def peak_rss_mb() -> float:
+    # Linux下ru_maxrss单位为KB，macOS下为字节
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+def run_single_size(args):
+    """在独立进程中运行单个规模档位（DATABASE_URL需在导入app模块前设置）"""
+    import logging
+
+    size, db_path, queries, top_k, seed, use_snapshot, rebuild = args
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    if rebuild or not os.path.exists(db_path):
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        build_catalog(size, db_path, seed)
+    rebuild_index()
+    # 屏蔽逐条查询的INFO日志，避免干扰计时（需在app模块导入并完成日志配置之后设置）
+    logging.getLogger().setLevel(logging.WARNING)
+    results = run_queries(size, queries, top_k, seed, use_snapshot)
+    return results, peak_rss_mb()
+
+if __name__ == "__main__":
+    from multiprocessing import get_context
+
+    parser = argparse.ArgumentParser(description="匹配器基准测试：在合成主数据目录上测量延迟、吞吐、内存和召回率")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="合成目录规模，默认 10k/100k/1M")
+    parser.add_argument("--queries", type=int, default=500, help="每个规模档位的查询数量")
+    parser.add_argument("--top-k", type=int, default=10, help="计算召回率时考察的候选数量")
+    parser.add_argument("--seed", type=int, default=20240001, help="随机种子")
+    parser.add_argument("--db-dir", default=os.path.join("data", "benchmark"), help="合成SQLite数据库的存放目录")
+    parser.add_argument("--snapshot", action="store_true", help="查询前加载进程内主数据快照")
+    parser.add_argument("--rebuild", action="store_true", help="忽略已有的合成数据库，重新生成")
+    args = parser.parse_args()
+
+    os.makedirs(args.db_dir, exist_ok=True)
+    # 每个规模档位使用独立进程，避免数据库连接和内存峰值相互影响
+    context = get_context("spawn")
+    for size in args.sizes:
+        db_path = os.path.abspath(os.path.join(args.db_dir, f"catalog_{size}.db"))
+        print(f"规模 {size}: {db_path}")
+        with context.Pool(1) as pool:
+            results, rss = pool.apply(run_single_size, ((size, db_path, args.queries, args.top_k, args.seed, args.snapshot, args.rebuild),))
+        for name, metrics in results.items():
+            print(
+                f"  {name:<24} p50={metrics['p50_ms']:.2f}ms p95={metrics['p95_ms']:.2f}ms "
+                f"p99={metrics['p99_ms']:.2f}ms 吞吐={metrics['throughput_qps']:.1f}/s "
+                f"top-{args.top_k}召回率={metrics['recall']:.1%}"
+            )
+        print(f"  峰值RSS: {rss:.1f} MB")
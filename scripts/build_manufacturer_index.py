@@ -0,0 +1,42 @@
+import sys
+import os
+import time
+
+# 将项目根目录添加到Python路径
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.database import SessionLocal, init_db
+from app.models.nmpa_data import NMPADomesticDrug, NMPAImportedDrug
+from app.models.schema import MasterProduct
+from app.services.manufacturer_resolver import assign_manufacturer_ids, seed_manufacturers
+
+def manufacturer_name_groups(session):
+    """从NMPA数据和主数据中收集生产企业名称，每组名称指向同一企业"""
+    for manufacturer, mah in session.query(NMPADomesticDrug.manufacturer, NMPADomesticDrug.mah).distinct():
+        yield (manufacturer,)
+        yield (mah,)
+    # 进口药品的中文名和英文名登记为同一企业的别名
+    for company_cn, company_en, mah_cn, mah_en in session.query(
+        NMPAImportedDrug.company_cn, NMPAImportedDrug.company_en, NMPAImportedDrug.mah_cn, NMPAImportedDrug.mah_en
+    ).distinct():
+        yield (company_cn, company_en)
+        yield (mah_cn, mah_en)
+    for manufacturer, mah in session.query(MasterProduct.manufacturer, MasterProduct.mah).distinct():
+        yield (manufacturer,)
+        yield (mah,)
+
+if __name__ == "__main__":
+    init_db() # 确保企业表和master_products.manufacturer_id列已创建
+
+    start_time = time.time()
+    session = SessionLocal()
+    try:
+        created = seed_manufacturers(session, list(manufacturer_name_groups(session)))
+        print(f"规范企业登记完成，新建 {created} 个企业，耗时 {time.time() - start_time:.1f} 秒。")
+        assigned = assign_manufacturer_ids(session)
+        print(f"主数据规范企业ID回填完成，{assigned} 个产品解析出企业，耗时 {time.time() - start_time:.1f} 秒。")
+    except Exception as e:
+        session.rollback()
+        print(f"规范企业表构建失败: {e}")
+    finally:
+        session.close()
@@ -0,0 +1,23 @@
+import sys
+import os
+import time
+
+# 将项目根目录添加到Python路径
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.database import SessionLocal, init_db
+from app.services.ngram_index import rebuild_ngram_index
+
+if __name__ == "__main__":
+    init_db() # 确保索引表已创建
+
+    start_time = time.time()
+    session = SessionLocal()
+    try:
+        indexed = rebuild_ngram_index(session)
+        print(f"n-gram倒排索引重建完成，共索引 {indexed} 个产品，耗时 {time.time() - start_time:.1f} 秒。")
+    except Exception as e:
+        session.rollback()
+        print(f"n-gram倒排索引重建失败: {e}")
+    finally:
+        session.close()
@@ -0,0 +1,40 @@
+import sys
+import os
+import argparse
+import time
+from datetime import datetime
+
+# 将项目根目录添加到Python路径
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.database import SessionLocal, init_db
+from app.services.duplicate_detection import (
+    DEFAULT_BANDS, DEFAULT_NUM_PERM, DEFAULT_THRESHOLD, find_duplicate_clusters, save_duplicate_clusters
+)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="离线查找主数据中的疑似重复商品簇（MinHash + LSH），结果写入duplicate_clusters表")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="计算MinHash签名的进程数")
+    parser.add_argument("--num-perm", type=int, default=DEFAULT_NUM_PERM, help="MinHash签名长度")
+    parser.add_argument("--bands", type=int, default=DEFAULT_BANDS, help="LSH分段数，需整除签名长度")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="判定为重复的最低估计相似度")
+    parser.add_argument("--batch-size", type=int, default=20000, help="每批读取并分发给子进程的商品数量")
+    args = parser.parse_args()
+
+    init_db() # 确保duplicate_clusters表已创建
+
+    start_time = time.time()
+    run_id = datetime.now().strftime("%Y%m%d%H%M%S")
+    session = SessionLocal()
+    try:
+        clusters = find_duplicate_clusters(
+            session, num_perm=args.num_perm, bands=args.bands, threshold=args.threshold,
+            workers=args.workers, batch_size=args.batch_size
+        )
+        saved = save_duplicate_clusters(session, clusters, run_id)
+        print(f"去重任务 {run_id} 完成，发现 {len(clusters)} 个疑似重复簇，写入 {saved} 个，耗时 {time.time() - start_time:.1f} 秒。")
+    except Exception as e:
+        session.rollback()
+        print(f"去重任务失败: {e}")
+    finally:
+        session.close()
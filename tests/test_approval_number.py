@@ -0,0 +1,48 @@
+import unittest
+from app.utils.approval_number import normalize_approval_number, split_approval_numbers, ApprovalNumberIndex
+
+class TestNormalizeApprovalNumber(unittest.TestCase):
+    def test_full_width_whitespace_and_case(self):
+        self.assertEqual(normalize_approval_number("国药准字 Ｈ２０２４０００１"), "国药准字H20240001")
+        self.assertEqual(normalize_approval_number("国妆特字g2020　001"), "国妆特字G2020001")
+        self.assertEqual(normalize_approval_number(" 械注准20153140001\n"), "械注准20153140001")
+        self.assertEqual(normalize_approval_number(None), "")
+
+    def test_split(self):
+        self.assertEqual(split_approval_numbers("国药准字H20240001；国药准字 h20240002; 国药准字H20240001;"),
+                         ["国药准字H20240001", "国药准字H20240002"])
+        self.assertEqual(split_approval_numbers(""), [])
+
+class TestApprovalNumberIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = ApprovalNumberIndex([
+            ("国药准字H20240001", 1),
+            ("国药准字Ｈ20240001", 2),
+            ("国药准字H2024", 3),
+            ("国药准字H202400015", 4),
+            ("国药准字Z20240001", 5),
+        ])
+
+    def test_exact(self):
+        self.assertEqual(self.index.exact("国药准字 h20240001"), {1, 2})
+        self.assertEqual(self.index.exact("国药准字H20249999"), set())
+
+    def test_prefix_queries(self):
+        self.assertEqual(self.index.with_prefix("国药准字H20240001"), {4})
+        self.assertEqual(self.index.prefixes_of("国药准字H20240001"), {3})
+        # 过短的前缀不参与查询
+        self.assertEqual(self.index.with_prefix("国药准字"), set())
+
+    def test_related(self):
+        self.assertEqual(self.index.related("国药准字H20240001"), {1: "EXACT", 2: "EXACT", 3: "PREFIX", 4: "PREFIX"})
+
+    def test_add_and_remove(self):
+        self.index.add("国药准字H20240002", 6)
+        self.assertEqual(self.index.with_prefix("国药准字H2024000"), {1, 2, 6, 4})
+        self.index.remove("国药准字H20240002", 6)
+        self.index.remove("国药准字H2024", 3)
+        self.assertEqual(self.index.exact("国药准字H20240002"), set())
+        self.assertEqual(self.index.prefixes_of("国药准字H20240001"), set())
+
+if __name__ == '__main__':
+    unittest.main()
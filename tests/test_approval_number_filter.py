@@ -0,0 +1,121 @@
+import unittest
+from unittest.mock import patch
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.agents import validator_agent
+from app.models.schema import Base, MasterProduct
+from app.models.nmpa_data import NMPADomesticDrug, NMPAImportedDrug
+from app.services.approval_number_filter import ApprovalNumberFilter
+from app.tools import nmpa_db_tools
+from app.tools.nmpa_search import bump_nmpa_data_version, rebuild_domestic_approval_numbers
+from app.utils.bloom_filter import BloomFilter
+
+class TestBloomFilter(unittest.TestCase):
+    def test_no_false_negatives_and_bounded_false_positives(self):
+        bloom = BloomFilter(capacity=5000, error_rate=0.01)
+        members = [f"国药准字H{20000000 + i}" for i in range(5000)]
+        bloom.update(members)
+        self.assertEqual(len(bloom), 5000)
+        self.assertTrue(all(member in bloom for member in members))
+        false_positives = sum(f"国药准字Z{30000000 + i}" in bloom for i in range(5000))
+        self.assertLess(false_positives, 5000 * 0.03)
+
+class TestApprovalNumberPrecheck(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(bind=self.engine)
+        self.session_factory = sessionmaker(bind=self.engine)
+        self.db = self.session_factory()
+        self.db.add_all([
+            NMPADomesticDrug(drug_code="86900001000001", approval_numbers="国药准字H20240001;国药准字H20240002",
+                             product_name="蒙脱石散", specification="3g", manufacturer="湖北午时药业股份有限公司"),
+            NMPAImportedDrug(drug_code="86978000000001", registration_number="H20170001", product_name="蒙脱石散"),
+            MasterProduct(product_type="药品", product_name="自有药品", manufacturer="某药业", specification="10mg",
+                          approval_number="国药准字Z20250001", approval_number_norm="国药准字Z20250001"),
+        ])
+        self.db.commit()
+        rebuild_domestic_approval_numbers(self.db)
+        nmpa_db_tools.invalidate_nmpa_cache()
+        self.filter = ApprovalNumberFilter()
+        self.filter.load(self.db)
+
+    def tearDown(self):
+        self.db.close()
+
+    def _precheck(self, approval_number):
+        with patch('app.agents.validator_agent.get_approval_number_filter', return_value=self.filter), \
+                patch('app.agents.validator_agent.SessionLocal', self.session_factory), \
+                patch('app.tools.nmpa_db_tools.SessionLocal', self.session_factory):
+            return validator_agent.precheck_approval_number({"approval_number": approval_number})
+
+    def test_empty_nmpa_data_skips_precheck(self):
+        # 首次导入NMPA数据之前，过滤器不加载，格式正确的新批准文号不会被判为未登记
+        engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(bind=engine)
+        session_factory = sessionmaker(bind=engine)
+        db = session_factory()
+        try:
+            empty_filter = ApprovalNumberFilter()
+            empty_filter.load(db)
+            self.assertFalse(empty_filter.loaded)
+            with patch('app.services.approval_number_filter._filter', empty_filter), \
+                    patch('app.agents.validator_agent.SessionLocal', session_factory), \
+                    patch('app.tools.nmpa_db_tools.SessionLocal', session_factory):
+                self.assertIsNone(validator_agent.precheck_approval_number({"approval_number": "国药准字H20990002"}))
+        finally:
+            db.close()
+
+    def test_filter_contents(self):
+        for approval_number in ["国药准字H20240002", "H20170001", "国药准字 z20250001"]:
+            self.assertTrue(self.filter.might_exist(approval_number))
+        self.filter.add("国药准字H20990001")
+        self.assertTrue(self.filter.might_exist("国药准字H20990001"))
+
+    def test_precheck_results(self):
+        self.assertIsNone(self._precheck("国药准字H20240001"))
+        self.assertIsNone(self._precheck("械注准20243010001")) # 非药品批准文号不做预检
+        self.assertEqual(self._precheck("国药准字H2024")[0]["type"], "INVALID_APPROVAL_NUMBER")
+        reasons = self._precheck("国药准字h20999999")
+        self.assertEqual(reasons, [{
+            "type": "APPROVAL_NUMBER_NOT_REGISTERED",
+            "message": "批准文号未在NMPA数据和主数据中登记: 国药准字H20999999",
+            "approval_number": "国药准字H20999999",
+        }])
+
+    def test_filter_negative_confirmed_against_database(self):
+        # 过滤器构建之后写入的主数据商品不会被误判为未登记
+        self.db.add(MasterProduct(product_type="药品", product_name="新药品", manufacturer="某药业", specification="5mg",
+                                  approval_number="国药准字H20260001", approval_number_norm="国药准字H20260001"))
+        self.db.commit()
+        self.assertFalse(self.filter.might_exist("国药准字H20260001"))
+        self.assertIsNone(self._precheck("国药准字H20260001"))
+
+    def test_rebuilt_after_nmpa_import(self):
+        # 导入脚本写入新的NMPA数据并登记新版本后，过滤器按版本重新构建
+        self.db.add(NMPADomesticDrug(drug_code="86900009000001", approval_numbers="国药准字H20270001",
+                                     product_name="新导入药品", specification="5mg", manufacturer="某药业"))
+        self.db.commit()
+        rebuild_domestic_approval_numbers(self.db)
+        self.assertFalse(self.filter.might_exist("国药准字H20270001"))
+        self.filter.refresh(self.db) # 检查间隔内不比对版本
+        self.assertFalse(self.filter.might_exist("国药准字H20270001"))
+
+        bump_nmpa_data_version(self.db, "test")
+        with patch('app.services.approval_number_filter.NMPA_VERSION_CHECK_INTERVAL', 0):
+            self.assertTrue(self.filter.needs_version_check())
+            self.filter.refresh(self.db)
+        self.assertTrue(self.filter.might_exist("国药准字H20270001"))
+
+    def test_validator_skips_llm_for_unregistered_number(self):
+        with patch('app.agents.validator_agent.get_llm_instance', side_effect=AssertionError("不应调用LLM")):
+            with patch('app.agents.validator_agent.get_approval_number_filter', return_value=self.filter), \
+                    patch('app.agents.validator_agent.SessionLocal', self.session_factory), \
+                    patch('app.tools.nmpa_db_tools.SessionLocal', self.session_factory):
+                result = validator_agent.validate_data({
+                    "extracted_data": {"approval_number": "国药准字H20999999", "product_name": "不存在的药品"},
+                    "product_type": "药品",
+                })
+        self.assertEqual(result["review_reason"][0]["type"], "APPROVAL_NUMBER_NOT_REGISTERED")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import unittest
+from unittest.mock import patch
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.models.schema import Base, MasterProduct
+from app.services.catalog_snapshot import CatalogSnapshot, get_catalog
+from app.agents.enhanced_matcher_agent import find_matching_products
+
+class TestCatalogSnapshot(unittest.TestCase):
+    def setUp(self):
+        engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(bind=engine)
+        self.session_factory = sessionmaker(bind=engine)
+        self.db = self.session_factory()
+        self.db.add(MasterProduct(
+            product_type="药品", product_name="蒙脱石散", manufacturer="湖北午时药业股份有限公司",
+            approval_number="国药准字H20240001", specification="3g*10袋/盒", barcode="6901234567890"
+        ))
+        self.db.commit()
+        self.catalog = CatalogSnapshot()
+        self.catalog.load(self.db)
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_load_builds_secondary_indexes(self):
+        self.assertEqual(len(self.catalog), 1)
+        row = self.catalog.find_by_approval_number("国药准字 Ｈ20240001")[0]
+        self.assertEqual(row.product_name, "蒙脱石散")
+        self.assertEqual(self.catalog.find_by_barcode("6901234567890")[0].spu_id, row.spu_id)
+
+    def test_refresh_picks_up_inserts_and_updates(self):
+        version = self.catalog.version
+        self.db.add(MasterProduct(
+            product_type="药品", product_name="布洛芬缓释胶囊", manufacturer="中美天津史克制药有限公司",
+            approval_number="国药准字H10900089", specification="0.3g*20粒"
+        ))
+        product = self.db.query(MasterProduct).filter_by(product_name="蒙脱石散").one()
+        product.approval_number = "国药准字H20240002"
+        product.updated_at = datetime.now() + timedelta(seconds=1)
+        self.db.commit()
+
+        self.assertEqual(self.catalog.refresh(self.db), 2)
+        self.assertEqual(len(self.catalog), 2)
+        self.assertGreater(self.catalog.version, version)
+        self.assertEqual(self.catalog.find_by_approval_number("国药准字H20240001"), [])
+        self.assertEqual(self.catalog.find_by_approval_number("国药准字H20240002")[0].spu_id, product.spu_id)
+        # 没有新的变更时刷新不产生变化
+        self.assertEqual(self.catalog.refresh(self.db), 0)
+
+    def test_refresh_removes_deleted_products(self):
+        self.db.add(MasterProduct(
+            product_type="药品", product_name="布洛芬缓释胶囊", manufacturer="中美天津史克制药有限公司",
+            approval_number="国药准字H10900089", specification="0.3g*20粒", barcode="6900000000001"
+        ))
+        self.db.commit()
+        self.catalog.refresh(self.db)
+        self.assertEqual(len(self.catalog), 2)
+
+        # 其他进程删除商品的同时写入新商品
+        self.db.query(MasterProduct).filter_by(product_name="蒙脱石散").delete()
+        self.db.add(MasterProduct(product_type="药品", product_name="阿莫西林胶囊", manufacturer="某药业", specification="0.25g*24粒"))
+        self.db.commit()
+        self.assertEqual(self.catalog.refresh(self.db), 2)
+        self.assertEqual(sorted(row.product_name for row in self.catalog.get_many([1, 2, 3])), ["布洛芬缓释胶囊", "阿莫西林胶囊"])
+        self.assertEqual(self.catalog.find_by_approval_number("国药准字H20240001"), [])
+        self.assertEqual(self.catalog.find_by_barcode("6901234567890"), [])
+        self.assertEqual(self.catalog.refresh(self.db), 0)
+
+    def test_get_catalog_refreshes_at_interval(self):
+        self.db.add(MasterProduct(product_type="药品", product_name="阿莫西林胶囊", manufacturer="某药业",
+                                  specification="0.25g*24粒", approval_number="国药准字H20000001"))
+        self.db.commit()
+        with patch('app.services.catalog_snapshot._catalog', self.catalog), \
+                patch('app.services.catalog_snapshot.SessionLocal', self.session_factory):
+            # 检查间隔内直接使用当前快照
+            self.assertEqual(get_catalog().find_by_approval_number("国药准字H20000001"), [])
+            with patch('app.services.catalog_snapshot.CATALOG_REFRESH_INTERVAL', 0):
+                self.assertEqual(len(get_catalog().find_by_approval_number("国药准字H20000001")), 1)
+
+    @patch('app.agents.enhanced_matcher_agent.SessionLocal')
+    def test_matcher_exact_match_served_from_snapshot(self, mock_session):
+        with patch('app.agents.enhanced_matcher_agent.get_catalog', return_value=self.catalog):
+            candidates = find_matching_products({
+                "approval_number": "国药准字H20240001",
+                "product_name": "蒙脱石散",
+                "manufacturer": "湖北午时药业股份有限公司",
+                "specification": "3g*10袋/盒"
+            })
+        self.assertEqual(len(candidates), 1)
+        self.assertEqual(candidates[0]["score"], 95)
+        # 精确命中快照时不访问数据库
+        mock_session.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import json
+import unittest
+from unittest.mock import patch
+from langchain_core.language_models import FakeListChatModel
+from prometheus_client import REGISTRY
+from app.agents.classify_extract_agent import classify_and_extract, parse_fused_output
+from app.agents.graph import after_classify_extract, after_fast_path
+
+DRUG_OUTPUT = {
+    "product_type": "药品",
+    "extracted_data": {"approval_number": "国药准字H20000690", "product_name": "蒙脱石散", "specification": "3g*10袋",
+                       "manufacturer": "博福-益普生（天津）制药有限公司", "unknown_field": "忽略"},
+}
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+class TestClassifyExtract(unittest.TestCase):
+    def setUp(self):
+        patcher = patch('app.utils.llm_cache.LLM_CACHE_PATH', "")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _run(self, response):
+        llm = FakeListChatModel(responses=[response])
+        with patch('app.agents.classify_extract_agent.get_llm_instance', return_value=llm):
+            return classify_and_extract({"raw_text": "蒙脱石散 3g*10袋 国药准字H20000690"})
+
+    def test_parse_fused_output(self):
+        result = parse_fused_output(DRUG_OUTPUT)
+        self.assertEqual(result["product_type"], "药品")
+        # 只保留该类型Schema的字段，缺失字段补为空字符串
+        self.assertNotIn("unknown_field", result["extracted_data"])
+        self.assertEqual(result["extracted_data"]["dosage_form"], "")
+        self.assertEqual(result["extracted_data"]["product_name"], "蒙脱石散")
+
+        self.assertIsNone(parse_fused_output({"product_type": "食品", "extracted_data": {"product_name": "饼干"}}))
+        self.assertIsNone(parse_fused_output({"product_type": "药品", "extracted_data": "蒙脱石散"}))
+        self.assertIsNone(parse_fused_output({"product_type": "药品", "extracted_data": {"名称": "蒙脱石散"}}))
+        self.assertIsNone(parse_fused_output(["药品"]))
+
+    def test_fused_output_routes_to_validator(self):
+        state = self._run(json.dumps(DRUG_OUTPUT, ensure_ascii=False))
+        self.assertEqual(state["product_type"], "药品")
+        self.assertEqual(state["extracted_data"]["approval_number"], "国药准字H20000690")
+        self.assertEqual(after_classify_extract(state), "validator")
+
+    def test_fallback_to_classifier(self):
+        fallback = _sample("tasks_processed_total", status="fallback")
+        error = _sample("tasks_processed_total", status="error")
+        durations = _sample("task_processing_duration_seconds_count")
+        self.assertEqual(after_classify_extract(self._run("药品")), "classifier") # 不是JSON
+        self.assertEqual(after_classify_extract(self._run('{"product_type": "未知"}')), "classifier")
+        with patch('app.agents.classify_extract_agent.get_llm_instance', side_effect=ValueError("GEMINI_API_KEY not found")):
+            self.assertEqual(after_classify_extract(classify_and_extract({"raw_text": "蒙脱石散"})), "classifier")
+        # 回退和异常同样计入任务处理指标
+        self.assertEqual(_sample("tasks_processed_total", status="fallback") - fallback, 1)
+        self.assertEqual(_sample("tasks_processed_total", status="error") - error, 2)
+        self.assertEqual(_sample("task_processing_duration_seconds_count") - durations, 3)
+
+    def test_fast_path_routing(self):
+        with patch('app.agents.classify_extract_agent.FUSED_CLASSIFY_EXTRACT_ENABLED', True):
+            self.assertEqual(after_fast_path({"raw_text": "蒙脱石散"}), "classify_extract")
+            self.assertEqual(after_fast_path({"validated_data": {"product_name": "蒙脱石散"}}), "matcher")
+        with patch('app.agents.classify_extract_agent.FUSED_CLASSIFY_EXTRACT_ENABLED', False):
+            self.assertEqual(after_fast_path({"raw_text": "蒙脱石散"}), "classifier")
+
+if __name__ == '__main__':
+    unittest.main()
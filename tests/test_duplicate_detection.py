@@ -0,0 +1,79 @@
+import unittest
+from unittest.mock import patch
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.models.schema import Base, DuplicateCluster, MasterProduct
+from app.services import duplicate_detection
+from app.services.duplicate_detection import compute_signatures, find_duplicate_clusters, save_duplicate_clusters
+from app.utils.spec_parser import specification_columns
+from app.utils.text_normalize import normalized_columns
+
+class TestDuplicateDetection(unittest.TestCase):
+    def setUp(self):
+        engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(bind=engine)
+        self.db = sessionmaker(bind=engine)()
+        for name, manufacturer, spec in [
+            ("蒙脱石散", "湖北午时药业股份有限公司", "3g*10袋/盒"),
+            ("布洛芬缓释胶囊", "中美天津史克制药有限公司", "0.3g*20粒"),
+            ("蒙脱石散", "湖北午时药业有限公司", "3g×10袋/盒"), # 与1重复：企业后缀和乘号写法不同
+            ("布洛芬缓释胶囊", "中美天津史克制药有限公司", "0.4g*20粒"), # 与2文本相似但含量不同
+            ("阿莫西林胶囊", "石药集团中诺药业（石家庄）有限公司", "0.25g*24粒"),
+            ("蒙脱石散", "湖北午时药业股份有限公司", "3000mg*10袋/盒"), # 与1重复：规格单位不同
+        ]:
+            data = {"product_name": name, "manufacturer": manufacturer, "specification": spec}
+            self.db.add(MasterProduct(product_type="药品", **data, **normalized_columns(data), **specification_columns(spec)))
+        self.db.commit()
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_signatures_are_deterministic(self):
+        rows = [(1, "蒙脱石散", "湖北午时药业", "3g*10袋/盒"), (2, "", "", "")]
+        ids, signatures = compute_signatures(rows, 64, 1)
+        self.assertEqual(ids, [1])
+        self.assertEqual(signatures.shape, (1, 64))
+        self.assertEqual(compute_signatures(rows, 64, 1)[1].tolist(), signatures.tolist())
+
+    def test_find_clusters(self):
+        clusters = find_duplicate_clusters(self.db, batch_size=2)
+        self.assertEqual([cluster["spu_ids"] for cluster in clusters], [[1, 3, 6]])
+        self.assertGreaterEqual(clusters[0]["similarity"], 0.8)
+
+    def _add_products(self, manufacturer_ids, spec="3g*10袋/盒"):
+        for manufacturer_id in manufacturer_ids:
+            data = {"product_name": "小儿氨酚黄那敏颗粒", "manufacturer": "某某制药有限公司", "specification": spec}
+            self.db.add(MasterProduct(product_type="药品", **data, **normalized_columns(data), **specification_columns(spec),
+                                      manufacturer_id=manufacturer_id))
+        self.db.commit()
+
+    def test_incompatible_products_not_merged_transitively(self):
+        # 7与8的规范企业不同；9的企业未知，与两者分别兼容，但不能把7和8经由9并入同一簇
+        self._add_products([1, 2, None])
+        clusters = [cluster["spu_ids"] for cluster in find_duplicate_clusters(self.db)]
+        self.assertIn([1, 3, 6], clusters)
+        merged = [spu_ids for spu_ids in clusters if 9 in spu_ids]
+        self.assertEqual(len(merged), 1)
+        self.assertFalse({7, 8} <= set(merged[0]))
+
+    def test_large_bucket(self):
+        # 超出两两比较上限的同签名大桶：每个商品并入兼容的簇，而不是只与桶内第一个商品比较
+        self._add_products([1, 2] * 30)
+        with patch.object(duplicate_detection, "MAX_PAIRWISE_BUCKET", 10):
+            clusters = [cluster["spu_ids"] for cluster in find_duplicate_clusters(self.db)]
+        self.assertEqual(sorted(clusters), [[1, 3, 6], list(range(7, 67, 2)), list(range(8, 67, 2))])
+
+    def test_save_keeps_reviewed_clusters(self):
+        clusters = find_duplicate_clusters(self.db)
+        self.assertEqual(save_duplicate_clusters(self.db, clusters, "run1"), 1)
+        cluster = self.db.query(DuplicateCluster).one()
+        self.assertEqual((cluster.spu_ids, cluster.size, cluster.status), ([1, 3, 6], 3, "PENDING"))
+
+        # 已审核的簇在下次运行时不会重复写入
+        cluster.status = "DISMISSED"
+        self.db.commit()
+        self.assertEqual(save_duplicate_clusters(self.db, clusters, "run2"), 0)
+        self.assertEqual(self.db.query(DuplicateCluster).count(), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from app.agents.drug_extractor_agent import extract_drug_info
+from app.utils import llm_cache
+from app.utils.llm_cache import LLMResponseCache, bypass_llm_cache, cached_chain, reset_llm_response_cache
+
+PROMPT = ChatPromptTemplate.from_messages([("system", "提取商品信息"), ("human", "{raw_text}")])
+
+class CountingChatModel(FakeListChatModel):
+    """按顺序返回预设响应并记录调用次数"""
+    calls: int = 0
+
+    def _call(self, *args, **kwargs):
+        self.calls += 1
+        return super()._call(*args, **kwargs)
+
+class TestLLMResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "llm_cache.db")
+        self.patcher = patch.object(llm_cache, "LLM_CACHE_PATH", self.path)
+        self.patcher.start()
+        reset_llm_response_cache()
+
+    def tearDown(self):
+        reset_llm_response_cache()
+        self.patcher.stop()
+        self.tmpdir.cleanup()
+
+    def test_ttl_and_size_eviction(self):
+        cache = LLMResponseCache(os.path.join(self.tmpdir.name, "evict.db"), ttl=60, max_entries=2)
+        for i in range(3):
+            cache.set(f"k{i}", "test", f"v{i}")
+        self.assertEqual(cache.get("k0"), "v0") # k0最近被使用
+        self.assertEqual(cache.evict(), 1)
+        self.assertEqual((cache.get("k0"), cache.get("k1"), cache.get("k2")), ("v0", None, "v2"))
+
+        cache.ttl = 0
+        self.assertIsNone(cache.get("k0"))
+        self.assertEqual(cache.evict(), 2)
+        self.assertEqual(len(cache), 0)
+        cache.close()
+
+    def test_hits_do_not_write_per_request(self):
+        cache = LLMResponseCache(os.path.join(self.tmpdir.name, "touch.db"), ttl=60, max_entries=10)
+        cache.set("k0", "test", "v0")
+        stored_at = time.time()
+        statements = []
+        cache._conn.set_trace_callback(statements.append)
+        for _ in range(llm_cache._TOUCH_EVERY - 1):
+            self.assertEqual(cache.get("k0"), "v0")
+        self.assertFalse([sql for sql in statements if sql.startswith(("UPDATE", "COMMIT"))])
+        cache._conn.set_trace_callback(None)
+        cache.close()
+        # 关闭时写回最近使用时间
+        reopened = LLMResponseCache(os.path.join(self.tmpdir.name, "touch.db"), ttl=60, max_entries=10)
+        accessed_at, = reopened._conn.execute("SELECT accessed_at FROM llm_responses").fetchone()
+        self.assertGreaterEqual(accessed_at, stored_at)
+        reopened.close()
+
+    def test_cached_chain(self):
+        llm = CountingChatModel(responses=['{"product_name": "蒙脱石散"}', '{"product_name": "布洛芬"}', '{"product_name": "蒙脱石散剂"}'])
+        chain = cached_chain("test", 1, PROMPT, llm, JsonOutputParser())
+        self.assertEqual(chain.invoke({"raw_text": "蒙脱石散 3g*10袋"}), {"product_name": "蒙脱石散"})
+        self.assertEqual(chain.invoke({"raw_text": "蒙脱石散 3g*10袋"}), {"product_name": "蒙脱石散"})
+        self.assertEqual(llm.calls, 1)
+
+        # 不同的输入、提示词版本不命中
+        self.assertEqual(chain.invoke({"raw_text": "布洛芬缓释胶囊"}), {"product_name": "布洛芬"})
+        self.assertEqual(llm.calls, 2)
+
+        # 绕过缓存时重新调用LLM，并以新的响应覆盖缓存
+        with bypass_llm_cache():
+            self.assertEqual(chain.invoke({"raw_text": "蒙脱石散 3g*10袋"}), {"product_name": "蒙脱石散剂"})
+        self.assertEqual(chain.invoke({"raw_text": "蒙脱石散 3g*10袋"}), {"product_name": "蒙脱石散剂"})
+        self.assertEqual(llm.calls, 3)
+
+        # 缓存在进程重启（重新打开）后仍然有效
+        reset_llm_response_cache()
+        self.assertEqual(cached_chain("test", 1, PROMPT, llm, JsonOutputParser()).invoke({"raw_text": "布洛芬缓释胶囊"}),
+                         {"product_name": "布洛芬"})
+        self.assertEqual(llm.calls, 3)
+
+    def test_failed_parse_not_cached(self):
+        llm = CountingChatModel(responses=["不是JSON", '{"product_name": "蒙脱石散"}'])
+        chain = cached_chain("test", 1, PROMPT, llm, JsonOutputParser())
+        with self.assertRaises(Exception):
+            chain.invoke({"raw_text": "蒙脱石散"})
+        self.assertEqual(chain.invoke({"raw_text": "蒙脱石散"}), {"product_name": "蒙脱石散"})
+        self.assertEqual(llm.calls, 2)
+
+    def test_extractor_uses_cache(self):
+        llm = CountingChatModel(responses=['{"approval_number": "国药准字H20000690", "product_name": "蒙脱石散"}'])
+        with patch('app.agents.drug_extractor_agent.get_llm_instance', return_value=llm):
+            first = extract_drug_info({"raw_text": "蒙脱石散 国药准字H20000690"})
+            second = extract_drug_info({"raw_text": "蒙脱石散 国药准字H20000690"})
+        self.assertEqual(first, second)
+        self.assertEqual(llm.calls, 1)
+
+if __name__ == '__main__':
+    unittest.main()
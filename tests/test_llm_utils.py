@@ -0,0 +1,81 @@
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+from prometheus_client import REGISTRY
+from app.utils import llm_utils
+from app.utils.llm_utils import LLMClientRegistry, get_llm_instance, reset_llm_clients
+
+ENV = {
+    "DEEPSEEK_API_KEY": "sk-test",
+    "VOLCES_API_KEY": "volces-test",
+    "VOLCES_BASE_URL": "http://127.0.0.1:1/v1",
+    "GEMINI_API_KEY": "gemini-test",
+}
+
+class _OKHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+class TestLLMClientRegistry(unittest.TestCase):
+    def setUp(self):
+        reset_llm_clients()
+
+    def tearDown(self):
+        reset_llm_clients()
+
+    def test_clients_are_reused(self):
+        with patch.dict('os.environ', ENV):
+            reused = _sample("llm_client_requests_total", provider="deepseek", result="reused")
+            first = get_llm_instance("deepseek")
+            self.assertIs(get_llm_instance("deepseek"), first)
+            self.assertEqual(_sample("llm_client_requests_total", provider="deepseek", result="reused"), reused + 1)
+            self.assertIs(get_llm_instance("gemini"), get_llm_instance("gemini"))
+
+            # OpenAI兼容的提供方共用同一个连接池
+            volces = get_llm_instance("volces")
+            self.assertIsNot(volces, first)
+            self.assertIs(volces.http_client, first.http_client)
+
+            # 配置变化后按新配置创建客户端
+            with patch.dict('os.environ', {"DEEPSEEK_MODEL": "deepseek-reasoner"}):
+                self.assertIsNot(get_llm_instance("deepseek"), first)
+
+    def test_missing_configuration(self):
+        with patch.dict('os.environ', {"DEEPSEEK_API_KEY": ""}):
+            with self.assertRaises(ValueError):
+                get_llm_instance("deepseek")
+        with self.assertRaises(ValueError):
+            get_llm_instance("unknown")
+
+    def test_connection_reuse_metrics(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _OKHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        registry = LLMClientRegistry()
+        try:
+            new = _sample("llm_http_requests_total", pool=llm_utils.SHARED_POOL, connection="new")
+            reused = _sample("llm_http_requests_total", pool=llm_utils.SHARED_POOL, connection="reused")
+            client = registry._shared_http_client()
+            for _ in range(3):
+                self.assertEqual(client.get(f"http://127.0.0.1:{server.server_port}/").text, "ok")
+            self.assertEqual(_sample("llm_http_requests_total", pool=llm_utils.SHARED_POOL, connection="new"), new + 1)
+            self.assertEqual(_sample("llm_http_requests_total", pool=llm_utils.SHARED_POOL, connection="reused"), reused + 2)
+            self.assertEqual(_sample("llm_http_pool_connections", pool=llm_utils.SHARED_POOL), 1)
+        finally:
+            registry.clear()
+            server.shutdown()
+            server.server_close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import unittest
+from unittest.mock import patch
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.agents.enhanced_matcher_agent import find_matching_products
+from app.models.schema import Base, MasterProduct, Manufacturer
+from app.services import manufacturer_resolver
+from app.services.manufacturer_resolver import (
+    ManufacturerResolver, assign_manufacturer_ids, get_or_create_manufacturer_id,
+    resolve_manufacturer_id, seed_manufacturers
+)
+from app.services.ngram_index import index_product
+from app.utils.similarity_kernel import score_candidates
+from app.utils.text_normalize import normalize_manufacturer
+
+class TestManufacturerResolver(unittest.TestCase):
+    def setUp(self):
+        engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(bind=engine)
+        self.session_factory = sessionmaker(bind=engine)
+        self.db = self.session_factory()
+        manufacturer_resolver._resolver.clear()
+        seed_manufacturers(self.db, [
+            ("湖北午时药业股份有限公司",),
+            ("中美天津史克制药有限公司", "Tianjin Smith Kline & French Laboratories Ltd."),
+            ("湖北午时药业有限公司",),
+        ])
+
+    def tearDown(self):
+        self.db.close()
+        manufacturer_resolver._resolver.clear()
+
+    def test_seed_and_resolve_aliases(self):
+        # 公司类型后缀不同的名称归并为同一企业
+        self.assertEqual(self.db.query(Manufacturer).count(), 2)
+        wushi = resolve_manufacturer_id(self.db, "湖北午时药业有限公司")
+        self.assertEqual(resolve_manufacturer_id(self.db, "湖北午时药业股份有限公司"), wushi)
+        smith = resolve_manufacturer_id(self.db, "中美天津史克制药有限公司")
+        self.assertEqual(resolve_manufacturer_id(self.db, "TIANJIN SMITH KLINE & FRENCH LABORATORIES LTD"), smith)
+        self.assertNotEqual(wushi, smith)
+        self.assertIsNone(resolve_manufacturer_id(self.db, "石药集团"))
+        self.assertIsNone(resolve_manufacturer_id(self.db, ""))
+
+    def test_get_or_create(self):
+        manufacturer_id = get_or_create_manufacturer_id(self.db, "石药集团有限公司")
+        self.db.commit()
+        self.assertEqual(get_or_create_manufacturer_id(self.db, "石药集团"), manufacturer_id)
+        self.assertEqual(self.db.query(Manufacturer).count(), 3)
+
+    def test_lru_eviction(self):
+        resolver = ManufacturerResolver(maxsize=1)
+        first = resolver.resolve(self.db, "湖北午时药业")
+        resolver.resolve(self.db, "中美天津史克制药")
+        self.assertEqual(list(resolver._cache), ["中美天津史克制药"])
+        # 被淘汰的条目重新从别名表解析
+        self.assertEqual(resolver.resolve(self.db, "湖北午时药业"), first)
+
+    def test_assign_ids_and_score_by_id(self):
+        self.db.add(MasterProduct(product_type="药品", product_name="布洛芬缓释胶囊", manufacturer="中美天津史克制药有限公司",
+                                  approval_number="国药准字H10900089", specification="0.3g*20粒"))
+        self.db.commit()
+        self.assertEqual(assign_manufacturer_ids(self.db), 1)
+        product = self.db.query(MasterProduct).one()
+        index_product(self.db, product)
+        self.db.commit()
+
+        # 英文企业名称与中文名称文本上完全不相似，但规范企业ID一致
+        query = {"product_name": "布洛芬缓释胶囊", "manufacturer": "Tianjin Smith Kline & French Laboratories Ltd."}
+        self.assertEqual(score_candidates(query, [product]).tolist(), [25])
+        query["manufacturer_id"] = product.manufacturer_id
+        self.assertEqual(score_candidates(query, [product]).tolist(), [45])
+        query["manufacturer_id"] = product.manufacturer_id + 1
+        self.assertEqual(score_candidates(query, [product]).tolist(), [25])
+        # ID不同（如写法差异导致新建了企业）时回退到文本相似度，不直接判0分
+        query["manufacturer"] = "中美天津史克制药有限公司"
+        self.assertEqual(score_candidates(query, [product]).tolist(), [45])
+
+        with patch('app.agents.enhanced_matcher_agent.SessionLocal', self.session_factory):
+            candidates = find_matching_products({"product_name": "布洛芬缓释胶囊", "manufacturer": "TIANJIN SMITH KLINE & FRENCH LABORATORIES LTD."})
+        self.assertEqual(candidates[0]["product"].spu_id, product.spu_id)
+        self.assertEqual(candidates[0]["score"], 45)
+
+class TestManufacturerCreateTransaction(unittest.TestCase):
+    def setUp(self):
+        engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(bind=engine)
+        self.db = sessionmaker(bind=engine)()
+        manufacturer_resolver._resolver.clear()
+        seed_manufacturers(self.db, [("湖北午时药业股份有限公司",)])
+
+    def tearDown(self):
+        self.db.close()
+        manufacturer_resolver._resolver.clear()
+
+    def test_cache_updated_only_after_commit(self):
+        resolver = ManufacturerResolver()
+        manufacturer_id = resolver.get_or_create(self.db, "石药集团有限公司", aliases=["CSPC Pharmaceutical Group"])
+        # 同一事务内可以解析到新建的企业，但尚未写入进程内缓存
+        self.assertEqual(resolver.resolve(self.db, "石药集团"), manufacturer_id)
+        self.assertEqual(len(resolver._cache), 0)
+        self.db.rollback()
+        self.assertEqual(len(resolver._cache), 0)
+        self.assertIsNone(resolver.resolve(self.db, "石药集团"))
+
+        manufacturer_id = resolver.get_or_create(self.db, "石药集团有限公司", aliases=["CSPC Pharmaceutical Group"])
+        self.db.commit()
+        self.assertEqual(resolver._cache_get("石药集团"), manufacturer_id)
+        self.assertEqual(resolver._cache_get(normalize_manufacturer("CSPC Pharmaceutical Group")), manufacturer_id)
+
+    def test_concurrent_create_resolves_existing(self):
+        # 模拟并发：解析时企业尚未登记，插入前已被其他请求创建并提交
+        existing = get_or_create_manufacturer_id(self.db, "石药集团有限公司")
+        self.db.commit()
+        resolver = ManufacturerResolver()
+        real_resolve = resolver.resolve
+        with patch.object(resolver, "resolve", side_effect=[None, real_resolve(self.db, "石药集团")]):
+            self.assertEqual(resolver.get_or_create(self.db, "石药集团有限公司"), existing)
+        # 唯一约束冲突时不插入，外层事务仍然可用
+        self.db.commit()
+        self.assertEqual(self.db.query(Manufacturer).count(), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,17 @@
+import random
 import unittest
+from difflib import SequenceMatcher
 from unittest.mock import patch, MagicMock
-from app.agents.enhanced_matcher_agent import match_product, calculate_similarity, calculate_match_score, find_matching_products
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from app.agents.enhanced_matcher_agent import match_product, calculate_similarity, calculate_match_score, find_matching_products, match_products_batch, _prefix_related_ids
 from app.agents.fusion_agent import fuse_product, merge_product_data
-from app.models.schema import MasterProduct
+from app.models.schema import Base, MasterProduct
+from app.services.catalog_snapshot import CatalogSnapshot
+from app.services.ngram_index import index_product
+from app.utils.similarity_kernel import char_overlaps, score_candidates, similarity_column, top_k_candidates
+from app.utils.spec_parser import parse_specification
+from app.utils.text_normalize import normalize_field, normalized_columns
 
 class TestEnhancedMatcherAgent(unittest.TestCase):
     def setUp(self):
@@ -90,6 +99,205 @@ class TestEnhancedMatcherAgent(unittest.TestCase):
         self.assertEqual(result["match_result"]["status"], "NO_MATCH")
         self.assertIsNone(result["match_result"]["spu_id"])
 
+def reference_match_score(validated_data, product):
+    """逐字段对标准化后的值调用calculate_similarity的参考打分实现，用于校验批量打分内核"""
+    score = 0
+    new = normalize_field("approval_number", validated_data.get("approval_number"))
+    existing = normalize_field("approval_number", product.approval_number)
+    if new and existing:
+        if new == existing:
+            score += 40
+        elif new.startswith(existing) or existing.startswith(new):
+            score += 20
+    new_spec = parse_specification(validated_data.get("specification"))
+    existing_spec = parse_specification(product.specification)
+    rules = [
+        ("product_name", [(0.9, 25), (0.8, 20), (0.7, 15), (0.6, 10)]),
+        ("manufacturer", [(0.9, 20), (0.8, 10)]),
+        ("specification", [(0.9, 10), (0.8, 5)]),
+        ("brand", [(0.9, 5), (0.8, 2)]),
+    ]
+    for field, buckets in rules:
+        if field == "specification" and new_spec and existing_spec and new_spec.strength and existing_spec.strength:
+            # 双方都能解析出含量时按结构化规格比较
+            if new_spec[:2] == existing_spec[:2]:
+                score += 10 if new_spec[2:] == existing_spec[2:] else 5
+            continue
+        similarity = calculate_similarity(
+            normalize_field(field, validated_data.get(field)),
+            normalize_field(field, getattr(product, field))
+        )
+        for lower, points in buckets:
+            if similarity > lower:
+                score += points
+                break
+    return score
+
+class TestSimilarityKernel(unittest.TestCase):
+    def test_similarity_column_matches_sequence_matcher(self):
+        rng = random.Random(3)
+        alphabet = "蒙脱石散颗粒布洛芬AbC"
+        candidates = ["".join(rng.choice(alphabet) for _ in range(rng.randint(0, 10))) for _ in range(300)] + [None]
+        self.assertEqual(char_overlaps("蒙蒙脱", ["蒙脱蒙蒙", "脱", "散"]).tolist(), [3, 1, 0])
+        for _ in range(20):
+            value = "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 10)))
+            for min_ratio in (0.0, 0.6, 0.8):
+                expected = []
+                for candidate in candidates:
+                    ratio = SequenceMatcher(None, value.lower(), candidate.lower()).ratio() if candidate else 0.0
+                    # 相似度不超过min_ratio时记为0
+                    expected.append(ratio if ratio > min_ratio else 0.0)
+                actual = similarity_column(value, candidates, min_ratio).tolist()
+                self.assertEqual([x if x > min_ratio else 0.0 for x in actual], expected)
+
+    def test_score_candidates_matches_reference(self):
+        rng = random.Random(42)
+        alphabet = "蒙脱石散颗粒布洛芬缓释胶囊湖北午时药业股份有限公司"
+        def rand_text():
+            return "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 8)))
+
+        products = [
+            MasterProduct(
+                spu_id=i,
+                product_name=rand_text(),
+                manufacturer=rand_text(),
+                specification=rng.choice(["3g*10袋/盒", "3g*12袋/盒", "0.3g*20粒", "24粒/盒", "复方", ""]),
+                brand=rng.choice(["午时", "午时牌", None]),
+                approval_number=rng.choice(["国药准字H20240001", "国药准字H2024", "国药准字H20240002", None])
+            ) for i in range(200)
+        ]
+        for _ in range(20):
+            validated_data = {
+                "approval_number": rng.choice(["国药准字H20240001", "国药准字H202400", ""]),
+                "product_name": rand_text(),
+                "manufacturer": rand_text(),
+                "specification": rng.choice(["3g*10袋/盒", "0.3G*20粒", "300mg×20片", "24粒", "复方制剂", ""]),
+                "brand": rng.choice(["午时", ""])
+            }
+            expected = [reference_match_score(validated_data, product) for product in products]
+            self.assertEqual(score_candidates(validated_data, products).tolist(), expected)
+
+    def test_top_k_matches_full_sort(self):
+        rng = random.Random(7)
+        names = ["蒙脱石散", "蒙脱石颗粒", "蒙脱石混悬液", "布洛芬缓释胶囊", "布洛芬片"]
+        manufacturers = ["湖北午时药业股份有限公司", "湖北午时药业有限公司", "中美天津史克制药有限公司"]
+        products = [
+            MasterProduct(
+                spu_id=i,
+                product_name=rng.choice(names),
+                manufacturer=rng.choice(manufacturers),
+                specification=rng.choice(["3g*10袋/盒", "3g*12袋/盒", "0.3g*20粒"]),
+                brand=rng.choice(["午时", "芬必得", None]),
+                approval_number=rng.choice(["国药准字H20240001", "国药准字H2024000", "国药准字H10900089", None])
+            ) for i in range(300)
+        ]
+        for _ in range(30):
+            validated_data = {
+                "approval_number": rng.choice(["国药准字H20240001", ""]),
+                "product_name": rng.choice(names),
+                "manufacturer": rng.choice(manufacturers + [""]),
+                "specification": rng.choice(["3g*10袋/盒", ""]),
+                "brand": rng.choice(["午时", ""])
+            }
+            threshold, limit = rng.choice([(0, 10), (40, 10), (40, 1), (60, 5)])
+            scores = score_candidates(validated_data, products).tolist()
+            expected = sorted(
+                [(i, score) for i, score in enumerate(scores) if score >= threshold],
+                key=lambda item: item[1], reverse=True
+            )[:limit]
+            self.assertEqual(top_k_candidates(validated_data, products, threshold, limit), expected)
+
+    def test_top_k_scores_manufacturer_id_without_text(self):
+        # 生产企业文本为空但带有规范企业ID时同样计分，剪枝上界不能漏掉这20分
+        products = [
+            MasterProduct(spu_id=1, product_name="蒙脱石散", manufacturer="湖北午时药业股份有限公司", manufacturer_id=7),
+            MasterProduct(spu_id=2, product_name="蒙脱石散", manufacturer="中美天津史克制药有限公司", manufacturer_id=8),
+        ]
+        validated_data = {"product_name": "蒙脱石散", "manufacturer": "", "manufacturer_id": 7}
+        self.assertEqual(score_candidates(validated_data, products).tolist(), [45, 25])
+        self.assertEqual(top_k_candidates(validated_data, products, 40, 10), [(0, 45)])
+        self.assertEqual(top_k_candidates(validated_data, products, 0, 1), [(0, 45)])
+
+    def test_score_candidates_empty(self):
+        self.assertEqual(len(score_candidates({"product_name": "蒙脱石散"}, [])), 0)
+
+class TestBatchMatching(unittest.TestCase):
+    def setUp(self):
+        engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(bind=engine)
+        self.session_factory = sessionmaker(bind=engine)
+        db = self.session_factory()
+        for name, manufacturer, approval_number, spec in [
+            ("蒙脱石散", "湖北午时药业股份有限公司", "国药准字H20240001", "3g*10袋/盒"),
+            ("蒙脱石散", "博福-益普生（天津）制药有限公司", "国药准字H20000690", "3g*10袋/盒"),
+            ("布洛芬缓释胶囊", "中美天津史克制药有限公司", "国药准字H10900089", "0.3g*20粒"),
+        ]:
+            data = {"product_name": name, "manufacturer": manufacturer, "approval_number": approval_number, "specification": spec}
+            product = MasterProduct(product_type="药品", **data, **normalized_columns(data))
+            db.add(product)
+            db.flush()
+            index_product(db, product)
+        db.commit()
+        db.close()
+
+    def test_batch_results_match_single_record_path(self):
+        records = [
+            {"approval_number": "国药准字H20240001", "product_name": "蒙脱石散",
+             "manufacturer": "湖北午时药业股份有限公司", "specification": "3g*10袋/盒"},
+            {"approval_number": "国药准字H20240001", "product_name": "蒙脱石散", "manufacturer": "湖北午时药业"},
+            {"product_name": "蒙脱石散", "manufacturer": "湖北午时药业股份有限公司", "specification": "3g*10袋/盒"},
+            {"product_name": "布洛芬缓释胶囊", "manufacturer": "中美天津史克制药有限公司"},
+            {"product_name": "阿莫西林胶囊", "manufacturer": "石药集团"},
+        ]
+        with patch('app.agents.enhanced_matcher_agent.SessionLocal', self.session_factory):
+            results = match_products_batch(records)
+            expected = [match_product({"validated_data": record})["match_result"] for record in records]
+
+        self.assertEqual([result["index"] for result in results], list(range(len(records))))
+        self.assertEqual([result["match_result"] for result in results], expected)
+        self.assertEqual(results[0]["match_result"]["status"], "MATCH")
+        self.assertEqual(results[2]["match_result"]["status"], "CANDIDATES")
+        self.assertEqual(results[4]["match_result"]["status"], "NO_MATCH")
+
+    def test_batch_lookups_are_merged(self):
+        # 前缀查询、企业解析和同企业同名查询对整批记录各只执行一次，不随记录数增长
+        records = [
+            {"approval_number": f"国药准字H2024{i:02d}", "product_name": f"测试商品{i}", "manufacturer": f"测试药业{i}有限公司"}
+            for i in range(20)
+        ]
+        statements = []
+        engine = self.session_factory.kw["bind"]
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(engine, "before_cursor_execute", listener)
+        try:
+            with patch('app.agents.enhanced_matcher_agent.SessionLocal', self.session_factory):
+                match_products_batch(records)
+        finally:
+            event.remove(engine, "before_cursor_execute", listener)
+        self.assertEqual(sum("UNION ALL" in statement or "approval_number_norm >" in statement for statement in statements), 1)
+        self.assertEqual(sum("manufacturer_aliases" in statement for statement in statements), 1)
+
+    def test_prefix_candidates_without_snapshot(self):
+        db = self.session_factory()
+        try:
+            catalog = CatalogSnapshot()
+            catalog.load(db)
+            # 未加载快照时在approval_number_norm索引上查询，结果与快照的前缀索引一致
+            for approval_number in ["国药准字H202400", "国药准字H2024000199", "国药准字H2", "国药准字H20240002", "国药准字"]:
+                self.assertEqual(_prefix_related_ids(db, None, approval_number), _prefix_related_ids(db, catalog, approval_number))
+            self.assertEqual(_prefix_related_ids(db, None, "国药准字H202400"), {1: "PREFIX"})
+            self.assertEqual(_prefix_related_ids(db, None, "国药准字H2024000199"), {1: "PREFIX"})
+            self.assertEqual(set(_prefix_related_ids(db, None, "国药准字H2")), {1, 2})
+            self.assertEqual(_prefix_related_ids(db, None, "国药准字"), {})
+        finally:
+            db.close()
+
+        # 截断的批准文号通过前缀关系召回产品
+        with patch('app.agents.enhanced_matcher_agent.SessionLocal', self.session_factory):
+            candidates = find_matching_products({"approval_number": "国药准字H202400", "product_name": "蒙脱石散",
+                                                 "manufacturer": "湖北午时药业股份有限公司"})
+        self.assertEqual(candidates[0]["product"].spu_id, 1)
+
 class TestFusionAgent(unittest.TestCase):
     def setUp(self):
         self.validated_data = {
@@ -134,6 +342,20 @@ class TestFusionAgent(unittest.TestCase):
         # 在有冲突的情况下，应该保留现有产品的数据
         self.assertEqual(fused_data["product_name"], "蒙脱石散")
 
+    def test_merge_product_data_equivalent_specification(self):
+        # 规格写法不同但含量和包装数量一致时不视为冲突
+        equivalent_data = self.validated_data.copy()
+        equivalent_data["specification"] = "3000mg×10袋"
+
+        fused_data, conflicts = merge_product_data(self.existing_product, equivalent_data)
+
+        self.assertEqual(len(conflicts), 0)
+        self.assertEqual(fused_data["specification"], "3g*10袋/盒")
+
+        equivalent_data["specification"] = "3g*12袋/盒"
+        _, conflicts = merge_product_data(self.existing_product, equivalent_data)
+        self.assertEqual(conflicts[0]["field"], "specification")
+
     def test_fuse_product_exact_match(self):
         state = {
             "validated_data": self.validated_data,
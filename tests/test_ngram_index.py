@@ -0,0 +1,68 @@
+import unittest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.models.schema import Base, MasterProduct, MasterProductNgramStat
+from app.services.ngram_index import (
+    _adjust_doc_counts, extract_ngrams, index_product, find_candidate_spu_ids, rebuild_ngram_index
+)
+
+class TestNgramIndex(unittest.TestCase):
+    def setUp(self):
+        engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(bind=engine)
+        self.db = sessionmaker(bind=engine)()
+        self.products = [
+            MasterProduct(product_type="药品", product_name="蒙脱石散", manufacturer="湖北午时药业股份有限公司",
+                          specification="3g*10袋/盒", brand="午时"),
+            MasterProduct(product_type="药品", product_name="布洛芬缓释胶囊", manufacturer="中美天津史克制药有限公司",
+                          specification="0.3g*20粒", brand="芬必得"),
+            MasterProduct(product_type="药品", product_name="蒙脱石混悬液", manufacturer="博福-益普生（天津）制药有限公司",
+                          specification="30ml*1瓶"),
+        ]
+        for product in self.products:
+            self.db.add(product)
+            self.db.flush()
+            index_product(self.db, product)
+        self.db.commit()
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_extract_ngrams(self):
+        self.assertEqual(extract_ngrams("蒙脱石散"), {"蒙脱", "脱石", "石散", "蒙脱石", "脱石散"})
+        # 全角字符、大小写和标点应被标准化
+        self.assertEqual(extract_ngrams("ＡＢ－c"), extract_ngrams("abc"))
+        self.assertEqual(extract_ngrams("药"), {"药"})
+        self.assertEqual(extract_ngrams(None), set())
+
+    def test_find_candidates_ranked_by_hits(self):
+        candidate_ids = find_candidate_spu_ids(self.db, {"product_name": "蒙脱石散", "manufacturer": "湖北午时药业"})
+        self.assertEqual(candidate_ids[0], self.products[0].spu_id)
+        self.assertIn(self.products[2].spu_id, candidate_ids)
+        self.assertNotIn(self.products[1].spu_id, candidate_ids)
+
+    def test_find_candidates_no_hits(self):
+        self.assertEqual(find_candidate_spu_ids(self.db, {"product_name": "阿莫西林"}), [])
+        self.assertEqual(find_candidate_spu_ids(self.db, {}), [])
+
+    def test_doc_counts_upsert(self):
+        stat = self.db.query(MasterProductNgramStat).filter_by(gram="蒙脱石", field="product_name").one()
+        self.assertEqual(stat.doc_count, 2)
+        # 同一事务（或并发事务）中多次写入同一个新n-gram时在数据库端累加，不会主键冲突
+        _adjust_doc_counts(self.db, {("阿莫", "product_name"): 1})
+        _adjust_doc_counts(self.db, {("阿莫", "product_name"): 1, ("蒙脱石", "product_name"): 1})
+        self.db.commit()
+        counts = dict(self.db.query(MasterProductNgramStat.gram, MasterProductNgramStat.doc_count).filter(
+            MasterProductNgramStat.field == "product_name", MasterProductNgramStat.gram.in_(["阿莫", "蒙脱石"])
+        ).all())
+        self.assertEqual(counts, {"阿莫": 2, "蒙脱石": 3})
+
+    def test_rebuild_matches_incremental(self):
+        before = find_candidate_spu_ids(self.db, {"product_name": "布洛芬胶囊", "brand": "芬必得"})
+        self.assertEqual(rebuild_ngram_index(self.db), 3)
+        after = find_candidate_spu_ids(self.db, {"product_name": "布洛芬胶囊", "brand": "芬必得"})
+        self.assertEqual(before, after)
+        self.assertEqual(after, [self.products[1].spu_id])
+
+if __name__ == '__main__':
+    unittest.main()
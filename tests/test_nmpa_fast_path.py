@@ -0,0 +1,72 @@
+import unittest
+from unittest.mock import patch
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.models.schema import Base
+from app.models.nmpa_data import NMPADomesticDrug, NMPAImportedDrug
+from app.agents.graph import after_fast_path
+from app.agents.nmpa_fast_path_agent import detect_nmpa_identifiers, nmpa_fast_path
+from app.tools import nmpa_db_tools
+from app.tools.nmpa_search import rebuild_domestic_approval_numbers
+
+class TestNMPAFastPath(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(bind=self.engine)
+        self.session_factory = sessionmaker(bind=self.engine)
+        self.db = self.session_factory()
+        self.db.add_all([
+            NMPADomesticDrug(drug_code="86900002000001", approval_numbers="国药准字H10900089", product_name="布洛芬缓释胶囊",
+                             dosage_form="胶囊剂", specification="0.3g", mah="中美天津史克制药有限公司",
+                             manufacturer="中美天津史克制药有限公司"),
+            NMPADomesticDrug(drug_code="86900002000002", approval_numbers="国药准字H10900089", product_name="布洛芬缓释胶囊",
+                             dosage_form="胶囊剂", specification="0.4g", mah="中美天津史克制药有限公司",
+                             manufacturer="中美天津史克制药有限公司"),
+            NMPADomesticDrug(drug_code="86900001000001", approval_numbers="国药准字H20240001", product_name="蒙脱石散",
+                             dosage_form="散剂", specification="3g", mah="湖北午时药业股份有限公司",
+                             manufacturer="湖北午时药业股份有限公司"),
+            NMPAImportedDrug(drug_code="86978000000001", registration_number="H20170001", product_name="蒙脱石散",
+                             company_cn="益普生制药", mah_cn="益普生制药", specification="3g"),
+        ])
+        self.db.commit()
+        rebuild_domestic_approval_numbers(self.db)
+        nmpa_db_tools.invalidate_nmpa_cache()
+
+    def tearDown(self):
+        self.db.close()
+
+    def _run(self, raw_text):
+        with patch('app.tools.nmpa_db_tools.SessionLocal', self.session_factory):
+            return nmpa_fast_path({"raw_text": raw_text})
+
+    def test_detect_identifiers(self):
+        identifiers = detect_nmpa_identifiers("蒙脱石散 国药准字 ｈ２０２４０００１ 本位码86900001000001 规格10 86900001000001")
+        self.assertEqual(identifiers["approval_numbers"], ["国药准字H20240001"])
+        self.assertEqual(identifiers["drug_codes"], ["86900001000001"])
+        self.assertEqual(detect_nmpa_identifiers("普通商品 条码6901234567892"), {"approval_numbers": [], "drug_codes": []})
+
+    def test_hit_by_approval_number(self):
+        result = self._run("思密达 蒙脱石散 3g*10袋 国药准字H20240001")
+        self.assertEqual(result["product_type"], "药品")
+        self.assertEqual(result["validated_data"]["product_name"], "蒙脱石散")
+        self.assertEqual(result["validated_data"]["approval_number"], "国药准字H20240001")
+        self.assertEqual(result["validated_data"]["manufacturer"], "湖北午时药业股份有限公司")
+        self.assertIsNone(result["review_reason"])
+        self.assertEqual(after_fast_path(result), "matcher")
+
+    def test_ambiguous_approval_number_uses_spec_or_drug_code(self):
+        # 同一批准文号有两个规格：原文给出规格时按规格确定，否则回退到LLM流程
+        self.assertEqual(self._run("芬必得 布洛芬缓释胶囊 0.4g*24粒 国药准字H10900089")["validated_data"]["specification"], "0.4g")
+        self.assertEqual(self._run("芬必得 布洛芬缓释胶囊 国药准字H10900089 86900002000001")["validated_data"]["specification"], "0.3g")
+        result = self._run("芬必得 布洛芬缓释胶囊 国药准字H10900089")
+        self.assertNotIn("validated_data", result)
+        self.assertEqual(after_fast_path(result), "classifier")
+
+    def test_imported_drug_code_and_miss(self):
+        result = self._run("进口蒙脱石散 本位码 86978000000001")
+        self.assertEqual(result["validated_data"]["approval_number"], "H20170001")
+        self.assertEqual(result["validated_data"]["manufacturer"], "益普生制药")
+        self.assertEqual(after_fast_path(self._run("未收录药品 国药准字H99999999")), "classifier")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,219 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+import openpyxl
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.orm import sessionmaker
+from app.models.schema import Base
+from app.models.nmpa_data import NMPADomesticApprovalNumber, NMPADomesticDrug, NMPAImportedDrug
+from app.tools import nmpa_db_tools
+from app.services.nmpa_import import (
+    DOMESTIC_COLUMNS, IMPORTED_COLUMNS, _delta_import, import_domestic_drugs, import_imported_drugs, open_source
+)
+from app.tools.nmpa_search import (
+    SQLiteFTS5SearchBackend, current_nmpa_data_version, rebuild_domestic_approval_numbers, search_ids
+)
+
+DOMESTIC_ROWS = [
+    [86900001000001, "国药准字H20240001", "蒙脱石散", "散剂", "3g", "湖北午时药业股份有限公司", "湖北午时药业股份有限公司", None],
+    # 一行包含多个药品编码：批准文号按位置对应，规格取自备注
+    ["86900002000001；86900002000002;", "国药准字H10900089", "布洛芬缓释胶囊", "胶囊剂", "0.3g", "中美史克", "中美史克",
+     "86900002000001[0.3g]；86900002000002[0.4g]"],
+    ["86900003000001;86900003000002;86900003000003", "国药准字Z1;国药准字Z2", "板蓝根颗粒", "颗粒剂", "10g", "某药业", "某药业", ""],
+]
+IMPORTED_ROWS = [
+    ["86978000000001", " Ｈ２０１７０００１", "蒙脱石散", "益普生", "Ipsen", "益普生制药", "Ipsen Pharma", "散剂", "3g", None],
+]
+
+def write_workbook(path, columns, rows):
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(columns)
+    for row in rows:
+        sheet.append(row)
+    sheet.append([None] * len(columns)) # 空行被跳过
+    workbook.save(path)
+
+class TestNMPAImport(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(bind=self.engine)
+        self.db = sessionmaker(bind=self.engine)()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.tmpdir.name, "cache")
+
+    def tearDown(self):
+        self.db.close()
+        self.tmpdir.cleanup()
+
+    def test_import_domestic_in_chunks(self):
+        path = os.path.join(self.tmpdir.name, "domestic.xlsx")
+        # 源文件列顺序与导入列顺序无关
+        columns = list(reversed(list(DOMESTIC_COLUMNS)))
+        write_workbook(path, columns, [list(reversed(row)) for row in DOMESTIC_ROWS])
+        self.db.add(NMPADomesticDrug(drug_code="旧数据", approval_numbers="旧数据", product_name="旧数据", specification="旧数据"))
+        self.db.commit()
+
+        stats = import_domestic_drugs(self.db, path, cache_dir=self.cache_dir, chunk_size=2)
+        self.assertEqual((stats.source_rows, stats.written), (3, 6))
+        drugs = self.db.query(NMPADomesticDrug).order_by(NMPADomesticDrug.id).all()
+        self.assertEqual(
+            [(d.drug_code, d.approval_numbers, d.specification, d.remarks) for d in drugs],
+            [
+                ("86900001000001", "国药准字H20240001", "3g", ""),
+                ("86900002000001", "国药准字H10900089", "0.3g", "86900002000001[0.3g]；86900002000002[0.4g]"),
+                ("86900002000002", "国药准字H10900089", "0.4g", "86900002000002[0.4g]"),
+                ("86900003000001", "国药准字Z1", "10g", ""),
+                ("86900003000002", "国药准字Z2", "10g", ""),
+                ("86900003000003", "国药准字Z1", "10g", ""),
+            ]
+        )
+
+    def test_import_imported(self):
+        path = os.path.join(self.tmpdir.name, "imported.xlsx")
+        write_workbook(path, list(IMPORTED_COLUMNS), IMPORTED_ROWS)
+        stats = import_imported_drugs(self.db, path, cache_dir=self.cache_dir)
+        self.assertEqual(stats.written, 1)
+        drug = self.db.query(NMPAImportedDrug).one()
+        self.assertEqual((drug.registration_number, drug.company_cn, drug.remarks), ("H20170001", "益普生制药", ""))
+
+    def test_missing_column(self):
+        path = os.path.join(self.tmpdir.name, "bad.xlsx")
+        write_workbook(path, ["药品编码", "产品名称"], [["86900001000001", "蒙脱石散"]])
+        with self.assertRaises(ValueError):
+            import_domestic_drugs(self.db, path, cache_dir=self.cache_dir)
+        # 解析失败时不留下缓存文件
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+    def test_source_cache(self):
+        path = os.path.join(self.tmpdir.name, "domestic.xlsx")
+        write_workbook(path, list(DOMESTIC_COLUMNS), DOMESTIC_ROWS)
+        parsed = import_domestic_drugs(self.db, path, chunk_size=2, cache_dir=self.cache_dir)
+        records = [(d.drug_code, d.specification, d.remarks, d.row_hash) for d in self.db.query(NMPADomesticDrug).order_by(NMPADomesticDrug.id)]
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+        # 源文件未变化时从缓存读取，不再解析Excel
+        with patch('app.services.nmpa_import.iter_excel_chunks', side_effect=AssertionError("不应解析Excel")):
+            cached = import_domestic_drugs(self.db, path, chunk_size=4, cache_dir=self.cache_dir)
+            self.assertEqual(import_domestic_drugs(self.db, path, delta=True, cache_dir=self.cache_dir).unchanged, 6)
+        self.assertEqual((cached.source_rows, cached.unchanged), (parsed.source_rows, parsed.inserted))
+        self.assertEqual(
+            [(d.drug_code, d.specification, d.remarks, d.row_hash) for d in self.db.query(NMPADomesticDrug).order_by(NMPADomesticDrug.id)],
+            records
+        )
+
+        # 源文件变化后重新解析，旧缓存被替换
+        old_cache = os.listdir(self.cache_dir)
+        write_workbook(path, list(DOMESTIC_COLUMNS), DOMESTIC_ROWS[:1])
+        stats = import_domestic_drugs(self.db, path, cache_dir=self.cache_dir)
+        self.assertEqual((stats.source_rows, stats.unchanged, stats.deleted), (1, 1, 5))
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+        self.assertNotEqual(os.listdir(self.cache_dir), old_cache)
+
+    def test_full_import_swaps_staging_tables(self):
+        path = os.path.join(self.tmpdir.name, "domestic.xlsx")
+        write_workbook(path, list(DOMESTIC_COLUMNS), DOMESTIC_ROWS)
+        import_domestic_drugs(self.db, path, cache_dir=self.cache_dir)
+        with patch('app.tools.nmpa_search._backends', {SQLiteFTS5SearchBackend.name: SQLiteFTS5SearchBackend()}) as backends:
+            backends[SQLiteFTS5SearchBackend.name].rebuild(self.engine)
+            nmpa_db_tools.invalidate_nmpa_cache()
+            with patch('app.tools.nmpa_db_tools.SessionLocal', sessionmaker(bind=self.engine)), \
+                    patch('app.tools.nmpa_db_tools.get_nmpa_snapshot', return_value=None):
+                self.assertEqual(len(nmpa_db_tools.query_nmpa_by_approval_number.invoke({"approval_number": "国药准字Z1"})), 2)
+                version = current_nmpa_data_version(self.db)
+
+                rows = [list(row) for row in DOMESTIC_ROWS[:2]]
+                rows[0][2] = "蒙脱石散剂"
+                write_workbook(path, list(DOMESTIC_COLUMNS), rows)
+                stats = import_domestic_drugs(self.db, path, cache_dir=self.cache_dir)
+                # 统计的是与旧表按药品编码比较的实际差异
+                self.assertEqual((stats.inserted, stats.updated, stats.deleted, stats.unchanged), (0, 1, 3, 2))
+
+                # 暂存表已换入，没有遗留的暂存表和旧表
+                tables = set(inspect(self.engine).get_table_names())
+                self.assertFalse([name for name in tables if name.endswith(("__staging", "__old"))])
+                indexed = {tuple(index["column_names"]) for index in inspect(self.engine).get_indexes("nmpa_domestic_drugs")}
+                self.assertIn(("drug_code",), indexed)
+
+                # 检索索引、批准文号明细随新表换入，数据版本更新且本进程查询缓存已失效
+                self.assertEqual(search_ids(self.db, "domestic", [(("product_name",), "蒙脱石散剂")]), [1])
+                self.assertEqual(search_ids(self.db, "domestic", [(("product_name",), "板蓝根")]), [])
+                self.assertEqual(self.db.query(NMPADomesticApprovalNumber).count(), 3)
+                self.assertEqual(current_nmpa_data_version(self.db), version + 1)
+                self.assertEqual(nmpa_db_tools.query_nmpa_by_approval_number.invoke({"approval_number": "国药准字Z1"}), [])
+
+    def test_delta_import(self):
+        path = os.path.join(self.tmpdir.name, "domestic.xlsx")
+        write_workbook(path, list(DOMESTIC_COLUMNS), DOMESTIC_ROWS)
+        import_domestic_drugs(self.db, path, cache_dir=self.cache_dir)
+        with patch('app.tools.nmpa_search._backends', {SQLiteFTS5SearchBackend.name: SQLiteFTS5SearchBackend()}) as backends:
+            backends[SQLiteFTS5SearchBackend.name].rebuild(self.engine)
+            rebuild_domestic_approval_numbers(self.db)
+            ids = {d.drug_code: d.id for d in self.db.query(NMPADomesticDrug)}
+
+            # 源数据未变化时不写入任何记录
+            stats = import_domestic_drugs(self.db, path, cache_dir=self.cache_dir, delta=True)
+            self.assertEqual((stats.inserted, stats.updated, stats.deleted, stats.unchanged), (0, 0, 0, 6))
+
+            # 修改蒙脱石散的批准文号，删除板蓝根颗粒，新增一个药品
+            rows = [list(row) for row in DOMESTIC_ROWS[:2]]
+            rows[0][1] = "国药准字H20249999"
+            rows.append([86900004000001, "国药准字H20248888", "阿莫西林胶囊", "胶囊剂", "0.25g", "某药业", "某药业", None])
+            write_workbook(path, list(DOMESTIC_COLUMNS), rows)
+            stats = import_domestic_drugs(self.db, path, cache_dir=self.cache_dir, chunk_size=1, delta=True)
+            self.assertEqual((stats.inserted, stats.updated, stats.deleted, stats.unchanged), (1, 1, 3, 2))
+
+            drugs = {d.drug_code: d for d in self.db.query(NMPADomesticDrug)}
+            self.assertEqual(sorted(drugs), ["86900001000001", "86900002000001", "86900002000002", "86900004000001"])
+            # 已有记录原地更新，ID不变
+            self.assertEqual(drugs["86900001000001"].id, ids["86900001000001"])
+            self.assertEqual(drugs["86900001000001"].approval_numbers, "国药准字H20249999")
+
+            # 检索索引和批准文号明细表同步更新
+            self.assertEqual(search_ids(self.db, "domestic", [(("product_name",), "板蓝根")]), [])
+            self.assertEqual(search_ids(self.db, "domestic", [(("product_name",), "阿莫西林")]), [drugs["86900004000001"].id])
+            self.assertEqual(search_ids(self.db, "domestic", [(("approval_numbers",), "H20240001")]), [])
+            approval_numbers = {
+                approval_number: drug_id for approval_number, drug_id in
+                self.db.query(NMPADomesticApprovalNumber.approval_number, NMPADomesticApprovalNumber.drug_id)
+            }
+            self.assertEqual(approval_numbers["国药准字H20249999"], ids["86900001000001"])
+            self.assertEqual(approval_numbers["国药准字H20248888"], drugs["86900004000001"].id)
+            self.assertNotIn("国药准字H20240001", approval_numbers)
+            self.assertNotIn("国药准字Z1", approval_numbers)
+
+    def test_delta_import_is_atomic(self):
+        path = os.path.join(self.tmpdir.name, "domestic.xlsx")
+        write_workbook(path, list(DOMESTIC_COLUMNS), DOMESTIC_ROWS)
+        import_domestic_drugs(self.db, path, cache_dir=self.cache_dir)
+        version = current_nmpa_data_version(self.db)
+
+        rows = [list(row) for row in DOMESTIC_ROWS]
+        rows[0][2] = "蒙脱石散剂"
+        rows[2][2] = "板蓝根冲剂"
+        write_workbook(path, list(DOMESTIC_COLUMNS), rows)
+        _, chunks = open_source(path, "domestic", chunk_size=1, cache_dir=None)
+
+        def failing_chunks():
+            yield next(chunks)
+            raise RuntimeError("读取中断")
+
+        # 中途失败时已处理的块不会提交，回滚后数据和版本号均保持不变
+        with self.assertRaises(RuntimeError):
+            _delta_import(self.db, NMPADomesticDrug, "domestic", failing_chunks(), None, "增量导入国产药品")
+        self.db.rollback()
+        other = sessionmaker(bind=self.engine)()
+        try:
+            names = {name for name, in other.query(NMPADomesticDrug.product_name)}
+            self.assertEqual(names, {"蒙脱石散", "布洛芬缓释胶囊", "板蓝根颗粒"})
+            self.assertEqual(current_nmpa_data_version(other), version)
+        finally:
+            other.close()
+
+        stats = import_domestic_drugs(self.db, path, cache_dir=self.cache_dir, delta=True)
+        self.assertEqual((stats.inserted, stats.updated, stats.deleted, stats.unchanged), (0, 4, 0, 2))
+        self.assertEqual(current_nmpa_data_version(self.db), version + 1)
+
+if __name__ == '__main__':
+    unittest.main()
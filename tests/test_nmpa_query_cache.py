@@ -0,0 +1,79 @@
+import unittest
+from unittest.mock import Mock, patch
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.models.schema import Base
+from app.models.nmpa_data import NMPADomesticDrug
+from app.tools import nmpa_db_tools
+from app.tools.nmpa_search import bump_nmpa_data_version, current_nmpa_data_version
+from app.utils.ttl_cache import TTLCache
+
+class TestTTLCache(unittest.TestCase):
+    def test_lru_eviction_and_expiry(self):
+        cache = TTLCache("test", maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertEqual(cache.get("a"), (True, 1))
+        cache.set("c", 3) # "b" 最久未使用，被淘汰
+        self.assertEqual(cache.get("b"), (False, None))
+        self.assertEqual(len(cache), 2)
+
+        with patch('app.utils.ttl_cache.time.monotonic', return_value=1e12):
+            self.assertEqual(cache.get("a"), (False, None))
+
+class TestNMPAQueryCache(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(bind=self.engine)
+        self.sessions = []
+        factory = sessionmaker(bind=self.engine)
+
+        def session_factory():
+            session = factory()
+            session.close = Mock(wraps=session.close)
+            self.sessions.append(session)
+            return session
+        self.session_factory = session_factory
+        self.db = factory()
+        self.db.add(NMPADomesticDrug(drug_code="86900001000001", approval_numbers="国药准字H20240001",
+                                     product_name="蒙脱石散", specification="3g", manufacturer="湖北午时药业股份有限公司"))
+        self.db.commit()
+        nmpa_db_tools.invalidate_nmpa_cache()
+
+    def tearDown(self):
+        self.db.close()
+
+    def _query(self, drug_code="86900001000001"):
+        with patch('app.tools.nmpa_db_tools.SessionLocal', self.session_factory):
+            return nmpa_db_tools.query_nmpa_by_drug_code.invoke({"drug_code": drug_code})
+
+    def test_sessions_closed_after_call(self):
+        with patch('app.tools.nmpa_db_tools.SessionLocal', self.session_factory):
+            nmpa_db_tools.query_nmpa_by_approval_number.invoke({"approval_number": "国药准字H20240001"})
+            nmpa_db_tools.query_nmpa_by_product_name_and_manufacturer.invoke({"product_name": "蒙脱石散", "manufacturer": "午时"})
+        self.assertEqual(len(self.sessions), 2)
+        for session in self.sessions:
+            session.close.assert_called_once()
+
+    def test_cached_result_is_copy(self):
+        with patch.object(nmpa_db_tools, "_query_by_drug_code", wraps=nmpa_db_tools._query_by_drug_code) as loader:
+            first = self._query(" 86900001000001 ")
+            first["product_name"] = "已修改"
+            second = self._query()
+            self.assertEqual(loader.call_count, 1)
+        self.assertEqual(second["product_name"], "蒙脱石散")
+
+    def test_version_bump_invalidates_cache(self):
+        self.assertEqual(self._query()["product_name"], "蒙脱石散")
+        self.db.query(NMPADomesticDrug).update({"product_name": "蒙脱石散（新）"})
+        self.db.commit()
+        # 版本未变化时继续使用缓存
+        self.assertEqual(self._query()["product_name"], "蒙脱石散")
+
+        self.assertEqual(bump_nmpa_data_version(self.db, "test"), 1)
+        self.assertEqual(current_nmpa_data_version(self.db), 1)
+        with patch('app.tools.nmpa_db_tools.NMPA_VERSION_CHECK_INTERVAL', 0):
+            self.assertEqual(self._query()["product_name"], "蒙脱石散（新）")
+
+if __name__ == '__main__':
+    unittest.main()
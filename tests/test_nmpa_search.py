@@ -0,0 +1,115 @@
+import unittest
+from unittest.mock import patch
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.models.schema import Base
+from app.models.nmpa_data import NMPADomesticDrug, NMPAImportedDrug
+from app.tools import nmpa_db_tools
+from app.tools.nmpa_search import LikeSearchBackend, SQLiteFTS5SearchBackend, rebuild_domestic_approval_numbers, search_ids
+
+class TestNMPASearch(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(bind=self.engine)
+        self.session_factory = sessionmaker(bind=self.engine)
+        self.db = self.session_factory()
+        self.db.add_all([
+            NMPADomesticDrug(drug_code="86900001000001", approval_numbers="国药准字H20240001;国药准字H20240002",
+                             product_name="蒙脱石散", specification="3g", mah="湖北午时药业股份有限公司",
+                             manufacturer="湖北午时药业股份有限公司"),
+            NMPADomesticDrug(drug_code="86900002000001", approval_numbers="国药准字H10900089",
+                             product_name="布洛芬缓释胶囊", specification="0.3g", mah="中美天津史克制药有限公司",
+                             manufacturer="中美天津史克制药有限公司"),
+            NMPADomesticDrug(drug_code="86900003000001", approval_numbers="国药准字H20000690",
+                             product_name="蒙脱石混悬液", specification="30ml", mah="博福-益普生（天津）制药有限公司",
+                             manufacturer="博福-益普生（天津）制药有限公司"),
+            NMPAImportedDrug(drug_code="86978000000001", registration_number="H20170001", product_name="蒙脱石散",
+                             company_cn="益普生制药", mah_cn="益普生制药"),
+        ])
+        self.db.commit()
+        self.fts = SQLiteFTS5SearchBackend()
+        self.fts.rebuild(self.engine)
+        nmpa_db_tools.invalidate_nmpa_cache()
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_fts_matches_like_backend(self):
+        like = LikeSearchBackend()
+        for criteria in [
+            [(("product_name",), "蒙脱石")],
+            [(("product_name",), "蒙脱石"), (("manufacturer", "mah"), "午时")],
+            [(("approval_numbers",), "国药准字H20240002")],
+            [(("product_name",), "不存在的药品")],
+            [(("product_name",), "散")], # 短于3个字符的检索词
+        ]:
+            self.assertEqual(sorted(self.fts.search(self.db, "domestic", criteria)), sorted(like.search(self.db, "domestic", criteria)))
+        self.assertEqual(len(self.fts.search(self.db, "domestic", [(("product_name",), "蒙脱石")], limit=1)), 1)
+
+    def test_fuzzy_search_ranks_closest_first(self):
+        # “蒙脱石散剂”不是任何名称的子串，但与“蒙脱石散”共享多数trigram
+        self.assertEqual(self.fts.search(self.db, "domestic", [(("product_name",), "蒙脱石散剂")]), [])
+        ids = self.fts.fuzzy_search(self.db, "domestic", [(("product_name",), "蒙脱石散剂")])
+        self.assertEqual(ids[0], 1)
+        self.assertIn(3, ids)
+
+    def test_fallback_when_index_missing(self):
+        with self.engine.begin() as conn:
+            conn.exec_driver_sql("DROP TABLE nmpa_domestic_drugs_fts")
+        with patch('app.tools.nmpa_search._backends', {SQLiteFTS5SearchBackend.name: SQLiteFTS5SearchBackend()}):
+            self.assertEqual(search_ids(self.db, "domestic", [(("product_name",), "布洛芬")]), [2])
+
+    def test_tools_use_search_index(self):
+        with patch('app.tools.nmpa_db_tools.SessionLocal', self.session_factory), \
+                patch('app.tools.nmpa_search._backends', {SQLiteFTS5SearchBackend.name: self.fts}):
+            results = nmpa_db_tools.query_nmpa_by_approval_number.invoke({"approval_number": "国药准字 h20240002"})
+            self.assertEqual([result["drug_code"] for result in results], ["86900001000001"])
+
+            results = nmpa_db_tools.query_nmpa_by_product_name_and_manufacturer.invoke(
+                {"product_name": "蒙脱石散", "manufacturer": "湖北午时药业有限公司"}
+            )
+            self.assertEqual([result["drug_code"] for result in results], ["86900001000001"])
+
+            results = nmpa_db_tools.fuzzy_search_nmpa_by_product_name.invoke({"product_name": "蒙脱石散剂"})
+            self.assertEqual(results[0]["drug_code"], "86900001000001")
+            self.assertIn("86978000000001", [result["drug_code"] for result in results])
+
+    def test_approval_number_equality_lookup(self):
+        self.assertEqual(rebuild_domestic_approval_numbers(self.db), 4)
+        with patch('app.tools.nmpa_db_tools.SessionLocal', self.session_factory):
+            results = nmpa_db_tools.query_nmpa_by_approval_number.invoke({"approval_number": "国药准字H20240002"})
+            self.assertEqual([result["drug_code"] for result in results], ["86900001000001"])
+            # 批准文号的前缀/子串不再被当作精确匹配
+            self.assertEqual(nmpa_db_tools.query_nmpa_by_approval_number.invoke({"approval_number": "国药准字H2024000"}), [])
+
+    def test_batch_tools_match_single_lookups(self):
+        approval_numbers = ["国药准字H20240002", "国药准字 h10900089", "H20170001", "国药准字H00000000", ""]
+        drug_codes = ["86900002000001", "86978000000001", "00000000000000"]
+        pairs = [{"product_name": "蒙脱石散", "manufacturer": "湖北午时药业有限公司"}, {"product_name": "布洛芬", "manufacturer": ""}]
+        for with_number_table in (False, True):
+            if with_number_table:
+                rebuild_domestic_approval_numbers(self.db)
+            nmpa_db_tools.invalidate_nmpa_cache()
+            with patch('app.tools.nmpa_db_tools.SessionLocal', self.session_factory), \
+                    patch('app.tools.nmpa_search._backends', {SQLiteFTS5SearchBackend.name: self.fts}):
+                batch = nmpa_db_tools.query_nmpa_by_approval_numbers.invoke({"approval_numbers": approval_numbers})
+                self.assertEqual(list(batch), approval_numbers)
+                self.assertEqual(batch["H20170001"][0]["drug_code"], "86978000000001")
+                self.assertEqual(batch["国药准字H00000000"], [])
+                nmpa_db_tools.invalidate_nmpa_cache()
+                for approval_number in approval_numbers:
+                    self.assertEqual(batch[approval_number], nmpa_db_tools.query_nmpa_by_approval_number.invoke({"approval_number": approval_number}))
+
+                batch = nmpa_db_tools.query_nmpa_by_drug_codes.invoke({"drug_codes": drug_codes})
+                for drug_code in drug_codes:
+                    self.assertEqual(batch[drug_code], nmpa_db_tools.query_nmpa_by_drug_code.invoke({"drug_code": drug_code}))
+                self.assertIsNone(batch["00000000000000"])
+
+                batch = nmpa_db_tools.query_nmpa_by_product_names_and_manufacturers.invoke({"items": pairs})
+                self.assertEqual([item["product_name"] for item in batch], ["蒙脱石散", "布洛芬"])
+                for item, pair in zip(batch, pairs):
+                    self.assertEqual(item["results"], nmpa_db_tools.query_nmpa_by_product_name_and_manufacturer.invoke(pair))
+                self.assertEqual([result["drug_code"] for result in batch[1]["results"]], ["86900002000001"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.models.schema import Base
+from app.models.nmpa_data import NMPADomesticDrug, NMPAImportedDrug
+from app.tools import nmpa_db_tools
+from app.tools.nmpa_search import rebuild_domestic_approval_numbers
+from app.tools.nmpa_snapshot import NMPASnapshot, reset_nmpa_snapshot, write_nmpa_snapshot
+
+class TestNMPASnapshot(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(bind=self.engine)
+        self.session_factory = sessionmaker(bind=self.engine)
+        self.db = self.session_factory()
+        self.db.add_all([
+            NMPADomesticDrug(drug_code="86900001000001", approval_numbers="国药准字H20240001;国药准字H20240002",
+                             product_name="蒙脱石散", specification="3g", manufacturer="湖北午时药业股份有限公司"),
+            NMPADomesticDrug(drug_code="86900002000001", approval_numbers="国药准字H10900089",
+                             product_name="布洛芬缓释胶囊", specification="0.3g", manufacturer="中美天津史克制药有限公司"),
+            NMPADomesticDrug(drug_code="86900002000002", approval_numbers="国药准字H10900089",
+                             product_name="布洛芬缓释胶囊", specification="0.4g", manufacturer="中美天津史克制药有限公司"),
+            NMPAImportedDrug(drug_code="86978000000001", registration_number="H20170001", product_name="蒙脱石散",
+                             company_cn="益普生制药", specification="3g"),
+            NMPAImportedDrug(drug_code="86978000000002", registration_number="国药准字H10900089", product_name="布洛芬缓释胶囊",
+                             company_cn="分装企业", specification="0.3g"),
+        ])
+        self.db.commit()
+        rebuild_domestic_approval_numbers(self.db)
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "nmpa_snapshot.bin")
+        nmpa_db_tools.invalidate_nmpa_cache()
+        reset_nmpa_snapshot()
+
+    def tearDown(self):
+        self.db.close()
+        reset_nmpa_snapshot()
+        self.tmpdir.cleanup()
+
+    def _db_results(self):
+        with patch('app.tools.nmpa_db_tools.SessionLocal', self.session_factory), \
+                patch('app.tools.nmpa_snapshot.NMPA_SNAPSHOT_PATH', self.path):
+            return self._tool_results()
+
+    def _tool_results(self):
+        approval_numbers = ["国药准字H20240002", "国药准字H10900089", "H20170001", "国药准字H00000000"]
+        drug_codes = ["86900002000002", "86978000000001", "00000000000000"]
+        return (
+            [nmpa_db_tools.query_nmpa_by_approval_number.invoke({"approval_number": n}) for n in approval_numbers],
+            [nmpa_db_tools.query_nmpa_by_drug_code.invoke({"drug_code": code}) for code in drug_codes],
+            nmpa_db_tools.query_nmpa_by_approval_numbers.invoke({"approval_numbers": approval_numbers}),
+            nmpa_db_tools.query_nmpa_by_drug_codes.invoke({"drug_codes": drug_codes}),
+        )
+
+    def test_snapshot_matches_database(self):
+        expected = self._db_results()
+        self.assertEqual(nmpa_db_tools.build_nmpa_snapshot(self.db, self.path, data_version=3, batch_size=2), 5)
+        reset_nmpa_snapshot()
+
+        def no_session():
+            raise AssertionError("快照存在时不应访问数据库")
+        with patch('app.tools.nmpa_db_tools.SessionLocal', no_session), \
+                patch('app.tools.nmpa_snapshot.NMPA_SNAPSHOT_PATH', self.path):
+            self.assertEqual(self._tool_results(), expected)
+
+        snapshot = NMPASnapshot(self.path)
+        self.assertEqual((len(snapshot), snapshot.data_version), (5, 3))
+        self.assertEqual([r["source"] for r in snapshot.find_by_approval_number("国药准字H10900089")], ["国产药品", "国产药品", "进口药品"])
+        self.assertEqual(snapshot.find_by_approval_number("国药准字H1090008"), [])
+        self.assertEqual(snapshot.find_by_approval_number("国药准字H109000890000000000"), [])
+
+    def test_snapshot_normalizes_registration_numbers(self):
+        # 存量数据中未标准化（全角、带空白）的注册证号写入快照时同样按标准化后的键索引
+        self.db.add(NMPAImportedDrug(drug_code="86978000000003", registration_number=" Ｈ２０１７０００２", product_name="布洛芬混悬液",
+                                     company_cn="益普生制药", specification="100ml"))
+        self.db.commit()
+        nmpa_db_tools.build_nmpa_snapshot(self.db, self.path)
+        snapshot = NMPASnapshot(self.path)
+        self.assertEqual([r["drug_code"] for r in snapshot.find_by_approval_number("H20170002")], ["86978000000003"])
+
+    def test_empty_and_invalid_snapshot(self):
+        write_nmpa_snapshot(self.path, [])
+        snapshot = NMPASnapshot(self.path)
+        self.assertEqual(len(snapshot), 0)
+        self.assertIsNone(snapshot.find_by_drug_code("86900001000001"))
+
+        with open(self.path, "wb") as f:
+            f.write(b"not a snapshot")
+        # 无效的快照文件被忽略，回退到数据库查询
+        with patch('app.tools.nmpa_db_tools.SessionLocal', self.session_factory), \
+                patch('app.tools.nmpa_snapshot.NMPA_SNAPSHOT_PATH', self.path):
+            result = nmpa_db_tools.query_nmpa_by_drug_code.invoke({"drug_code": "86900001000001"})
+        self.assertEqual(result["product_name"], "蒙脱石散")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+from types import SimpleNamespace
+from app.utils.spec_parser import (
+    ParsedSpecification, parse_specification, parsed_specification,
+    specification_columns, specifications_equivalent
+)
+
+class TestSpecParser(unittest.TestCase):
+    def test_unit_normalization(self):
+        self.assertEqual(parse_specification("0.25g×24粒"), ParsedSpecification(250.0, "mg", 24, "片"))
+        self.assertEqual(parse_specification("250mg*24片"), ParsedSpecification(250.0, "mg", 24, "片"))
+        self.assertEqual(parse_specification("3g*10袋/盒"), ParsedSpecification(3000.0, "mg", 10, "袋"))
+        self.assertEqual(parse_specification("30ml*1瓶"), ParsedSpecification(30.0, "ml", 1, "瓶"))
+        self.assertEqual(parse_specification("10万IU*10支"), ParsedSpecification(100000.0, "iu", 10, "支"))
+
+    def test_compound_specifications(self):
+        # 多级包装的数量相乘
+        self.assertEqual(parse_specification("0.25g×12粒×2板"), ParsedSpecification(250.0, "mg", 24, "片"))
+        # 注射液同时标注体积和含量时优先使用质量含量
+        self.assertEqual(parse_specification("2ml:10mg*5支"), ParsedSpecification(10.0, "mg", 5, "支"))
+        self.assertEqual(parse_specification("24粒/盒"), ParsedSpecification(None, None, 24, "片"))
+        self.assertIsNone(parse_specification("复方"))
+        self.assertIsNone(parse_specification(None))
+
+    def test_columns_and_precomputed_values(self):
+        columns = specification_columns("0.3g*20粒")
+        self.assertEqual(columns, {"spec_strength": 300.0, "spec_strength_unit": "mg", "spec_pack_count": 20, "spec_pack_unit": "片"})
+        product = SimpleNamespace(specification="忽略", **columns)
+        self.assertEqual(parsed_specification(product), ParsedSpecification(300.0, "mg", 20, "片"))
+        self.assertEqual(parsed_specification({"specification": "300mg*20片"}), parsed_specification(product))
+
+    def test_equivalence(self):
+        self.assertTrue(specifications_equivalent(parse_specification("0.25g×24粒"), parse_specification("250mg*24片")))
+        self.assertFalse(specifications_equivalent(parse_specification("0.25g×24粒"), parse_specification("250mg*12片")))
+        self.assertFalse(specifications_equivalent(None, None))
+
+    def test_pack_units_kept_distinct(self):
+        # 只有粒与片互为别名，丸、颗、枚保持原单位
+        self.assertEqual(parse_specification("0.2g*24丸"), ParsedSpecification(200.0, "mg", 24, "丸"))
+        self.assertEqual(parse_specification("24颗/瓶"), ParsedSpecification(None, None, 24, "颗"))
+        self.assertEqual(parse_specification("10枚/盒"), ParsedSpecification(None, None, 10, "枚"))
+        self.assertFalse(specifications_equivalent(parse_specification("0.2g*24丸"), parse_specification("200mg*24片")))
+        self.assertFalse(specifications_equivalent(parse_specification("0.2g*24丸"), parse_specification("0.2g*24颗")))
+        self.assertTrue(specifications_equivalent(parse_specification("0.2g*24粒"), parse_specification("200mg*24片")))
+
+if __name__ == '__main__':
+    unittest.main()
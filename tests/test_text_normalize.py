@@ -0,0 +1,28 @@
+import unittest
+from types import SimpleNamespace
+from app.utils.text_normalize import (
+    normalize_product_name, normalize_manufacturer, normalize_specification,
+    normalized_columns, normalized_value
+)
+
+class TestTextNormalize(unittest.TestCase):
+    def test_field_rules(self):
+        self.assertEqual(normalize_product_name("蒙脱石 散（Ⅰ）"), "蒙脱石散i")
+        self.assertEqual(normalize_manufacturer("湖北午时药业股份有限公司"), "湖北午时药业")
+        self.assertEqual(normalize_manufacturer("ABC Pharma Co., Ltd."), "abcpharma")
+        self.assertEqual(normalize_specification("3g × 10袋"), "3g*10袋")
+        self.assertEqual(normalize_specification(None), "")
+
+    def test_normalized_columns(self):
+        columns = normalized_columns({"product_name": "蒙脱石散", "approval_number": "国药准字 h20000001"})
+        self.assertEqual(columns["product_name_norm"], "蒙脱石散")
+        self.assertEqual(columns["approval_number_norm"], "国药准字H20000001")
+        self.assertIsNone(columns["manufacturer_norm"])
+
+    def test_normalized_value_prefers_precomputed_column(self):
+        product = SimpleNamespace(manufacturer="湖北午时药业股份有限公司", manufacturer_norm="预计算")
+        self.assertEqual(normalized_value(product, "manufacturer"), "预计算")
+        self.assertEqual(normalized_value({"manufacturer": "午时药业有限公司"}, "manufacturer"), "午时药业")
+
+if __name__ == '__main__':
+    unittest.main()